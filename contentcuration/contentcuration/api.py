@@ -10,14 +10,13 @@ from io import BytesIO
 
 from django.core.exceptions import SuspiciousOperation
 from django.core.files.storage import default_storage
-from django.db.models import Count
-from django.db.models import Sum
 from django.utils.translation import ugettext as _
 from le_utils.constants import content_kinds
-from le_utils.constants import format_presets
 
 import contentcuration.models as models
+from contentcuration.utils.channel_statistics import ChannelStatistics
 from contentcuration.utils.garbage_collect import get_deleted_chefs_root
+from contentcuration.utils.tasks import increment_progress
 from contentcuration.viewsets.sync.utils import generate_update_event
 from contentcuration.viewsets.sync.constants import CHANNEL
 
@@ -106,40 +105,78 @@ def activate_channel(channel, user):
     return change
 
 
+COMMIT_CHANNEL_STEPS = 5
+
+
+def commit_channel(channel, user, stage=False):
+    """
+    Replaces the staging tree of the channel with the tree a ricecooker run just uploaded to its chef_tree,
+    and activates it unless `stage` is set. Returns the change to send to the channel editors.
+
+    This is run by the commit-channel task, so progress is reported after each of its steps.
+    """
+    chef_tree = channel.chef_tree
+
+    # Need to rebuild MPTT tree pointers since we used `disable_mptt_updates`
+    models.ContentNode.objects.fast_rebuild(chef_tree.tree_id)
+    increment_progress()
+    # The nodes were created in bulk, so build their tree stats now that the tree is rebuilt
+    models.ContentNodeTreeStats.rebuild(chef_tree.tree_id)
+    increment_progress()
+    # set original_channel_id and source_channel_id to self since chef tree
+    chef_tree.get_descendants(include_self=True).update(original_channel_id=channel.id, source_channel_id=channel.id)
+    increment_progress()
+
+    # replace staging_tree with chef_tree
+    old_staging = channel.staging_tree
+    channel.staging_tree = chef_tree
+    channel.chef_tree = None
+    channel.save()
+
+    # Prepare change event indicating a new staging_tree is available
+    change = generate_update_event(channel.id, CHANNEL, {
+        "root_id": channel.main_tree.id,
+        "staging_root_id": channel.staging_tree.id,
+    })
+
+    # Mark old staging tree for garbage collection
+    if old_staging and old_staging != channel.main_tree:
+        # IMPORTANT: Do not remove this block, MPTT updating the deleted chefs block could hang the server
+        with models.ContentNode.objects.disable_mptt_updates():
+            garbage_node = get_deleted_chefs_root()
+            old_staging.parent = garbage_node
+            old_staging.title = "Old staging tree for channel {}".format(channel.pk)
+            old_staging.save()
+    increment_progress()
+
+    # If ricecooker --stage flag used, we're done (skip ACTIVATE step), else
+    # we ACTIVATE the channel, i.e., set the main tree from the staged tree
+    if not stage:
+        change = activate_channel(channel, user)
+    increment_progress()
+
+    return change
+
+
 def get_staged_diff(channel_id):
     channel = models.Channel.objects.get(pk=channel_id)
 
     has_main = channel.main_tree
     has_staging = channel.staging_tree
 
-    main_descendants = channel.main_tree.get_descendants() if has_main else None
-    updated_descendants = channel.staging_tree.get_descendants() if has_staging else None
-
-    original_stats = main_descendants.values('kind_id').annotate(count=Count('kind_id')).order_by() if has_main else {}
-    updated_stats = updated_descendants.values('kind_id').annotate(count=Count('kind_id')).order_by() if has_staging else {}
-
-    original_file_sizes = main_descendants.aggregate(
-        resource_size=Sum('files__file_size'),
-        assessment_size=Sum('assessment_items__files__file_size'),
-        assessment_count=Count('assessment_items'),
-    ) if has_main else {}
-
-    updated_file_sizes = updated_descendants.aggregate(
-        resource_size=Sum('files__file_size'),
-        assessment_size=Sum('assessment_items__files__file_size'),
-        assessment_count=Count('assessment_items')
-    ) if has_staging else {}
+    original_stats = ChannelStatistics(channel.main_tree) if has_main else None
+    updated_stats = ChannelStatistics(channel.staging_tree) if has_staging else None
 
-    original_file_size = (original_file_sizes.get('resource_size') or 0) + (original_file_sizes.get('assessment_size') or 0)
-    updated_file_size = (updated_file_sizes.get('resource_size') or 0) + (updated_file_sizes.get('assessment_size') or 0)
-    original_question_count = original_file_sizes.get('assessment_count') or 0
-    updated_question_count = updated_file_sizes.get('assessment_count') or 0
+    original_file_size = original_stats.file_size + original_stats.assessment_file_size if has_main else 0
+    updated_file_size = updated_stats.file_size + updated_stats.assessment_file_size if has_staging else 0
+    original_question_count = original_stats.assessment_count if has_main else 0
+    updated_question_count = updated_stats.assessment_count if has_staging else 0
 
     stats = [
         {
             "field": _("Date/Time Created"),
-            "live": channel.main_tree.created.strftime("%x %X") if main_descendants else _("Not Available"),
-            "staged": channel.staging_tree.created.strftime("%x %X") if updated_descendants else _("Not Available"),
+            "live": channel.main_tree.created.strftime("%x %X") if has_main and original_stats.node_count else _("Not Available"),
+            "staged": channel.staging_tree.created.strftime("%x %X") if has_staging and updated_stats.node_count else _("Not Available"),
         },
         {
             "field": _("Ricecooker Version"),
@@ -156,8 +193,8 @@ def get_staged_diff(channel_id):
     ]
 
     for kind, name in content_kinds.choices:
-        original = original_stats.get(kind_id=kind)['count'] if has_main and original_stats.filter(kind_id=kind).exists() else 0
-        updated = updated_stats.get(kind_id=kind)['count'] if has_staging and updated_stats.filter(kind_id=kind).exists() else 0
+        original = original_stats.get_kind_count(kind) if has_main else 0
+        updated = updated_stats.get_kind_count(kind) if has_staging else 0
         stats.append({"field": _("# of {}s".format(name)), "live": original, "staged": updated, "difference": updated - original})
 
     # Add number of questions
@@ -169,8 +206,8 @@ def get_staged_diff(channel_id):
     })
 
     # Add number of subtitles
-    original_subtitle_count = main_descendants.filter(files__preset_id=format_presets.VIDEO_SUBTITLE).count() if has_main else 0
-    updated_subtitle_count = updated_descendants.filter(files__preset_id=format_presets.VIDEO_SUBTITLE).count() if has_staging else 0
+    original_subtitle_count = original_stats.subtitle_count if has_main else 0
+    updated_subtitle_count = updated_stats.subtitle_count if has_staging else 0
     stats.append({
         "field": _("# of Subtitles"),
         "live": original_subtitle_count,
@@ -1,18 +1,26 @@
 import contextlib
+import functools
 import logging as logger
 import time
 import uuid
+from collections import OrderedDict
 
+from django.db import connection
 from django.db import transaction
+from django.db.models import AutoField
 from django.db.models import Manager
 from django.db.models import Q
 from django.db.utils import OperationalError
+from django.utils import timezone
 from django_cte import CTEQuerySet
 from le_utils.constants import content_kinds
+from mptt.exceptions import InvalidMove
 from mptt.managers import TreeManager
 from mptt.signals import node_moved
+from prometheus_client import Histogram
 
 from contentcuration.db.models.query import CustomTreeQuerySet
+from contentcuration.utils.tasks import check_cancelled
 from contentcuration.utils.tasks import increment_progress
 from contentcuration.utils.tasks import set_total
 
@@ -33,6 +41,26 @@ logging = logger.getLogger(__name__)
 # topology also, so these rudimentary tests are likely insufficient
 BATCH_SIZE = 100
 
+# Subtrees larger than the batch size are copied with set-based queries,
+# through a temporary table that maps each source node to its copy
+COPY_MAP_TABLE = "contentnode_copy_map"
+
+# SQL for a new random id, made unique within a statement by hashing in a unique column of the row copied
+NEW_ID_SQL = "md5(random()::text || clock_timestamp()::text || {})"
+
+# Trees are locked for MPTT updates with transaction level advisory locks keyed on this number
+# and the tree_id, so that they can't collide with advisory locks taken for anything else
+MPTT_ADVISORY_LOCK_ID = 1
+
+MPTT_LOCK_WAIT_TIME = Histogram(
+    "contentcuration_mptt_lock_wait_seconds",
+    "Time spent waiting to lock ContentNode trees for MPTT updates",
+)
+MPTT_LOCK_HOLD_TIME = Histogram(
+    "contentcuration_mptt_lock_hold_seconds",
+    "Time ContentNode trees were kept locked for MPTT updates",
+)
+
 
 class CustomManager(Manager.from_queryset(CTEQuerySet)):
     """
@@ -46,14 +74,74 @@ def log_lock_time_spent(timespent):
     logging.debug("Spent {} seconds inside an mptt lock".format(timespent))
 
 
-def execute_queryset_without_results(queryset):
-    query = queryset.query
-    compiler = query.get_compiler(queryset.db)
-    sql, params = compiler.as_sql()
-    if not sql:
-        return
-    cursor = compiler.connection.cursor()
-    cursor.execute(sql, params)
+class TreeLayout(object):
+    """
+    Keeps track of where the lft and rght values of some trees end up as subtrees are moved around in memory.
+    Each tree is kept as a list of runs of the values the trees had to begin with, as
+    [tree_id, first value, last value, level change], in the order they now come in, so a move only splits
+    and moves a few runs, however many nodes it moves.
+    """
+
+    def __init__(self, tree_sizes):
+        self.trees = {tree_id: [[tree_id, 1, size, 0]] for tree_id, size in tree_sizes.items()}
+
+    def locate(self, tree_id, value):
+        """
+        Returns where a value that a tree had to begin with is now, as (tree_id, value, level change).
+        """
+        for current_tree_id, runs in self.trees.items():
+            position = 1
+            for run_tree_id, first, last, level_change in runs:
+                if run_tree_id == tree_id and first <= value <= last:
+                    return current_tree_id, position + value - first, level_change
+                position += last - first + 1
+        raise ValueError("Value {} of tree {} is not in the layout".format(value, tree_id))
+
+    def _split(self, tree_id, value):
+        """
+        Splits the runs of a tree so that one starts at the value, and returns its index.
+        """
+        runs = self.trees[tree_id]
+        position = 1
+        for index, run in enumerate(runs):
+            if value == position:
+                return index
+            length = run[2] - run[1] + 1
+            if value < position + length:
+                first = run[1] + value - position
+                runs[index:index + 1] = [[run[0], run[1], first - 1, run[3]], [run[0], first, run[2], run[3]]]
+                return index + 1
+            position += length
+        return len(runs)
+
+    def move(self, tree_id, lft, rght, target_tree_id, value, level_change):
+        """
+        Moves the values from lft to rght of a tree to where the value of the target tree is before the move.
+        """
+        runs = self.trees[tree_id]
+        start = self._split(tree_id, lft)
+        end = self._split(tree_id, rght + 1)
+        moved = runs[start:end]
+        del runs[start:end]
+        if target_tree_id == tree_id and value > rght:
+            value -= rght - lft + 1
+        for run in moved:
+            run[3] += level_change
+        index = self._split(target_tree_id, value)
+        self.trees[target_tree_id][index:index] = moved
+
+    def changed_runs(self):
+        """
+        Returns the runs whose values have moved, as (tree_id, first value, last value, new tree_id, shift, level change).
+        """
+        changed = []
+        for current_tree_id, runs in self.trees.items():
+            position = 1
+            for tree_id, first, last, level_change in runs:
+                if (current_tree_id, position, level_change) != (tree_id, first, 0):
+                    changed.append((tree_id, first, last, current_tree_id, position - first, level_change))
+                position += last - first + 1
+        return changed
 
 
 class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)):
@@ -81,7 +169,7 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         return new_id
 
     @contextlib.contextmanager
-    def _attempt_lock(self, tree_ids, values):
+    def _attempt_lock(self, tree_ids):
         """
         Internal method to allow the lock_mptt method to do retries in case of deadlocks
         """
@@ -91,15 +179,16 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
             # in a predictable order.
             # This will mean that every process acquires locks in the same order
             # and should help to minimize deadlocks
-            for tree_id in tree_ids:
-                execute_queryset_without_results(
-                    self.select_for_update()
-                    .order_by()
-                    .filter(tree_id=tree_id)
-                    .values(*values)
-                )
-            yield
-            log_lock_time_spent(time.time() - start)
+            with connection.cursor() as cursor:
+                for tree_id in tree_ids:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [MPTT_ADVISORY_LOCK_ID, tree_id])
+            locked = time.time()
+            MPTT_LOCK_WAIT_TIME.observe(locked - start)
+            try:
+                yield
+            finally:
+                MPTT_LOCK_HOLD_TIME.observe(time.time() - locked)
+                log_lock_time_spent(time.time() - start)
 
     @contextlib.contextmanager
     def lock_mptt(self, *tree_ids):
@@ -111,25 +200,18 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
             and self.model._mptt_updates_enabled
             and tree_ids
         ):
-            # Lock based on MPTT columns for updates on any of the tree_ids specified
-            # until the end of this transaction
-            mptt_opts = self.model._mptt_meta
-            values = (
-                mptt_opts.tree_id_attr,
-                mptt_opts.left_attr,
-                mptt_opts.right_attr,
-                mptt_opts.level_attr,
-                mptt_opts.parent_attr,
-            )
+            # Lock the tree_ids specified for MPTT updates until the end of this transaction.
+            # This only excludes other MPTT updates to the same trees, rather than scanning
+            # and locking every row of the trees, which would also block edits to the nodes.
             try:
-                with self._attempt_lock(tree_ids, values):
+                with self._attempt_lock(tree_ids):
                     yield
             except OperationalError as e:
                 if "deadlock detected" in e.args[0]:
                     logging.error(
                         "Deadlock detected while trying to lock ContentNode trees for mptt operations, retrying"
                     )
-                    with self._attempt_lock(tree_ids, values):
+                    with self._attempt_lock(tree_ids):
                         yield
                 else:
                     raise
@@ -141,6 +223,53 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         with self.lock_mptt(tree_id):
             return super(CustomContentNodeTreeManager, self).partial_rebuild(tree_id)
 
+    def fast_rebuild(self, tree_id):
+        """
+        Does the same as partial_rebuild, but computes the MPTT fields of the whole tree in the database
+        and sets them with a single UPDATE, rather than walking the tree and updating each node.
+
+        The tree is walked from its root by parent links, so descendants that were moved into it
+        with MPTT updates disabled get the tree_id too. Siblings are kept in the order of their
+        lft values, which nodes added with MPTT updates disabled can share, so ties are broken by
+        their sort_order.
+        """
+        roots = list(self._mptt_filter(parent=None, tree_id=tree_id).values_list("pk", flat=True)[:2])
+        if not roots:
+            return
+        if len(roots) > 1:
+            raise RuntimeError(
+                "More than one root node with tree_id {}. That's invalid, do a full rebuild.".format(tree_id)
+            )
+        # The pre-order position of each node in the tree is found by ordering the nodes by the path of
+        # sibling ranks from the root to them. Before entering the node at position i, i nodes have been
+        # entered and all but its `level` ancestors left again, so lft is 2i - level + 1, and rght follows
+        # from lft by counting the node and its descendants, which is the number of paths it is on.
+        sql = (
+            "WITH RECURSIVE tree AS ("
+            "SELECT id, parent_id, lft, sort_order FROM {table} WHERE id = %s "
+            "UNION ALL "
+            "SELECT n.id, n.parent_id, n.lft, n.sort_order FROM {table} n INNER JOIN tree t ON n.parent_id = t.id), "
+            "ranks AS ("
+            "SELECT id, parent_id, ROW_NUMBER() OVER (PARTITION BY parent_id ORDER BY lft, sort_order, id) AS rank "
+            "FROM tree), "
+            "paths AS ("
+            "SELECT id, 0 AS level, ARRAY[rank] AS path, ARRAY[id] AS ancestors FROM ranks WHERE id = %s "
+            "UNION ALL "
+            "SELECT r.id, p.level + 1, p.path || r.rank, p.ancestors || r.id FROM ranks r "
+            "INNER JOIN paths p ON r.parent_id = p.id), "
+            "sizes AS (SELECT UNNEST(ancestors) AS id, COUNT(*) AS size FROM paths GROUP BY 1), "
+            "positions AS ("
+            "SELECT p.id, p.level, 2 * (ROW_NUMBER() OVER (ORDER BY p.path) - 1) - p.level + 1 AS lft, s.size "
+            "FROM paths p INNER JOIN sizes s ON s.id = p.id) "
+            "UPDATE {table} AS n SET tree_id = %s, lft = p.lft, rght = p.lft + 2 * p.size - 1, level = p.level "
+            "FROM positions p WHERE n.id = p.id "
+            # Only write the nodes that were out of place
+            "AND (n.tree_id, n.lft, n.rght, n.level) IS DISTINCT FROM (%s, p.lft, p.lft + 2 * p.size - 1, p.level)"
+        ).format(table=self.model._meta.db_table)
+        with self.lock_mptt(tree_id):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [roots[0], roots[0], tree_id, tree_id])
+
     def _move_child_to_new_tree(self, node, target, position):
         from contentcuration.models import PrerequisiteContentRelationship
 
@@ -223,6 +352,154 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
             sender=node.__class__, instance=node, target=target, position=position,
         )
 
+    def move_nodes(self, moves):
+        """
+        Makes a list of moves, given as (node, target, position) in the order they were made, with the same
+        result as calling move_node for each of them. Rather than shifting the lft and rght values of the
+        trees once per move, the layout the trees end up with is worked out in memory, and applied with a
+        few UPDATEs under a single lock of all the trees involved.
+
+        Returns the error of each move, or None for the moves that were made.
+        """
+        from contentcuration.models import ContentNodeTreeStats
+
+        if self.model._mptt_is_tracking or not self.model._mptt_updates_enabled:
+            # The tree fields are not being kept up to date, so there is nothing to gain from moving together
+            return self._move_nodes_separately(moves)
+
+        nodes = [node for node, target, position in moves] + [target for node, target, position in moves]
+        with self.lock_mptt(*[node.tree_id for node in nodes]):
+            self._mptt_refresh(*nodes)
+            parents = dict(self.filter(pk__in=[node.id for node in nodes]).values_list("id", "parent_id"))
+            old_parents = dict(parents)
+            tree_ids = set(node.tree_id for node in nodes)
+            layout = TreeLayout(dict(self.filter(tree_id__in=tree_ids, parent=None).values_list("tree_id", "rght")))
+
+            errors = []
+            moved = OrderedDict()
+            for node, target, position in moves:
+                try:
+                    parents[node.id] = self._plan_move(layout, parents, node, target, position)
+                    moved[node.id] = node
+                    errors.append(None)
+                except InvalidMove as e:
+                    errors.append(str(e))
+            if moved:
+                ContentNodeTreeStats.nodes_moved(
+                    list(moved.values()),
+                    functools.partial(self._apply_moves, layout, nodes, moved, old_parents, parents),
+                )
+
+        for (node, target, position), error in zip(moves, errors):
+            if error is None:
+                node_moved.send(
+                    sender=node.__class__, instance=node, target=target, position=position,
+                )
+        return errors
+
+    def _move_nodes_separately(self, moves):
+        errors = []
+        for node, target, position in moves:
+            try:
+                self.move_node(node, target, position)
+                errors.append(None)
+            except (InvalidMove, ValueError) as e:
+                errors.append(str(e))
+        return errors
+
+    def _plan_move(self, layout, parents, node, target, position):
+        """
+        Makes a move in the layout, checking it as mptt would, and returns the new parent of the node.
+        """
+        tree_id, lft, level_change = layout.locate(node.tree_id, node.lft)
+        rght = layout.locate(node.tree_id, node.rght)[1]
+        target_tree_id, target_lft, target_level_change = layout.locate(target.tree_id, target.lft)
+        target_rght = layout.locate(target.tree_id, target.rght)[1]
+        if position in ("first-child", "last-child"):
+            parent_id = target.id
+            level = target.level + target_level_change + 1
+        elif position in ("left", "right"):
+            parent_id = parents[target.id]
+            level = target.level + target_level_change
+        else:
+            raise InvalidMove("An invalid position was given: {}.".format(position))
+        if parents[node.id] is None or parent_id is None:
+            raise InvalidMove("Root nodes can't be moved, and nodes can't be made siblings of them.")
+        if tree_id == target_tree_id and lft <= target_lft and target_rght <= rght:
+            raise InvalidMove("A node may not be moved next to or into itself or any of its descendants.")
+        value = {
+            "first-child": target_lft + 1,
+            "last-child": target_rght,
+            "left": target_lft,
+            "right": target_rght + 1,
+        }[position]
+        layout.move(tree_id, lft, rght, target_tree_id, value, level - node.level - level_change)
+        return parent_id
+
+    def _apply_moves(self, layout, nodes, moved, old_parents, parents):
+        """
+        Writes the moves planned in the layout to the database, and updates the nodes to match.
+        Returns the (tree_id, lft, rght) each of the moved nodes ends up at.
+        """
+        from contentcuration.models import PrerequisiteContentRelationship
+
+        old_tree_ids = {node_id: node.tree_id for node_id, node in moved.items()}
+        self._apply_layout(layout)
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE {} AS n SET parent_id = m.parent_id, changed = true, modified = %s "
+                "FROM UNNEST(%s::varchar[], %s::varchar[]) AS m (id, parent_id) "
+                "WHERE n.id = m.id".format(self.model._meta.db_table),
+                [now, list(moved), [parents[node_id] for node_id in moved]],
+            )
+        # Like saving a node with a new parent, this marks both the old and the new parent as changed
+        self.filter(pk__in=set(old_parents[node_id] for node_id in moved) | set(parents[node_id] for node_id in moved)).update(changed=True)
+        self._mptt_refresh(*nodes)
+        for node in nodes:
+            if node.id in moved:
+                node.parent_id = parents[node.id]
+                node.changed = True
+                node.modified = now
+        # As in _move_child_to_new_tree, prerequisites don't follow nodes into other trees
+        other_tree = [node_id for node_id, node in moved.items() if node.tree_id != old_tree_ids[node_id]]
+        if other_tree:
+            PrerequisiteContentRelationship.objects.filter(
+                Q(prerequisite_id__in=other_tree) | Q(target_node_id__in=other_tree)
+            ).delete()
+        return {node_id: (node.tree_id, node.lft, node.rght) for node_id, node in moved.items()}
+
+    def _apply_layout(self, layout):
+        """
+        Sets the tree fields of the nodes whose lft or rght values have moved in the layout.
+        """
+        runs = layout.changed_runs()
+        if not runs:
+            return
+        runs_sql = (
+            "WITH runs AS (SELECT * FROM UNNEST("
+            "%s::integer[], %s::integer[], %s::integer[], %s::integer[], %s::integer[], %s::integer[]"
+            ") AS r (tree_id, first, last, new_tree_id, shift, level_change)) "
+        )
+        params = [list(column) for column in zip(*runs)]
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            # The ancestors of moved nodes that stay where they are only have their rght values moved.
+            # These are updated first, as the next update moves the lft values they are told apart by.
+            cursor.execute(
+                runs_sql + "UPDATE {table} AS n SET rght = n.rght + r.shift FROM runs r "
+                "WHERE n.tree_id = r.tree_id AND n.rght BETWEEN r.first AND r.last AND NOT EXISTS ("
+                "SELECT 1 FROM runs l WHERE l.tree_id = n.tree_id AND n.lft BETWEEN l.first AND l.last)".format(table=table),
+                params,
+            )
+            cursor.execute(
+                runs_sql + "UPDATE {table} AS n SET tree_id = l.new_tree_id, lft = n.lft + l.shift, "
+                "level = n.level + l.level_change, rght = n.rght + COALESCE(("
+                "SELECT r.shift FROM runs r WHERE r.tree_id = n.tree_id AND n.rght BETWEEN r.first AND r.last"
+                "), 0) FROM runs l WHERE n.tree_id = l.tree_id AND n.lft BETWEEN l.first AND l.last".format(table=table),
+                params,
+            )
+
     def get_source_attributes(self, source):
         """
         These attributes will be copied when the node is copied
@@ -245,7 +522,7 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         }
 
     def _clone_node(
-        self, source, parent_id, source_channel_id, can_edit_source_channel, pk, mods
+        self, source, parent_id, source_channel_id, can_edit_source_channel, pk, mods, lazy=False
     ):
         copy = {
             "id": pk or uuid.uuid4().hex,
@@ -261,6 +538,9 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
             "changed": True,
             "published": False,
             "parent_id": parent_id,
+            # Copies of nodes that share their content keep sharing it, with the node that has it
+            "content_source_id": source.content_source_id
+            or (source.id if lazy else None),
         }
 
         copy.update(self.get_source_attributes(source))
@@ -273,17 +553,22 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
             copy["original_channel_id"] is None
             or copy["original_source_node_id"] is None
         ):
-            original_node = source.get_original_node()
-            if copy["original_channel_id"] is None:
-                original_channel = original_node.get_channel()
-                copy["original_channel_id"] = (
-                    original_channel.id if original_channel else None
-                )
-            if copy["original_source_node_id"] is None:
-                copy["original_source_node_id"] = original_node.node_id
+            copy.update(self._get_legacy_original_ids(source, copy))
 
         return copy
 
+    def _get_legacy_original_ids(self, source, copy):
+        original_ids = {}
+        original_node = source.get_original_node()
+        if copy["original_channel_id"] is None:
+            original_channel = original_node.get_channel()
+            original_ids["original_channel_id"] = (
+                original_channel.id if original_channel else None
+            )
+        if copy["original_source_node_id"] is None:
+            original_ids["original_source_node_id"] = original_node.node_id
+        return original_ids
+
     def _recurse_to_create_tree(
         self,
         source,
@@ -294,9 +579,10 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         can_edit_source_channel,
         pk,
         mods,
+        lazy=False,
     ):
         copy = self._clone_node(
-            source, parent_id, source_channel_id, can_edit_source_channel, pk, mods,
+            source, parent_id, source_channel_id, can_edit_source_channel, pk, mods, lazy,
         )
 
         if source.kind_id == content_kinds.TOPIC and source.id in nodes_by_parent:
@@ -312,6 +598,7 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
                         can_edit_source_channel,
                         None,
                         None,
+                        lazy,
                     ),
                     children,
                 )
@@ -339,7 +626,16 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         excluded_descendants=None,
         can_edit_source_channel=None,
         batch_size=None,
+        lazy=False,
     ):
+        """
+        Copies node and its descendants to `position` relative to `target`. If `lazy` is set, the copies
+        share the files and assessment items of the nodes they are copied from, through their content_source,
+        until they are first edited, see materialize_content.
+
+        The copy is made in a single transaction, so if the task running it is cancelled, which is checked
+        between its steps, no part of it is left behind.
+        """
         if batch_size is None:
             batch_size = BATCH_SIZE
         source_channel_id = node.get_channel_id()
@@ -348,17 +644,19 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
 
         set_total(total_nodes)
 
-        return self._copy(
-            node,
-            target,
-            position,
-            source_channel_id,
-            pk,
-            mods,
-            excluded_descendants,
-            can_edit_source_channel,
-            batch_size,
-        )
+        with transaction.atomic():
+            return self._copy(
+                node,
+                target,
+                position,
+                source_channel_id,
+                pk,
+                mods,
+                excluded_descendants,
+                can_edit_source_channel,
+                batch_size,
+                lazy,
+            )
 
     def _copy(
         self,
@@ -371,6 +669,7 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         excluded_descendants,
         can_edit_source_channel,
         batch_size,
+        lazy=False,
     ):
         if node.rght - node.lft < batch_size:
             return self._deep_copy(
@@ -382,33 +681,20 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
                 mods,
                 excluded_descendants,
                 can_edit_source_channel,
+                lazy,
             )
         else:
-            node_copy = self._shallow_copy(
+            return self._set_copy(
                 node,
                 target,
                 position,
                 source_channel_id,
                 pk,
                 mods,
+                excluded_descendants,
                 can_edit_source_channel,
+                lazy,
             )
-            children = node.get_children().order_by("lft")
-            if excluded_descendants:
-                children = children.exclude(node_id__in=excluded_descendants.keys())
-            for child in children:
-                self._copy(
-                    child,
-                    node_copy,
-                    "last-child",
-                    source_channel_id,
-                    None,
-                    None,
-                    excluded_descendants,
-                    can_edit_source_channel,
-                    batch_size,
-                )
-            return [node_copy]
 
     def _parse_filter_kwargs(self, contentnode, contentnode__in):
         filter_kwargs = {}
@@ -529,40 +815,15 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         File.objects.bulk_create(node_files)
 
     def _copy_associated_objects(
-        self, source_copy_id_map, contentnode=None, contentnode__in=None
+        self, source_copy_id_map, contentnode=None, contentnode__in=None, lazy=False
     ):
-        self._copy_files(source_copy_id_map, contentnode, contentnode__in)
+        if not lazy:
+            self._copy_files(source_copy_id_map, contentnode, contentnode__in)
 
-        self._copy_assessment_items(source_copy_id_map, contentnode, contentnode__in)
+            self._copy_assessment_items(source_copy_id_map, contentnode, contentnode__in)
 
         self._copy_tags(source_copy_id_map, contentnode, contentnode__in)
 
-    def _shallow_copy(
-        self,
-        node,
-        target,
-        position,
-        source_channel_id,
-        pk,
-        mods,
-        can_edit_source_channel,
-    ):
-        data = self._clone_node(
-            node, None, source_channel_id, can_edit_source_channel, pk, mods,
-        )
-        with self.lock_mptt(target.tree_id if target else None):
-            node_copy = self.model(**data)
-            if target:
-                self._mptt_refresh(target)
-            self.insert_node(node_copy, target, position=position, save=False)
-            node_copy.save(force_insert=True)
-
-        self._copy_associated_objects(
-            {node.id: node_copy.id}, contentnode=node,
-        )
-        increment_progress(1)
-        return node_copy
-
     def _deep_copy(
         self,
         node,
@@ -573,6 +834,7 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         mods,
         excluded_descendants,
         can_edit_source_channel,
+        lazy=False,
     ):
 
         nodes_to_copy = self._all_nodes_to_copy(node, excluded_descendants)
@@ -586,16 +848,23 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
 
         source_copy_id_map = {}
 
+        if target and position in ("left", "right"):
+            parent_id = target.parent_id
+        else:
+            parent_id = target.id if target else None
+
         data = self._recurse_to_create_tree(
             node,
-            target.id if target else None,
+            parent_id,
             source_channel_id,
             nodes_by_parent,
             source_copy_id_map,
             can_edit_source_channel,
             pk,
             mods,
+            lazy,
         )
+        check_cancelled()
 
         with self.lock_mptt(target.tree_id if target else None):
             if target:
@@ -607,27 +876,374 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         if target:
             self.filter(pk=target.pk).update(changed=True)
 
-        self._copy_associated_objects(source_copy_id_map, contentnode__in=nodes_to_copy)
+        check_cancelled()
+        self._copy_associated_objects(source_copy_id_map, contentnode__in=nodes_to_copy, lazy=lazy)
+
+        self._add_copy_to_tree_stats(data["id"])
 
         increment_progress(len(nodes_to_copy))
 
         return new_nodes
 
-    def build_tree_nodes(self, data, target=None, position="last-child"):
+    def _set_copy(
+        self,
+        node,
+        target,
+        position,
+        source_channel_id,
+        pk,
+        mods,
+        excluded_descendants,
+        can_edit_source_channel,
+        lazy=False,
+    ):
         """
-        vendored from:
-        https://github.com/django-mptt/django-mptt/blob/fe2b9cc8cfd8f4b764d294747dba2758147712eb/mptt/managers.py#L614
+        Copies a large subtree with a fixed number of queries, however many nodes it has. The position of every
+        copy is worked out up front and put in a temporary table that maps each source node to its copy,
+        so that the space for the copies is opened once, and the copies of the nodes and of their
+        files, assessment items, tags and prerequisites are each made with one INSERT ... SELECT.
+        """
+        with transaction.atomic(), self.lock_mptt(target.tree_id if target else None):
+            self._mptt_refresh(node)
+            if target:
+                self._mptt_refresh(target)
+            tree_id, parent_id, cursor, level = self._get_insert_position(target, position)
+            copy_map = self._build_copy_map(node, pk, parent_id, cursor, level, excluded_descendants)
+            check_cancelled()
+            if target:
+                self._create_space(2 * len(copy_map), cursor - 1, tree_id)
+
+            with connection.cursor() as db_cursor:
+                self._create_copy_map_table(db_cursor, copy_map)
+                self._insert_node_copies(db_cursor, tree_id, source_channel_id, can_edit_source_channel, lazy)
+                check_cancelled()
+                self._insert_associated_object_copies(db_cursor, lazy)
+                db_cursor.execute("DROP TABLE {}".format(COPY_MAP_TABLE))
+
+            copy_id = copy_map[0][1]
+            self._set_legacy_original_ids(tree_id, copy_map[0][4], copy_map[0][5])
+            if isinstance(mods, dict):
+                self.filter(pk=copy_id).update(**mods)
+        if target:
+            self.filter(pk=target.pk).update(changed=True)
+
+        self._add_copy_to_tree_stats(copy_id)
+
+        increment_progress(len(copy_map))
+
+        return [self.get(pk=copy_id)]
+
+    def _build_copy_map(self, node, pk, parent_id, cursor, level, excluded_descendants):
+        """
+        Returns a row for each node to copy, in tree order, with its id, the ids of its copy, the parent of the copy
+        and the MPTT fields of the copy, numbering the copies from `cursor` in the same way as build_tree_nodes.
+        """
+        excluded_node_ids = set(excluded_descendants or ())
+        nodes_to_copy = node.get_descendants(include_self=True).order_by("lft").values_list(
+            "id", "node_id", "kind_id", "lft", "rght"
+        )
+
+        copy_map = []
+        open_copies = []
+        skip_until = None
+        for source_id, node_id, kind_id, lft, rght in nodes_to_copy:
+            check_cancelled()
+            if skip_until is not None and lft < skip_until:
+                continue
+            skip_until = None
+            if node_id in excluded_node_ids and source_id != node.id:
+                skip_until = rght
+                continue
+            # Close the copies of the nodes this one is not inside of
+            while open_copies and open_copies[-1][0] < lft:
+                open_copies.pop()[1][5] = cursor
+                cursor += 1
+            copy = [
+                source_id,
+                (pk if source_id == node.id else None) or uuid.uuid4().hex,
+                uuid.uuid4().hex,
+                open_copies[-1][1][1] if open_copies else parent_id,
+                cursor,
+                None,
+                level + len(open_copies),
+            ]
+            cursor += 1
+            copy_map.append(copy)
+            open_copies.append((rght, copy))
+            if kind_id != content_kinds.TOPIC:
+                # Only the children of topics are copied
+                skip_until = rght
+        while open_copies:
+            open_copies.pop()[1][5] = cursor
+            cursor += 1
+        return copy_map
+
+    def _create_copy_map_table(self, cursor, copy_map):
+        cursor.execute(
+            "CREATE TEMPORARY TABLE {} ("
+            "source_id varchar(32) PRIMARY KEY, copy_id varchar(32), copy_node_id varchar(32), parent_id varchar(32), "
+            "lft integer, rght integer, level integer"
+            ") ON COMMIT DROP".format(COPY_MAP_TABLE)
+        )
+        cursor.execute(
+            "INSERT INTO {} SELECT * FROM UNNEST("
+            "%s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[], %s::integer[], %s::integer[], %s::integer[]"
+            ")".format(COPY_MAP_TABLE),
+            [list(column) for column in zip(*copy_map)],
+        )
+        cursor.execute("ANALYZE {}".format(COPY_MAP_TABLE))
+
+    def _copy_rows_sql(self, model, alias, expressions):
+        """
+        Returns the columns, select list and params to copy rows of `model` selected as `alias` with INSERT ... SELECT,
+        with the values of the fields in `expressions` replaced. Auto incremented ids are left to the database.
+        """
+        qn = connection.ops.quote_name
+        columns = []
+        selects = []
+        params = []
+        for field in model._meta.concrete_fields:
+            if isinstance(field, AutoField):
+                continue
+            columns.append(qn(field.column))
+            if field.attname in expressions:
+                expression, expression_params = expressions[field.attname]
+            else:
+                expression, expression_params = "{}.{}".format(alias, qn(field.column)), []
+            selects.append(expression)
+            params.extend(expression_params)
+        return ", ".join(columns), ", ".join(selects), params
+
+    def _insert_node_copies(self, cursor, tree_id, source_channel_id, can_edit_source_channel, lazy):
+        now = timezone.now()
+        copied_fields = set(self.get_source_attributes(self.model())) | {"aggregator"}
+        expressions = {}
+        # Fields that are not copied from the source, or set like in _clone_node, get their defaults
+        for field in self.model._meta.concrete_fields:
+            if field.attname not in copied_fields:
+                default = now if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False) else field.get_default()
+                expressions[field.attname] = ("%s", [field.get_db_prep_save(default, connection)])
+        expressions.update({
+            "id": ("m.copy_id", []),
+            "node_id": ("m.copy_node_id", []),
+            "parent_id": ("m.parent_id", []),
+            "tree_id": ("%s", [tree_id]),
+            "lft": ("m.lft", []),
+            "rght": ("m.rght", []),
+            "level": ("m.level", []),
+            "cloned_source_id": ("n.id", []),
+            "source_channel_id": ("%s", [source_channel_id]),
+            "source_node_id": ("n.node_id", []),
+            "original_channel_id": ("n.original_channel_id", []),
+            "original_source_node_id": ("n.original_source_node_id", []),
+            "freeze_authoring_data": ("(%s OR n.freeze_authoring_data)", [not can_edit_source_channel]),
+            "content_source_id": ("COALESCE(n.content_source_id, n.id)" if lazy else "n.content_source_id", []),
+        })
+        columns, selects, params = self._copy_rows_sql(self.model, "n", expressions)
+        cursor.execute(
+            "INSERT INTO {node} ({columns}) SELECT {selects} FROM {node} n "
+            "INNER JOIN {copy_map} m ON m.source_id = n.id".format(
+                node=self.model._meta.db_table, copy_map=COPY_MAP_TABLE, columns=columns, selects=selects,
+            ),
+            params,
+        )
+
+    def _insert_associated_object_copies(self, cursor, lazy):
+        from contentcuration.models import AssessmentItem
+        from contentcuration.models import ContentTag
+        from contentcuration.models import File
+        from contentcuration.models import PrerequisiteContentRelationship
+
+        tables = {
+            "copy_map": COPY_MAP_TABLE,
+            "file": File._meta.db_table,
+            "item": AssessmentItem._meta.db_table,
+            "tag": ContentTag._meta.db_table,
+            "node_tag": self.model.tags.through._meta.db_table,
+            "prerequisite": PrerequisiteContentRelationship._meta.db_table,
+        }
+
+        if not lazy:
+            columns, selects, params = self._copy_rows_sql(
+                File, "f", {"id": (NEW_ID_SQL.format("f.id"), []), "contentnode_id": ("m.copy_id", [])}
+            )
+            cursor.execute(
+                "INSERT INTO {file} ({columns}) SELECT {selects} FROM {file} f "
+                "INNER JOIN {copy_map} m ON m.source_id = f.contentnode_id".format(columns=columns, selects=selects, **tables),
+                params,
+            )
+
+            columns, selects, params = self._copy_rows_sql(AssessmentItem, "a", {"contentnode_id": ("m.copy_id", [])})
+            cursor.execute(
+                "INSERT INTO {item} ({columns}) SELECT {selects} FROM {item} a "
+                "INNER JOIN {copy_map} m ON m.source_id = a.contentnode_id".format(columns=columns, selects=selects, **tables),
+                params,
+            )
+            # The copies of the assessment items are matched to the items they were copied from by their assessment_id
+            columns, selects, params = self._copy_rows_sql(
+                File, "f", {"id": (NEW_ID_SQL.format("f.id"), []), "assessment_item_id": ("c.id", [])}
+            )
+            cursor.execute(
+                "INSERT INTO {file} ({columns}) SELECT {selects} FROM {file} f "
+                "INNER JOIN {item} a ON a.id = f.assessment_item_id "
+                "INNER JOIN {copy_map} m ON m.source_id = a.contentnode_id "
+                "INNER JOIN {item} c ON c.contentnode_id = m.copy_id AND c.assessment_id = a.assessment_id".format(
+                    columns=columns, selects=selects, **tables
+                ),
+                params,
+            )
+
+        # Copies are tagged with the tags that have no channel, so make those for any channel tags first
+        cursor.execute(
+            "INSERT INTO {tag} (id, tag_name, channel_id) "
+            "SELECT {new_id}, names.tag_name, NULL FROM ("
+            "SELECT DISTINCT t.tag_name FROM {node_tag} nt "
+            "INNER JOIN {copy_map} m ON m.source_id = nt.contentnode_id "
+            "INNER JOIN {tag} t ON t.id = nt.contenttag_id "
+            "WHERE t.channel_id IS NOT NULL AND NOT EXISTS ("
+            "SELECT 1 FROM {tag} e WHERE e.tag_name = t.tag_name AND e.channel_id IS NULL)"
+            ") names".format(new_id=NEW_ID_SQL.format("names.tag_name"), **tables)
+        )
+        cursor.execute(
+            "INSERT INTO {node_tag} (contentnode_id, contenttag_id) "
+            "SELECT DISTINCT m.copy_id, CASE WHEN t.channel_id IS NULL THEN t.id ELSE ("
+            "SELECT e.id FROM {tag} e WHERE e.tag_name = t.tag_name AND e.channel_id IS NULL ORDER BY e.id LIMIT 1"
+            ") END FROM {node_tag} nt "
+            "INNER JOIN {copy_map} m ON m.source_id = nt.contentnode_id "
+            "INNER JOIN {tag} t ON t.id = nt.contenttag_id".format(**tables)
+        )
+
+        cursor.execute(
+            "INSERT INTO {prerequisite} (target_node_id, prerequisite_id) "
+            "SELECT target.copy_id, prerequisite.copy_id FROM {prerequisite} p "
+            "INNER JOIN {copy_map} target ON target.source_id = p.target_node_id "
+            "INNER JOIN {copy_map} prerequisite ON prerequisite.source_id = p.prerequisite_id".format(**tables)
+        )
+
+    def _set_legacy_original_ids(self, tree_id, lft, rght):
+        """
+        Sets the original ids on the copies of legacy nodes that don't have them, as _clone_node does.
+        """
+        legacy_copies = self.filter(tree_id=tree_id, lft__gte=lft, rght__lte=rght).filter(
+            Q(original_channel_id__isnull=True) | Q(original_source_node_id__isnull=True)
+        ).select_related("cloned_source")
+        for copy in legacy_copies:
+            original_ids = self._get_legacy_original_ids(
+                copy.cloned_source,
+                {"original_channel_id": copy.original_channel_id, "original_source_node_id": copy.original_source_node_id},
+            )
+            self.filter(pk=copy.pk).update(**original_ids)
+
+    def _add_copy_to_tree_stats(self, copy_id):
+        """
+        Builds the tree stats of a subtree that was created in bulk, and adds its counts to its ancestors.
+        """
+        from contentcuration.models import ContentNodeTreeStats
+
+        node_copy = self.get(pk=copy_id)
+        with self.lock_mptt(node_copy.tree_id):
+            self._mptt_refresh(node_copy)
+            ContentNodeTreeStats.rebuild(node_copy.tree_id, node_copy.lft, node_copy.rght)
+            counts = ContentNodeTreeStats.get_node_counts(
+                *[getattr(node_copy, field) for field in ContentNodeTreeStats.node_fields]
+            )
+            ContentNodeTreeStats.add_to_ancestors(
+                node_copy.id, ContentNodeTreeStats.get_subtree_counts(node_copy, counts)
+            )
+
+    def _copy_instance(self, instance, **values):
+        fields = {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+        fields.update(values)
+        return type(instance)(**fields)
+
+    def materialize_content(self, node_ids):
+        """
+        Gives the nodes that share the files and assessment items of their content_source copies of their own,
+        so that they can be edited without changing the node they share them with. Returns the ids of the copies
+        by the id of the node they were made for and the id of the file or assessment item they were copied from.
+        """
+        from contentcuration.models import AssessmentItem
+        from contentcuration.models import File
+
+        copy_ids = {}
+        with transaction.atomic():
+            references = list(
+                self.select_for_update().filter(pk__in=node_ids, content_source__isnull=False).order_by()
+                .values_list("id", "content_source_id")
+            )
+            if not references:
+                return copy_ids
+            nodes_by_source = {}
+            for node_id, source_id in references:
+                nodes_by_source.setdefault(source_id, []).append(node_id)
+
+            items = list(AssessmentItem.objects.filter(contentnode_id__in=nodes_by_source))
+            item_copies = []
+            for item in items:
+                for node_id in nodes_by_source[item.contentnode_id]:
+                    item_copies.append((item.id, self._copy_instance(item, id=None, contentnode_id=node_id)))
+            AssessmentItem.objects.bulk_create([item_copy for _item_id, item_copy in item_copies])
+            for item_id, item_copy in item_copies:
+                copy_ids[(item_copy.contentnode_id, item_id)] = item_copy.id
+
+            source_ids_by_item = {item.id: item.contentnode_id for item in items}
+            file_copies = []
+            for file in File.objects.filter(
+                Q(contentnode_id__in=nodes_by_source) | Q(assessment_item_id__in=source_ids_by_item)
+            ):
+                if file.assessment_item_id:
+                    for node_id in nodes_by_source[source_ids_by_item[file.assessment_item_id]]:
+                        file_copy = self._copy_instance(
+                            file, id=uuid.uuid4().hex, assessment_item_id=copy_ids[(node_id, file.assessment_item_id)]
+                        )
+                        copy_ids[(node_id, file.id)] = file_copy.id
+                        file_copies.append(file_copy)
+                else:
+                    for node_id in nodes_by_source[file.contentnode_id]:
+                        file_copy = self._copy_instance(file, id=uuid.uuid4().hex, contentnode_id=node_id)
+                        copy_ids[(node_id, file.id)] = file_copy.id
+                        file_copies.append(file_copy)
+            File.objects.bulk_create(file_copies)
+
+            self.filter(pk__in=[node_id for node_id, _source_id in references]).update(content_source=None)
+        return copy_ids
+
+    def prepare_content_edit(self, node_ids):
+        """
+        Makes the files and assessment items of the nodes safe to edit, by materializing them for the nodes that
+        share those of another node, and for the nodes that share theirs. Returns the ids of the copies made.
+        """
+        node_ids = list(node_ids)
+        return self.materialize_content(
+            self.filter(Q(pk__in=node_ids) | Q(content_source_id__in=node_ids)).values_list("id", flat=True)
+        )
+
+    def release_content_references(self, nodes):
+        """
+        Materializes the content of the nodes that share the files and assessment items of any of `nodes`, so that
+        `nodes` can be deleted. `nodes` has to include the descendants of the nodes that are going to be deleted.
+        """
+        references = self.filter(content_source__in=nodes)
+        self.materialize_content(references.exclude(pk__in=nodes).values_list("id", flat=True))
+        references.update(content_source=None)
+
+    def _get_insert_position(self, target, position):
+        """
+        Returns the tree_id, parent id, lft and level of a node to be inserted at `position` relative to `target`,
+        or as the root of a new tree if there is no target.
         """
         opts = self.model._mptt_meta
         if target:
             tree_id = target.tree_id
             if position in ("left", "right"):
+                parent_id = getattr(target, opts.parent_attr + "_id")
                 level = getattr(target, opts.level_attr)
                 if position == "left":
                     cursor = getattr(target, opts.left_attr)
                 else:
                     cursor = getattr(target, opts.right_attr) + 1
             else:
+                parent_id = target.id
                 level = getattr(target, opts.level_attr) + 1
                 if position == "first-child":
                     cursor = getattr(target, opts.left_attr) + 1
@@ -635,8 +1251,18 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
                     cursor = getattr(target, opts.right_attr)
         else:
             tree_id = self._get_next_tree_id()
+            parent_id = None
             cursor = 1
             level = 0
+        return tree_id, parent_id, cursor, level
+
+    def build_tree_nodes(self, data, target=None, position="last-child"):
+        """
+        vendored from:
+        https://github.com/django-mptt/django-mptt/blob/fe2b9cc8cfd8f4b764d294747dba2758147712eb/mptt/managers.py#L614
+        """
+        opts = self.model._mptt_meta
+        tree_id, _parent_id, cursor, level = self._get_insert_position(target, position)
 
         stack = []
 
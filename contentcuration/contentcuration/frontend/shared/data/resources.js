@@ -868,9 +868,10 @@ export const ContentNode = new Resource({
    * @param {string} target The ID of the target node used for positioning
    * @param {string} position The position relative to `target`
    * @param {string} excluded_descendants a map of node_ids to exclude from the copy
+   * @param {boolean} lazy share the files and questions of the source until the copy is edited
    * @return {Promise}
    */
-  copy(id, target, position = 'last-child', excluded_descendants = null) {
+  copy(id, target, position = 'last-child', excluded_descendants = null, lazy = false) {
     if (!validPositions.has(position)) {
       throw new TypeError(`${position} is not a valid position`);
     }
@@ -886,11 +887,11 @@ export const ContentNode = new Resource({
     // Ignore changes from this operation except for the
     // explicit copy change we generate.
     return this.transaction({ mode: 'rw', source: IGNORED_SOURCE }, CHANGES_TABLE, () => {
-      return this.tableCopy(id, target, position, excluded_descendants);
+      return this.tableCopy(id, target, position, excluded_descendants, lazy);
     });
   },
 
-  tableCopy(id, target, position, excluded_descendants) {
+  tableCopy(id, target, position, excluded_descendants, lazy = false) {
     if (!validPositions.has(position)) {
       return Promise.reject();
     }
@@ -945,6 +946,7 @@ export const ContentNode = new Resource({
           target,
           position,
           excluded_descendants,
+          lazy,
           mods: {},
           source: CLIENTID,
           oldObj: null,
@@ -11,6 +11,7 @@ import {
   IGNORED_SOURCE,
   MESSAGES,
   STATUS,
+  TABLE_NAMES,
 } from './constants';
 import db from './db';
 import mergeAllChanges from './mergeChanges';
@@ -37,6 +38,11 @@ let unsyncedPollingTimeoutId;
 // Flag to check if a sync is currently active.
 let syncActive = false;
 
+// The sequence number of the last user event received from the server,
+// sent with each sync so that the server only returns newer events.
+// Starts from the sequence number rendered into the page for the current user.
+let lastUserRev = get(window, ['user', 'user_rev'], null);
+
 function handleFetchMessages(msg) {
   if (msg.type === MESSAGES.FETCH_COLLECTION && msg.urlName && msg.params) {
     API_RESOURCES[msg.urlName]
@@ -121,15 +127,26 @@ const copiedFields = commonFields.concat([
   'target',
   'position',
   'excluded_descendants',
+  'lazy',
 ]);
 
+// Files can be shared by several nodes, so send the node the file was
+// listed under, for the change to be made to the file of that node.
+function addFileNode(change, trimmed) {
+  const contentnode = get(change, ['oldObj', 'contentnode'], null);
+  if (change.table === TABLE_NAMES.FILE && contentnode) {
+    trimmed.contentnode = contentnode;
+  }
+  return trimmed;
+}
+
 function trimChangeForSync(change) {
   if (change.type === CHANGE_TYPES.CREATED) {
     return pick(change, createFields);
   } else if (change.type === CHANGE_TYPES.UPDATED) {
-    return pick(change, updateFields);
+    return addFileNode(change, pick(change, updateFields));
   } else if (change.type === CHANGE_TYPES.DELETED) {
-    return pick(change, commonFields);
+    return addFileNode(change, pick(change, commonFields));
   } else if (change.type === CHANGE_TYPES.MOVED) {
     return pick(change, movedFields);
   } else if (change.type === CHANGE_TYPES.COPIED) {
@@ -199,7 +216,10 @@ function syncChanges() {
         // Create a promise for the sync - if there is nothing to sync just resolve immediately,
         // in order to still call our change cleanup code.
         const syncPromise = changes.length
-          ? client.post(window.Urls['sync'](), changes, { timeout: 10 * 1000 })
+          ? client.post(window.Urls['sync'](), changes, {
+              params: lastUserRev === null ? {} : { user_rev: lastUserRev },
+              timeout: 10 * 1000,
+            })
           : Promise.resolve({});
         // TODO: Log validation errors from the server somewhere for use in the frontend.
         let allErrors = false;
@@ -226,12 +246,16 @@ function syncChanges() {
             // {
             //    "changes": [],
             //    "errors": [],
+            //    "user_rev": 0,
             // }
             // The changes property is an array of any changes from the server to apply in the
             // client.
             // The errors property is an array of any changes that were sent to the server,
             // that were rejected, with an additional errors property that describes
             // the error.
+            // The user_rev property is the sequence number of the last user event
+            // that has been returned to the client.
+            lastUserRev = get(response, ['data', 'user_rev'], lastUserRev);
             const returnedChanges = get(response, ['data', 'changes'], []);
             const errors = get(response, ['data', 'errors'], []);
             // Collect all errors into an errorMap
@@ -0,0 +1,80 @@
+"""
+Times rebuilding the MPTT fields of generated trees with partial_rebuild and fast_rebuild, and checks
+that both give the same result. The trees are deleted again afterwards.
+
+    python manage.py benchmark_tree_rebuild --sizes 10000 100000 500000 --branching 10
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from le_utils.constants import content_kinds
+
+from contentcuration.models import ContentNode
+
+BULK_CREATE_BATCH_SIZE = 5000
+
+
+def create_tree(size, branching):
+    """
+    Creates a tree of `size` topics where every node has `branching` children, filled in level by level.
+    Only the parent links and the order of siblings are set, as a tree created with MPTT updates disabled would be.
+    """
+    root = ContentNode.objects.create(title="Rebuild benchmark", kind_id=content_kinds.TOPIC)
+    parents = [root]
+    created = 1
+    while created < size:
+        children = []
+        for parent in parents:
+            for i in range(min(branching, size - created - len(children))):
+                children.append(ContentNode(
+                    title="Rebuild benchmark",
+                    kind_id=content_kinds.TOPIC,
+                    parent=parent,
+                    tree_id=root.tree_id,
+                    lft=i,
+                    rght=0,
+                    level=0,
+                    sort_order=i,
+                ))
+        ContentNode.objects.bulk_create(children, batch_size=BULK_CREATE_BATCH_SIZE)
+        created += len(children)
+        parents = children
+    return root
+
+
+def time_rebuild(rebuild, tree_id):
+    # Clear the fields the rebuild computes, keeping lft for the order of siblings
+    ContentNode.objects.filter(tree_id=tree_id).exclude(parent=None).update(rght=0, level=0)
+    start = time.time()
+    rebuild(tree_id)
+    return (time.time() - start) * 1000
+
+
+def get_tree_fields(tree_id):
+    return list(ContentNode.objects.filter(tree_id=tree_id).order_by("lft").values_list("id", "lft", "rght", "level"))
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+        parser.add_argument('--branching', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options['branching'] < 1:
+            raise CommandError("Nodes need at least one child each")
+
+        print("{:>8} {:>18} {:>16}".format("Nodes", "partial_rebuild", "fast_rebuild"))
+        for size in options['sizes']:
+            root = create_tree(size, options['branching'])
+            try:
+                partial_time = time_rebuild(ContentNode.objects.partial_rebuild, root.tree_id)
+                expected = get_tree_fields(root.tree_id)
+                fast_time = time_rebuild(ContentNode.objects.fast_rebuild, root.tree_id)
+                if get_tree_fields(root.tree_id) != expected:
+                    raise CommandError("fast_rebuild did not give the same tree as partial_rebuild for {} nodes".format(size))
+            finally:
+                ContentNode.objects.filter(tree_id=root.tree_id).delete()
+
+            print("{:>8} {:>16.1f}ms {:>14.1f}ms".format(size, partial_time, fast_time))
@@ -0,0 +1,85 @@
+"""
+Times how long the values viewsets take to serialize rows, split into mapping the rows with
+the field map of the viewset and rendering them to JSON, to measure changes to either.
+
+    python manage.py benchmark_values_viewsets --rows 1000 --runs 10
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from contentcuration.models import User
+from contentcuration.viewsets.assessmentitem import AssessmentItemViewSet
+from contentcuration.viewsets.channel import ChannelViewSet
+from contentcuration.viewsets.common import ValuesJSONRenderer
+from contentcuration.viewsets.contentnode import ContentNodeViewSet
+from contentcuration.viewsets.file import FileViewSet
+
+VIEWSETS = (ContentNodeViewSet, FileViewSet, ChannelViewSet, AssessmentItemViewSet)
+
+
+def interpret_field_map(field_map, item):
+    # How rows were mapped before field maps were compiled, to compare against
+    for key, value in field_map.items():
+        if callable(value):
+            item[key] = value(item)
+        elif value in item:
+            item[key] = item.pop(value)
+        else:
+            item[key] = value
+    return item
+
+
+def time_runs(func, rows, runs):
+    """
+    Returns the fastest time of func over the runs, in milliseconds, passing it a fresh copy of the rows each time.
+    """
+    times = []
+    for i in range(runs):
+        items = [dict(row) for row in rows]
+        start = time.time()
+        func(items)
+        times.append(time.time() - start)
+    return min(times) * 1000
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--user', help="Email of the user to read the rows as, defaults to the first admin")
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(email__iexact=options['user']).first()
+        else:
+            user = User.objects.filter(is_admin=True).first()
+        if user is None:
+            raise CommandError("No user to read the rows as")
+
+        request = Request(APIRequestFactory().get("/"))
+        request.user = user
+        runs = options['runs']
+
+        print("{:<24} {:>6} {:>14} {:>12} {:>12} {:>12}".format(
+            "Viewset", "Rows", "Map (interp.)", "Map", "Render DRF", "Render"))
+        for viewset_class in VIEWSETS:
+            viewset = viewset_class(request=request, format_kwarg=None)
+            rows = list(viewset._cast_queryset_to_values(viewset.get_queryset())[:options['rows']])
+            field_map = viewset_class.field_map
+            map_fields = viewset_class._get_field_mapper()
+            mapped = [map_fields(dict(row)) for row in rows]
+
+            print("{:<24} {:>6} {:>12.1f}ms {:>10.1f}ms {:>10.1f}ms {:>10.1f}ms".format(
+                viewset_class.__name__,
+                len(rows),
+                time_runs(lambda items: [interpret_field_map(field_map, item) for item in items], rows, runs),
+                time_runs(lambda items: [map_fields(item) for item in items], rows, runs),
+                time_runs(lambda items: JSONRenderer().render(mapped), rows, runs),
+                time_runs(lambda items: ValuesJSONRenderer().render(mapped), rows, runs),
+            ))
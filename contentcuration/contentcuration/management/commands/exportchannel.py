@@ -21,6 +21,12 @@ class Command(BaseCommand):
             default=False,
         )
 
+        # only rewrite the nodes that have changed since the channel was last published
+        parser.add_argument("--incremental", action="store_true", default=False)
+
+        # print how long each phase of the publish took, along with the queries it made and bytes it moved
+        parser.add_argument("--profile", action="store_true", default=False)
+
         # optional argument to send an email to the user when done with exporting channel
         parser.add_argument("--email", action="store_true", default=False)
 
@@ -31,16 +37,20 @@ class Command(BaseCommand):
         user_id = options["user_id"]
         force_exercises = options["force-exercises"]
         version_notes = options.get("version_notes")
+        incremental = options["incremental"]
 
         try:
-            publish.publish_channel(
+            channel = publish.publish_channel(
                 user_id,
                 channel_id,
                 force=force,
                 force_exercises=force_exercises,
                 send_email=send_email,
                 version_notes=version_notes,
+                incremental=incremental,
             )
+            if options["profile"]:
+                self.print_profile(channel.published_data[channel.version]["profile"])
         except ValueError as e:
             logging.warning(
                 "Publishing exited early: {message}.".format(message=e.message)
@@ -48,3 +58,12 @@ class Command(BaseCommand):
             self.stdout.write(
                 "You can find your database in {path}".format(path=e.db_path)
             )
+
+    def print_profile(self, profile):
+        self.stdout.write("{:<20}{:>12}{:>12}{:>16}".format("Phase", "Time (s)", "Queries", "Bytes"))
+        for phase in profile:
+            self.stdout.write(
+                "{phase:<20}{time:>12.3f}{queries:>12}{bytes:>16}".format(**phase)
+            )
+            for name, count in sorted(phase.get("counts", {}).items()):
+                self.stdout.write("    {:<28}{:>12}".format(name, count))
@@ -28,7 +28,7 @@ def fix_dupe_tree_id(dupe_root):
     # use the parent/child db relationships instead, which do not rely on MPTT indexes.
     update_tree_id_recursive(dupe_root, new_id)
     # This may take a while...
-    ContentNode.objects.partial_rebuild(dupe_root.tree_id)
+    ContentNode.objects.fast_rebuild(dupe_root.tree_id)
 
 
 class Command(BaseCommand):
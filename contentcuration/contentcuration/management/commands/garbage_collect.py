@@ -3,10 +3,11 @@
 - ContentNodes older than 2 weeks, whose parents are in the designated "garbage
 tree" (i.e. `settings.ORPHANAGE_ROOT_ID`). Also delete the associated Files in the
 database and in object storage.
+- User change events older than `settings.USER_CHANGE_EVENTS_RETENTION`.
 """
 from django.core.management.base import BaseCommand
 
-from contentcuration.utils.garbage_collect import clean_up_contentnodes, clean_up_deleted_chefs
+from contentcuration.utils.garbage_collect import clean_up_contentnodes, clean_up_deleted_chefs, clean_up_user_change_events
 
 
 class Command(BaseCommand):
@@ -20,3 +21,4 @@ class Command(BaseCommand):
         # with the orphan tree
         clean_up_contentnodes()
         clean_up_deleted_chefs()
+        clean_up_user_change_events()
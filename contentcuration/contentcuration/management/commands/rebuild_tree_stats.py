@@ -0,0 +1,37 @@
+"""
+Recomputes the tree stats of content nodes, for the trees of the channels passed, or for every tree.
+
+    python manage.py rebuild_tree_stats [--channel_id <id> ...]
+"""
+import logging as logmodule
+
+from django.core.management.base import BaseCommand
+
+from contentcuration.models import Channel
+from contentcuration.models import CHANNEL_TREES
+from contentcuration.models import ContentNode
+from contentcuration.models import ContentNodeTreeStats
+
+logmodule.basicConfig()
+logging = logmodule.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel_id', action='append', dest='channel_ids', default=None)
+
+    def handle(self, *args, **options):
+        if options['channel_ids']:
+            tree_ids = set()
+            for channel in Channel.objects.filter(pk__in=options['channel_ids']):
+                for tree in CHANNEL_TREES:
+                    root = getattr(channel, tree)
+                    if root:
+                        tree_ids.add(root.tree_id)
+        else:
+            tree_ids = ContentNode.objects.filter(parent__isnull=True).values_list("tree_id", flat=True)
+
+        for tree_id in tree_ids:
+            logging.info("Rebuilding tree stats for tree {}".format(tree_id))
+            ContentNodeTreeStats.rebuild(tree_id)
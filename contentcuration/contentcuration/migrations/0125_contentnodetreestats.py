@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2020-10-05 14:21
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contentcuration", "0124_userchangeevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentNodeTreeStats",
+            fields=[
+                (
+                    "node",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="tree_stats",
+                        serialize=False,
+                        to="contentcuration.ContentNode",
+                    ),
+                ),
+                ("resource_count", models.IntegerField(default=0)),
+                ("coach_count", models.IntegerField(default=0)),
+                ("error_count", models.IntegerField(default=0)),
+                ("updated_count", models.IntegerField(default=0)),
+                ("new_count", models.IntegerField(default=0)),
+                ("resource_size", models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2020-10-12 10:04
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+import mptt.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contentcuration", "0125_contentnodetreestats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contentnode",
+            name="content_source",
+            field=mptt.fields.TreeForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="content_references",
+                to="contentcuration.ContentNode",
+            ),
+        ),
+    ]
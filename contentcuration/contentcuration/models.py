@@ -30,6 +30,7 @@ from django.core.mail import send_mail
 from django.db import connection
 from django.db import IntegrityError
 from django.db import models
+from django.db import transaction
 from django.db.models import Count
 from django.db.models import Exists
 from django.db.models import Max
@@ -1124,6 +1125,8 @@ class ContentNode(MPTTModel, models.Model):
     # legacy field...
     original_node = TreeForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates')
     cloned_source = TreeForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='clones')
+    # Imported nodes share the files and assessment items of the node they were imported from until they are edited
+    content_source = TreeForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='content_references')
 
     thumbnail_encoding = models.TextField(blank=True, null=True)
 
@@ -1264,7 +1267,7 @@ class ContentNode(MPTTModel, models.Model):
             return {
                 "title": self.title,
                 "kind": self.kind_id,
-                "count": self.assessment_items.count(),
+                "count": self.get_content_owner().assessment_items.count(),
                 "node_id": self.node_id,
                 "studio_id": self.id,
             }
@@ -1272,7 +1275,7 @@ class ContentNode(MPTTModel, models.Model):
             return {
                 "title": self.title,
                 "kind": self.kind_id,
-                "file_size": self.files.values('file_size').aggregate(size=Sum('file_size'))['size'],
+                "file_size": self.get_content_owner().files.values('file_size').aggregate(size=Sum('file_size'))['size'],
                 "node_id": self.node_id,
                 "studio_id": self.id,
             }
@@ -1338,12 +1341,19 @@ class ContentNode(MPTTModel, models.Model):
             if type(thumbnail_data) is dict and thumbnail_data.get("base64"):
                 return thumbnail_data["base64"]
 
-        thumbnail = self.files.filter(preset__thumbnail=True).first()
+        thumbnail = self.get_content_owner().files.filter(preset__thumbnail=True).first()
         if thumbnail:
             return generate_storage_url(str(thumbnail))
 
         return ""
 
+    def get_content_owner(self):
+        """
+        Returns the node that has the files and assessment items of this node, which is its content_source
+        if it shares those of the node it was imported from.
+        """
+        return self.content_source or self
+
     @classmethod
     def get_nodes_with_title(cls, title, limit_to_children_of=None):
         """
@@ -1417,23 +1427,22 @@ class ContentNode(MPTTModel, models.Model):
                     .order_by('tag_name'))
 
         # Get resource variables
-        resource_count = resources.count() or 0
-        resource_size = resources.values('files__checksum', 'files__file_size').distinct().aggregate(
-            resource_size=Sum('files__file_size'))['resource_size'] or 0
+        from contentcuration.utils.channel_statistics import ChannelStatistics  # import here to avoid circular imports
+        statistics = ChannelStatistics(self)
+        resource_count = statistics.resource_count
+        resource_size = statistics.resource_size
 
-        languages = list(set(descendants.exclude(language=None).values_list('language__native_name', flat=True)))
-        accessible_languages = resources.filter(files__preset_id=format_presets.VIDEO_SUBTITLE) \
-            .values_list('files__language_id', flat=True)
+        languages = list(statistics.language_names)
         accessible_languages = list(
-            Language.objects.filter(id__in=accessible_languages).distinct().values_list('native_name', flat=True))
+            Language.objects.filter(id__in=statistics.subtitle_languages).distinct().values_list('native_name', flat=True))
 
-        licenses = list(set(resources.exclude(license=None).values_list('license__license_name', flat=True)))
-        kind_count = list(resources.values('kind_id').annotate(count=Count('kind_id')).order_by('kind_id'))
+        licenses = list(statistics.licenses)
+        kind_count = statistics.resource_kind_counts
 
         # Add "For Educators" booleans
         for_educators = {
-            "coach_content": resources.filter(role_visibility=roles.COACH).count(),
-            "exercises": resources.filter(kind_id=content_kinds.EXERCISE).count(),
+            "coach_content": statistics.coach_content_count,
+            "exercises": statistics.get_kind_count(content_kinds.EXERCISE),
         }
 
         # Serialize data
@@ -1483,7 +1492,8 @@ class ContentNode(MPTTModel, models.Model):
         self.changed = self.changed or self.has_changes()
 
     def save(self, skip_lock=False, *args, **kwargs):
-        if self._state.adding:
+        adding = self._state.adding
+        if adding:
             self.on_create()
         else:
             self.on_update()
@@ -1512,6 +1522,16 @@ class ContentNode(MPTTModel, models.Model):
         else:
             changed_ids = []
 
+        # Read what the node added to the tree stats of its ancestors before saving resets the tracker
+        old_stats_parent_id = self.parent_id
+        if not adding and self._field_updates.has_changed("parent_id"):
+            old_stats_parent_id = self._field_updates.previous("parent_id")
+        old_stats_counts = None
+        if not adding and any(self._field_updates.has_changed(field) for field in ContentNodeTreeStats.node_fields):
+            old_stats_counts = ContentNodeTreeStats.get_node_counts(
+                *[self._field_updates.previous(field) for field in ContentNodeTreeStats.node_fields]
+            )
+
         if not same_order and not skip_lock:
             # Lock the mptt fields for the trees of the old and new parent
             with ContentNode.objects.lock_mptt(*ContentNode.objects
@@ -1522,12 +1542,14 @@ class ContentNode(MPTTModel, models.Model):
                 # no persistent object references for the original and new parent to modify
                 if changed_ids:
                     ContentNode.objects.filter(id__in=changed_ids).update(changed=True)
+                ContentNodeTreeStats.node_saved(self, adding, old_stats_parent_id, old_stats_counts)
         else:
             super(ContentNode, self).save(*args, **kwargs)
             # Always write to the database for the parent change updates, as we have
             # no persistent object references for the original and new parent to modify
             if changed_ids:
                 ContentNode.objects.filter(id__in=changed_ids).update(changed=True)
+            ContentNodeTreeStats.node_saved(self, adding, old_stats_parent_id, old_stats_counts)
 
     # Copied from MPTT
     save.alters_data = True
@@ -1539,6 +1561,8 @@ class ContentNode(MPTTModel, models.Model):
             parent.save()
         # Lock the mptt fields for the tree of this node
         with ContentNode.objects.lock_mptt(self.tree_id):
+            ContentNodeTreeStats.node_deleted(self)
+            ContentNode.objects.release_content_references(self.get_descendants(include_self=True))
             return super(ContentNode, self).delete(*args, **kwargs)
 
     # Copied from MPTT
@@ -1552,9 +1576,12 @@ class ContentNode(MPTTModel, models.Model):
         mods=None,
         excluded_descendants=None,
         can_edit_source_channel=None,
-        batch_size=None
+        batch_size=None,
+        lazy=False
     ):
-        return self._tree_manager.copy_node(self, target, position, pk, mods, excluded_descendants, can_edit_source_channel, batch_size)[0]
+        return self._tree_manager.copy_node(
+            self, target, position, pk, mods, excluded_descendants, can_edit_source_channel, batch_size, lazy
+        )[0]
 
     def copy(self):
         return self.copy_to()
@@ -1570,6 +1597,333 @@ class ContentNode(MPTTModel, models.Model):
         ]
 
 
+class ContentNodeTreeStats(models.Model):
+    """
+    Counts over the descendants of a content node, not including the node itself, kept up to date
+    as nodes and files are saved, moved and deleted, by adding the changes in the counts of a node
+    to the rows of all of its ancestors at once. Any drift can be fixed with rebuild_tree_stats.
+    """
+    node = models.OneToOneField(ContentNode, primary_key=True, related_name="tree_stats", on_delete=models.CASCADE)
+    resource_count = models.IntegerField(default=0)
+    coach_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    # Changed resources that have been published before, and that have not
+    updated_count = models.IntegerField(default=0)
+    new_count = models.IntegerField(default=0)
+    # The total size of the files of the descendants
+    resource_size = models.BigIntegerField(default=0)
+
+    count_fields = ("resource_count", "coach_count", "error_count", "updated_count", "new_count", "resource_size")
+    # The fields of a node that its counts depend on
+    node_fields = ("kind_id", "role_visibility", "complete", "changed", "published")
+
+    @classmethod
+    def get_node_counts(cls, kind_id, role_visibility, complete, changed, published):
+        """
+        Returns what a node adds to the counts of its ancestors, leaving out the size of its files.
+        """
+        resource = kind_id != content_kinds.TOPIC
+        return {
+            "resource_count": int(resource),
+            "coach_count": int(resource and role_visibility == roles.COACH),
+            "error_count": int(not complete),
+            "updated_count": int(resource and changed and published),
+            "new_count": int(resource and changed and not published),
+        }
+
+    @classmethod
+    def get_subtree_counts(cls, node, counts):
+        """
+        Returns what a node and its descendants add to the counts of its ancestors, from the counts of the node itself.
+        """
+        stats = cls.objects.filter(node_id=node.id).values(*cls.count_fields).first()
+        if stats is None:
+            tree_id, lft, rght = ContentNode.objects.filter(pk=node.id).values_list("tree_id", "lft", "rght").get()
+            cls.rebuild(tree_id, lft, rght)
+            stats = cls.objects.filter(node_id=node.id).values(*cls.count_fields).get()
+        size = File.objects.filter(contentnode_id=node.get_content_owner().id).aggregate(size=Sum("file_size"))["size"] or 0
+        stats["resource_size"] += size
+        for field, count in counts.items():
+            stats[field] += count
+        return stats
+
+    @classmethod
+    def add_to_ancestors(cls, node_id, counts, sign=1, include_self=False):
+        """
+        Adds the counts to the rows of all the ancestors of the node in a single update.
+        """
+        counts = {field: sign * count for field, count in counts.items() if count}
+        if not node_id or not counts:
+            return
+        node = ContentNode.objects.filter(pk=node_id)
+        lookup = "e" if include_self else ""
+        cls.objects.filter(
+            node__tree_id=Subquery(node.values("tree_id")),
+            **{
+                "node__lft__lt" + lookup: Subquery(node.values("lft")),
+                "node__rght__gt" + lookup: Subquery(node.values("rght")),
+            }
+        ).update(**{field: models.F(field) + count for field, count in counts.items()})
+
+    @classmethod
+    def node_saved(cls, node, adding, old_parent_id, old_counts):
+        """
+        Updates the counts of the ancestors of a node after it was saved, given its parent and its counts before.
+        """
+        counts = cls.get_node_counts(*[getattr(node, field) for field in cls.node_fields])
+        if not type(node)._mptt_updates_enabled:
+            # The tree fields are not kept up to date, so the ancestors cannot be found,
+            # and the tree has to be rebuilt along with its stats afterwards
+            if adding:
+                cls.objects.create(node_id=node.id)
+            return
+        if adding:
+            cls.objects.create(node_id=node.id)
+            cls.add_to_ancestors(node.id, counts)
+        elif old_parent_id != node.parent_id:
+            # The descendants of the node have moved with it
+            if old_parent_id:
+                old_counts = counts if old_counts is None else old_counts
+                cls.add_to_ancestors(old_parent_id, cls.get_subtree_counts(node, old_counts), sign=-1, include_self=True)
+            cls.add_to_ancestors(node.id, cls.get_subtree_counts(node, counts))
+        elif old_counts is not None:
+            cls.add_to_ancestors(node.id, {field: counts[field] - old_counts[field] for field in counts})
+
+    @classmethod
+    def nodes_moved(cls, nodes, move):
+        """
+        Updates the counts of the ancestors of nodes that are moved together by calling `move`, which returns the
+        (tree_id, lft, rght) each node ends up at. Each node takes the counts of its descendants with it, except
+        those of the nodes that are moved out from under it, and the counts of all the ancestors the nodes leave
+        and join are changed in a single update.
+        """
+        nodes = {node.id: node for node in nodes}
+        before = {node_id: (node.tree_id, node.lft, node.rght) for node_id, node in nodes.items()}
+        node_counts = {
+            node_id: cls.get_node_counts(*[getattr(node, field) for field in cls.node_fields])
+            for node_id, node in nodes.items()
+        }
+        subtree_counts = cls._get_moved_subtree_counts(nodes, node_counts)
+        counts = {}
+        for node_id, (tree_id, lft, rght) in before.items():
+            counts[node_id] = dict(subtree_counts[node_id])
+            # Only the nodes moved from directly under this one have to be subtracted,
+            # as the counts of any nodes moved from under them are included in theirs
+            inside = [
+                other_id for other_id, (other_tree_id, other_lft, other_rght) in before.items()
+                if other_tree_id == tree_id and lft < other_lft and other_rght < rght
+            ]
+            for other_id in inside:
+                _, other_lft, other_rght = before[other_id]
+                if not any(before[i][1] < other_lft and other_rght < before[i][2] for i in inside):
+                    for field, count in subtree_counts[other_id].items():
+                        counts[node_id][field] -= count
+
+        deltas = {}
+        cls._add_to_ancestors_at(deltas, before, counts, -1)
+        after = move()
+        for node_id, node in nodes.items():
+            new_counts = cls.get_node_counts(*[getattr(node, field) for field in cls.node_fields])
+            for field, count in new_counts.items():
+                counts[node_id][field] += count - node_counts[node_id][field]
+        cls._add_to_ancestors_at(deltas, after, counts, 1)
+        cls._update_rows(deltas)
+
+    @classmethod
+    def nodes_updated(cls, nodes, old_values, fields):
+        """
+        Updates the counts of the ancestors of nodes whose `fields` were changed without saving them, as bulk
+        updates do, given the values of their node_fields and tree fields before, as returned by get_old_values.
+        """
+        counts = {}
+        for node in nodes:
+            old = old_values.get(node.id)
+            if old is None:
+                continue
+            new_values = [getattr(node, field) if field in fields else old[field] for field in cls.node_fields]
+            old_counts = cls.get_node_counts(*[old[field] for field in cls.node_fields])
+            counts[node.id] = {field: count - old_counts[field] for field, count in cls.get_node_counts(*new_values).items()}
+        positions = {node_id: (old_values[node_id]["tree_id"], old_values[node_id]["lft"], old_values[node_id]["rght"]) for node_id in counts}
+        deltas = {}
+        cls._add_to_ancestors_at(deltas, positions, counts, 1)
+        cls._update_rows(deltas)
+
+    @classmethod
+    def get_old_values(cls, queryset):
+        """
+        Returns the node_fields and tree fields of the nodes of a queryset by id, to pass to nodes_updated.
+        """
+        values = queryset.order_by().values("id", "tree_id", "lft", "rght", *cls.node_fields)
+        return {row["id"]: row for row in values}
+
+    @classmethod
+    def files_updated(cls, files, old_values):
+        """
+        Moves the sizes of files that were given a different contentnode without saving them, as bulk updates
+        do, to the ancestors of their new nodes from those of their old ones, given the contentnode_id and
+        file_size of each file before by id. The ancestors of the nodes that share the files of a node have
+        their sizes moved as well.
+        """
+        sizes = {}
+        for file in files:
+            old = old_values.get(file.id)
+            if old is None or old["contentnode_id"] == file.contentnode_id:
+                continue
+            for node_id, sign in ((old["contentnode_id"], -1), (file.contentnode_id, 1)):
+                if node_id:
+                    sizes[node_id] = sizes.get(node_id, 0) + sign * (old["file_size"] or 0)
+        cls.add_file_sizes(sizes)
+
+    @classmethod
+    def add_file_sizes(cls, sizes):
+        """
+        Adds the file sizes given by node id to the ancestors of the nodes, and to those of the nodes that share
+        the files of the nodes, in a single update.
+        """
+        sizes = {node_id: size for node_id, size in sizes.items() if node_id and size}
+        if not sizes:
+            return
+        references = ContentNode.objects.filter(content_source_id__in=list(sizes)).values_list("id", "content_source_id")
+        for node_id, source_id in references:
+            sizes[node_id] = sizes.get(node_id, 0) + sizes[source_id]
+        counts = {node_id: {"resource_size": size} for node_id, size in sizes.items() if size}
+        positions = {
+            node_id: (tree_id, lft, rght)
+            for node_id, tree_id, lft, rght in ContentNode.objects.filter(pk__in=list(counts)).values_list("id", "tree_id", "lft", "rght")
+        }
+        deltas = {}
+        cls._add_to_ancestors_at(deltas, positions, counts, 1)
+        cls._update_rows(deltas)
+
+    @classmethod
+    def _update_rows(cls, deltas):
+        """
+        Adds the counts in deltas, given as {node_id: counts}, to the rows of the nodes in a single update.
+        """
+        deltas = {node_id: row for node_id, row in deltas.items() if any(row.values())}
+        if not deltas:
+            return
+        sql = (
+            "UPDATE {stats} AS s SET {sets} FROM UNNEST("
+            "%s::varchar[], %s::integer[], %s::integer[], %s::integer[], %s::integer[], %s::integer[], %s::bigint[]"
+            ") AS d (node_id, {fields}) WHERE s.node_id = d.node_id"
+        ).format(
+            stats=cls._meta.db_table,
+            sets=", ".join("{0} = s.{0} + d.{0}".format(field) for field in cls.count_fields),
+            fields=", ".join(cls.count_fields),
+        )
+        params = [list(deltas)] + [[row[field] for row in deltas.values()] for field in cls.count_fields]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @classmethod
+    def _get_moved_subtree_counts(cls, nodes, node_counts):
+        """
+        Does what get_subtree_counts does for each of the nodes, with a query for all of their rows and one for their files.
+        """
+        stats = {row.pop("node_id"): row for row in cls.objects.filter(node_id__in=list(nodes)).values("node_id", *cls.count_fields)}
+        for node_id in set(nodes) - set(stats):
+            node = nodes[node_id]
+            cls.rebuild(node.tree_id, node.lft, node.rght)
+            stats[node_id] = cls.objects.filter(node_id=node_id).values(*cls.count_fields).get()
+        owners = {node_id: node.content_source_id or node_id for node_id, node in nodes.items()}
+        sizes = dict(
+            File.objects.filter(contentnode_id__in=set(owners.values()))
+            .values("contentnode_id")
+            .annotate(size=Sum("file_size"))
+            .values_list("contentnode_id", "size")
+        )
+        for node_id, row in stats.items():
+            row["resource_size"] += sizes.get(owners[node_id]) or 0
+            for field, count in node_counts[node_id].items():
+                row[field] += count
+        return stats
+
+    @classmethod
+    def _add_to_ancestors_at(cls, deltas, positions, counts, sign):
+        """
+        Adds the counts of each node to deltas for the ancestors of the (tree_id, lft, rght) position given for it.
+        """
+        if not positions:
+            return
+        query = Q()
+        for tree_id, lft, rght in positions.values():
+            query |= Q(tree_id=tree_id, lft__lt=lft, rght__gt=rght)
+        ancestors = ContentNode.objects.filter(query).values_list("id", "tree_id", "lft", "rght")
+        for ancestor_id, tree_id, lft, rght in ancestors:
+            for node_id, (node_tree_id, node_lft, node_rght) in positions.items():
+                if node_tree_id == tree_id and lft < node_lft and node_rght < rght:
+                    row = deltas.setdefault(ancestor_id, dict.fromkeys(cls.count_fields, 0))
+                    for field, count in counts[node_id].items():
+                        row[field] += sign * count
+
+    @classmethod
+    def node_deleted(cls, node):
+        """
+        Removes the counts of a node and its descendants from its ancestors, before it is deleted.
+        The sizes of their files are removed as the files are deleted, so only the sizes of the files
+        they share with other nodes are removed here.
+        """
+        counts = cls.get_subtree_counts(node, cls.get_node_counts(*[getattr(node, field) for field in cls.node_fields]))
+        counts["resource_size"] = File.objects.filter(
+            contentnode__content_references__tree_id=node.tree_id,
+            contentnode__content_references__lft__gte=node.lft,
+            contentnode__content_references__rght__lte=node.rght,
+        ).aggregate(size=Sum("file_size"))["size"] or 0
+        cls.add_to_ancestors(node.id, counts, sign=-1)
+
+    @classmethod
+    def file_saved(cls, file, adding):
+        tracker = file._field_updates
+        sizes = {}
+        if not adding and (tracker.has_changed("contentnode_id") or tracker.has_changed("file_size")):
+            sizes[tracker.previous("contentnode_id")] = -(tracker.previous("file_size") or 0)
+        if adding or sizes:
+            sizes[file.contentnode_id] = sizes.get(file.contentnode_id, 0) + (file.file_size or 0)
+        cls.add_file_sizes(sizes)
+
+    @classmethod
+    def rebuild(cls, tree_id, lft=None, rght=None):
+        """
+        Recomputes the rows of all the nodes of a tree, or of the nodes of the subtree from lft to rght.
+        """
+        node_filter = "n.tree_id = %s"
+        params = [tree_id]
+        if lft is not None:
+            node_filter += " AND n.lft >= %s AND n.rght <= %s"
+            params += [lft, rght]
+        tables = {
+            "stats": cls._meta.db_table,
+            "node": ContentNode._meta.db_table,
+            "file": File._meta.db_table,
+            "node_filter": node_filter,
+        }
+        delete_sql = "DELETE FROM {stats} WHERE node_id IN (SELECT n.id FROM {node} n WHERE {node_filter})".format(**tables)
+        # Nodes that share the files of their content_source are counted with the size of those files
+        insert_sql = (
+            "WITH node_sizes AS ("
+            "SELECT n.id AS contentnode_id, SUM(f.file_size) AS size FROM {file} f "
+            "INNER JOIN {node} n ON COALESCE(n.content_source_id, n.id) = f.contentnode_id "
+            "WHERE {node_filter} GROUP BY n.id) "
+            "INSERT INTO {stats} (node_id, resource_count, coach_count, error_count, updated_count, new_count, resource_size) "
+            "SELECT n.id, "
+            "COUNT(d.id) FILTER (WHERE d.kind_id != %s), "
+            "COUNT(d.id) FILTER (WHERE d.kind_id != %s AND d.role_visibility = %s), "
+            "COUNT(d.id) FILTER (WHERE NOT d.complete), "
+            "COUNT(d.id) FILTER (WHERE d.kind_id != %s AND d.changed AND d.published), "
+            "COUNT(d.id) FILTER (WHERE d.kind_id != %s AND d.changed AND NOT d.published), "
+            "COALESCE(SUM(s.size), 0) "
+            "FROM {node} n "
+            "LEFT OUTER JOIN {node} d ON d.tree_id = n.tree_id AND d.lft > n.lft AND d.rght < n.rght "
+            "LEFT OUTER JOIN node_sizes s ON s.contentnode_id = d.id "
+            "WHERE {node_filter} GROUP BY n.id"
+        ).format(**tables)
+        topic = content_kinds.TOPIC
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(delete_sql, params)
+            cursor.execute(insert_sql, params + [topic, topic, roles.COACH, topic, topic] + params)
+
+
 class ContentKind(models.Model):
     kind = models.CharField(primary_key=True, max_length=200, choices=content_kinds.choices)
 
@@ -1757,6 +2111,9 @@ class File(models.Model):
 
     objects = CustomManager()
 
+    # Track the fields that the tree stats of the ancestors of the node depend on
+    _field_updates = FieldTracker(fields=["contentnode_id", "file_size"])
+
     _permission_filter = Q(tree_id=OuterRef("contentnode__tree_id")) | Q(tree_id=OuterRef("assessment_item__contentnode__tree_id"))
 
     @classmethod
@@ -1841,7 +2198,9 @@ class File(models.Model):
                 else:
                     raise ValueError("Files of type `{}` are not supported.".format(ext))
 
+        adding = self._state.adding
         super(File, self).save(*args, **kwargs)
+        ContentNodeTreeStats.file_saved(self, adding)
 
     class Meta:
         indexes = [
@@ -1857,6 +2216,7 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     Be careful! we don't know if this will work when perform bash delete on File obejcts.
     """
     print("in delete, checksum = {}".format(instance.checksum))
+    ContentNodeTreeStats.add_file_sizes({instance.contentnode_id: -(instance.file_size or 0)})
     delete_empty_file_reference(instance.checksum, instance.file_format.extension)
 
 
@@ -1987,3 +2347,18 @@ class Task(models.Model):
     is_progress_tracking = models.BooleanField(default=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="task")
     metadata = JSONField()
+
+
+class UserChangeEvent(models.Model):
+    """
+    A change to send to a user the next time they sync, like a channel being updated by a ricecooker commit.
+    Events are only ever appended, and the id of each event is its sequence number, which clients send back
+    to get the events they have not seen yet.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="change_events")
+    event = JSONField()
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        index_together = [["user", "id"]]
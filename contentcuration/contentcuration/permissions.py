@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.utils.functional import cached_property
 from past.builtins import basestring
 from rest_framework import permissions
 
 from contentcuration.models import AssessmentItem
 from contentcuration.models import Channel
+from contentcuration.models import CHANNEL_TREES
 from contentcuration.models import ChannelSet
 from contentcuration.models import ContentNode
 from contentcuration.models import ContentTag
@@ -56,3 +60,72 @@ class CustomPermission(permissions.BasePermission):
                 return True
 
         raise PermissionDenied("Cannot edit models without editing permissions")
+
+
+class EditPermissions(object):
+    """
+    Resolves which content a user can edit from the tree ids of the channels they can edit.
+
+    The tree ids are read with a single query the first time they are needed, so that checking
+    the permissions for any number of nodes, assessment items and files is a plain indexed
+    tree_id lookup, rather than a permission CTE correlated with every row.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def editable_tree_ids(self):
+        tree_ids = set()
+        tree_id_fields = ["{}__tree_id".format(tree_name) for tree_name in CHANNEL_TREES]
+        for channel_tree_ids in Channel.objects.filter(editors=self.user).values_list(*tree_id_fields):
+            tree_ids.update(tree_id for tree_id in channel_tree_ids if tree_id is not None)
+        return tree_ids
+
+    @cached_property
+    def orphan_tree_id(self):
+        return ContentNode.objects.filter(pk=settings.ORPHANAGE_ROOT_ID).values_list("tree_id", flat=True).first()
+
+    def _contentnode_filter(self):
+        # Anyone can edit nodes in the orphan tree, which is where new nodes are created
+        return ~Q(pk=settings.ORPHANAGE_ROOT_ID) & (
+            Q(tree_id__in=self.editable_tree_ids) | Q(tree_id=self.orphan_tree_id)
+        )
+
+    def _assessmentitem_filter(self):
+        return Q(contentnode__tree_id__in=self.editable_tree_ids)
+
+    def _file_filter(self):
+        return (
+            Q(contentnode__tree_id__in=self.editable_tree_ids)
+            | Q(assessment_item__contentnode__tree_id__in=self.editable_tree_ids)
+            | Q(uploaded_by=self.user, contentnode__isnull=True, assessment_item__isnull=True)
+        )
+
+    def can_filter(self, model):
+        return model in (ContentNode, AssessmentItem, File)
+
+    def filter_edit_queryset(self, queryset):
+        """
+        Filters queryset to the objects the user can edit, for the models in `can_filter`,
+        with the same results as the filter_edit_queryset of the model.
+        """
+        if self.user.is_anonymous():
+            return queryset.none()
+        if queryset.model is ContentNode:
+            return queryset.filter(self._contentnode_filter())
+        if queryset.model is AssessmentItem:
+            return queryset.filter(self._assessmentitem_filter())
+        if queryset.model is File:
+            return queryset.filter(self._file_filter())
+        raise TypeError("Cannot filter {} by edit permissions".format(queryset.model.__name__))
+
+
+def get_edit_permissions(request):
+    """
+    Returns the edit permissions of the user of the request, which are shared by
+    everything that handles the request, so they are only resolved once.
+    """
+    if getattr(request, "_edit_permissions", None) is None:
+        request._edit_permissions = EditPermissions(request.user)
+    return request._edit_permissions
@@ -369,6 +369,9 @@ CELERY_WORKER_SEND_TASK_EVENTS = True
 TWO_WEEKS_AGO = datetime.now() - timedelta(days=14)
 ORPHAN_DATE_CLEAN_UP_THRESHOLD = TWO_WEEKS_AGO
 
+# How long events are kept for users to receive them when they next sync
+USER_CHANGE_EVENTS_RETENTION = timedelta(days=14)
+
 # CLOUD STORAGE SETTINGS
 DEFAULT_FILE_STORAGE = 'django_s3_storage.storage.S3Storage'
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID') or 'development'
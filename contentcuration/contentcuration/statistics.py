@@ -181,9 +181,11 @@ def record_publish_stats(channel):
     else:
         action_attributes['content_source'] = 'Human'
 
-    action_attributes['channel_num_resources'] = channel.main_tree.get_descendants().exclude(
-        kind=content_kinds.TOPIC).count()
-    action_attributes['channel_num_nodes'] = channel.main_tree.get_descendant_count()
+    from contentcuration.utils.channel_statistics import ChannelStatistics  # import here to avoid circular imports
+
+    statistics = ChannelStatistics(channel.main_tree)
+    action_attributes['channel_num_resources'] = statistics.resource_count
+    action_attributes['channel_num_nodes'] = statistics.node_count
 
     record_channel_action_stats(action_attributes)
 
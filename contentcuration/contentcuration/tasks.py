@@ -7,11 +7,15 @@ from builtins import str
 from celery.decorators import task
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.core.exceptions import PermissionDenied
 from django.core.mail import EmailMessage
 from django.db import IntegrityError
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext as _
 
+from contentcuration.api import COMMIT_CHANNEL_STEPS
+from contentcuration.api import commit_channel
 from contentcuration.models import Channel
 from contentcuration.models import ContentNode
 from contentcuration.models import Task
@@ -22,10 +26,14 @@ from contentcuration.utils.csv_writer import write_channel_csv_file
 from contentcuration.utils.csv_writer import write_user_csv
 from contentcuration.utils.publish import publish_channel
 from contentcuration.utils.sync import sync_channel
+from contentcuration.utils.tasks import set_total
+from contentcuration.utils.tasks import TaskCancelled
 from contentcuration.utils.user import cache_multiple_users_metadata
 from contentcuration.viewsets.sync.constants import CHANNEL
 from contentcuration.viewsets.sync.constants import CONTENTNODE
 from contentcuration.viewsets.sync.constants import COPYING_FLAG
+from contentcuration.viewsets.sync.utils import add_event_for_user
+from contentcuration.viewsets.sync.utils import generate_delete_event
 from contentcuration.viewsets.sync.utils import generate_update_event
 
 
@@ -66,6 +74,7 @@ def duplicate_nodes_task(
     position="last-child",
     mods=None,
     excluded_descendants=None,
+    lazy=False,
 ):
     self.progress = 0
     self.update_state(state="STARTED", meta={"progress": self.progress})
@@ -85,6 +94,7 @@ def duplicate_nodes_task(
             mods,
             excluded_descendants,
             can_edit_source_channel=can_edit_source_channel,
+            lazy=lazy,
         )
     except IntegrityError:
         # This will happen if the node has already been created
@@ -92,6 +102,9 @@ def duplicate_nodes_task(
         # Possible we might want to raise an error here, but not clear
         # whether this could then be a way to sniff for ids
         pass
+    except TaskCancelled:
+        # The copy was rolled back, so remove the placeholder for it
+        return {"changes": [generate_delete_event(pk, CONTENTNODE)]}
     return {"changes": [generate_update_event(pk, CONTENTNODE, {COPYING_FLAG: False})]}
 
 
@@ -128,6 +141,35 @@ def sync_channel_task(
     )
 
 
+@task(bind=True, name="commit_channel_task")
+def commit_channel_task(self, user_id, channel_id, chef_tree_id, stage=False):
+    self.progress = 0
+    self.update_state(state="STARTED", meta={"progress": self.progress})
+    set_total(COMMIT_CHANNEL_STEPS)
+
+    user = User.objects.get(pk=user_id)
+    try:
+        # Lock the channel so that a retried commit of the same tree waits for this one, and
+        # roll back on failure so the chef_tree is still there to commit again
+        with transaction.atomic():
+            channel = Channel.objects.select_for_update().get(pk=channel_id)
+            if channel.chef_tree_id != chef_tree_id:
+                # This tree has already been committed
+                return {"new_channel": channel_id}
+            change = commit_channel(channel, user, stage=stage)
+    except PermissionDenied as e:
+        # Let ricecooker show why, e.g. the user is out of storage
+        for task_info in Task.objects.filter(task_id=self.request.id):
+            task_info.metadata["error"] = {"message": str(e)}
+            task_info.save()
+        raise
+
+    # Send event (new staging tree or new main tree) to all channel editors
+    for editor_id in channel.editors.values_list("id", flat=True):
+        add_event_for_user(editor_id, change)
+    return {"new_channel": channel_id}
+
+
 @task(name="generatechannelcsv_task")
 def generatechannelcsv_task(channel_id, domain, user_id):
     channel = Channel.objects.get(pk=channel_id)
@@ -167,6 +209,7 @@ def generateusercsv_task(user_id):
 
 @task(name="deletetree_task")
 def deletetree_task(tree_id):
+    ContentNode.objects.release_content_references(ContentNode.objects.filter(tree_id=tree_id))
     ContentNode.objects.filter(tree_id=tree_id).delete()
 
 
@@ -195,6 +238,7 @@ type_mapping = {
     "duplicate-nodes": {"task": duplicate_nodes_task, "progress_tracking": True},
     "export-channel": {"task": export_channel_task, "progress_tracking": True},
     "sync-channel": {"task": sync_channel_task, "progress_tracking": True},
+    "commit-channel": {"task": commit_channel_task, "progress_tracking": True},
 }
 
 if settings.RUNNING_TESTS:
@@ -239,6 +283,9 @@ def create_async_task(task_name, user, apply_async=True, **task_args):
     if "node_ids" in task_args:
         metadata["affects"]["nodes"] = task_args["node_ids"]
 
+    if "chef_tree_id" in task_args:
+        metadata["affects"]["chef_tree"] = task_args["chef_tree_id"]
+
     if user is None or not isinstance(user, User):
         raise TypeError("All tasks must be assigned to a user.")
 
@@ -272,7 +319,9 @@ def create_async_task(task_name, user, apply_async=True, **task_args):
         # we only create a new error object if one doesn't already exist.
         if "error" not in task_info.metadata:
             task_info.metadata["error"] = {}
-        task_info.metadata["error"].update(error_data)
+        # Keep any more specific message the task recorded itself
+        error_data.update(task_info.metadata["error"])
+        task_info.metadata["error"] = error_data
         task_info.save()
 
     return task, task_info
@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+
+from django.db.models import Count
+from django.db.models import Sum
+from le_utils.constants import content_kinds
+
+from .base import BaseTestCase
+from contentcuration.models import AssessmentItem
+from contentcuration.models import File
+from contentcuration.utils.channel_statistics import ChannelStatistics
+
+
+class ChannelStatisticsTestCase(BaseTestCase):
+    def setUp(self):
+        super(ChannelStatisticsTestCase, self).setUp()
+        self.descendants = self.channel.main_tree.get_descendants()
+        self.statistics = ChannelStatistics(self.channel.main_tree)
+
+    def test_node_counts(self):
+        self.assertEqual(self.statistics.node_count, self.descendants.count())
+        self.assertEqual(self.statistics.resource_count, self.descendants.exclude(kind_id=content_kinds.TOPIC).count())
+        kind_counts = list(self.descendants.values('kind_id').annotate(count=Count('kind_id')).order_by('kind_id'))
+        self.assertEqual(self.statistics.kind_counts, kind_counts)
+        self.assertEqual(
+            self.statistics.get_kind_count(content_kinds.EXERCISE),
+            self.descendants.filter(kind_id=content_kinds.EXERCISE).count(),
+        )
+
+    def test_sizes(self):
+        files = File.objects.filter(contentnode__in=self.descendants)
+        self.assertEqual(self.statistics.file_size, files.aggregate(size=Sum('file_size'))['size'])
+        self.assertEqual(
+            self.statistics.size,
+            files.values('checksum', 'file_size').distinct().aggregate(size=Sum('file_size'))['size'],
+        )
+        self.assertEqual(sum(self.statistics.node_file_sizes.values()), self.statistics.file_size)
+
+    def test_assessment_count(self):
+        self.assertEqual(
+            self.statistics.assessment_count,
+            AssessmentItem.objects.filter(contentnode__in=self.descendants).count(),
+        )
+
+    def test_published_only(self):
+        self.descendants.update(published=False)
+        statistics = ChannelStatistics(self.channel.main_tree, published_only=True)
+        self.assertEqual(statistics.node_count, 0)
+        self.assertEqual(statistics.size, 0)
+        self.assertEqual(statistics.kind_counts, [])
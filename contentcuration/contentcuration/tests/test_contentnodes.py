@@ -3,17 +3,21 @@ from __future__ import division
 
 import random
 import string
+import threading
 import time
 from builtins import range
 from builtins import str
 from builtins import zip
 
 import pytest
+from django.db import connection
 from django.db.utils import DataError
+from django.test import TransactionTestCase
 from le_utils.constants import content_kinds
 from mixer.backend.django import mixer
 from mock import patch
 from past.utils import old_div
+from prometheus_client import REGISTRY
 
 from . import testdata
 from .base import BaseTestCase
@@ -21,13 +25,16 @@ from .testdata import create_studio_file
 from contentcuration.models import Channel
 from contentcuration.models import ContentKind
 from contentcuration.models import ContentNode
+from contentcuration.models import ContentNodeTreeStats
 from contentcuration.models import ContentTag
 from contentcuration.models import FormatPreset
 from contentcuration.models import generate_storage_url
 from contentcuration.models import Language
+from contentcuration.models import PrerequisiteContentRelationship
 from contentcuration.utils.db_tools import TreeBuilder
 from contentcuration.utils.files import create_thumbnail_from_base64
 from contentcuration.utils.sync import sync_node
+from contentcuration.utils.tasks import TaskCancelled
 
 
 def _create_nodes(num_nodes, title, parent=None, levels=2):
@@ -440,6 +447,76 @@ class NodeOperationsTestCase(BaseTestCase):
             self.channel.main_tree.get_children().count() - 1,
         )
 
+    def test_duplicate_nodes_set_based(self):
+        """
+        Ensures that copies of large subtrees leave out excluded descendants and keep their prerequisites
+        """
+        new_channel = testdata.channel()
+        source = self.channel.main_tree
+        excluded = source.get_children().first()
+        resources = list(
+            source.get_descendants()
+            .exclude(kind_id=content_kinds.TOPIC)
+            .exclude(pk__in=excluded.get_descendants(include_self=True))[:2]
+        )
+        PrerequisiteContentRelationship.objects.create(target_node=resources[0], prerequisite=resources[1])
+
+        copy = source.copy_to(
+            new_channel.main_tree, excluded_descendants={excluded.node_id: True}, batch_size=1
+        )
+
+        self.assertEqual(
+            copy.get_descendant_count(),
+            source.get_descendant_count() - excluded.get_descendant_count() - 1,
+        )
+        self.assertFalse(copy.get_descendants().filter(cloned_source=excluded).exists())
+        target_copy = copy.get_descendants().get(cloned_source=resources[0])
+        self.assertEqual(
+            list(target_copy.prerequisite.values_list("cloned_source_id", flat=True)), [resources[1].id]
+        )
+        new_channel.main_tree.refresh_from_db()
+        self.assertEqual(copy.rght + 1, new_channel.main_tree.rght)
+
+    def test_duplicate_nodes_lazy(self):
+        """
+        Ensures that lazy copies share the files and assessment items of their source until they are materialized
+        """
+        new_channel = testdata.channel()
+        video = self.channel.main_tree.get_descendants().filter(kind_id=content_kinds.VIDEO).first()
+        exercise = self.channel.main_tree.get_descendants().filter(kind_id=content_kinds.EXERCISE).first()
+        file_ids = set(video.files.values_list("id", flat=True))
+
+        copy = self.channel.main_tree.copy_to(new_channel.main_tree, lazy=True)
+        video_copy = copy.get_descendants().get(cloned_source=video)
+        exercise_copy = copy.get_descendants().get(cloned_source=exercise)
+
+        self.assertEqual(video_copy.content_source_id, video.id)
+        self.assertFalse(video_copy.files.exists())
+        self.assertFalse(exercise_copy.assessment_items.exists())
+        self.assertEqual(set(video_copy.get_content_owner().files.values_list("id", flat=True)), file_ids)
+
+        copy_ids = ContentNode.objects.prepare_content_edit([video_copy.id, exercise_copy.id])
+
+        video_copy.refresh_from_db()
+        self.assertIsNone(video_copy.content_source_id)
+        self.assertEqual(
+            set(video_copy.files.values_list("id", flat=True)),
+            set(copy_ids[(video_copy.id, file_id)] for file_id in file_ids),
+        )
+        self.assertEqual(exercise_copy.assessment_items.count(), exercise.assessment_items.count())
+        self.assertEqual(set(video.files.values_list("id", flat=True)), file_ids)
+
+    def test_duplicate_nodes_cancelled(self):
+        """
+        Ensures that nothing is left of a copy that was cancelled part way through
+        """
+        new_channel = testdata.channel()
+        node_count = ContentNode.objects.count()
+        with patch("contentcuration.db.models.manager.check_cancelled", side_effect=[None, TaskCancelled()]):
+            with self.assertRaises(TaskCancelled):
+                self.channel.main_tree.copy_to(new_channel.main_tree)
+        self.assertEqual(ContentNode.objects.count(), node_count)
+
     def test_duplicate_nodes_freeze_authoring_data_no_edit(self):
         """
         Ensures that when we copy nodes, we can exclude nodes from the descendant
@@ -811,3 +888,124 @@ class NodeCreationTestCase(BaseTestCase):
                 ContentTag,
                 tag_name=random.sample(string.printable, random.randint(51, 80)),
             )
+
+
+class TreeStatsTestCase(BaseTestCase):
+    def assertStatsUpToDate(self, tree_id):
+        stats = ContentNodeTreeStats.objects.filter(node__tree_id=tree_id).order_by("node_id")
+        fields = ("node_id",) + ContentNodeTreeStats.count_fields
+        incremental = list(stats.values_list(*fields))
+        ContentNodeTreeStats.rebuild(tree_id)
+        self.assertEqual(incremental, list(stats.values_list(*fields)))
+        return dict((row[0], dict(zip(fields[1:], row[1:]))) for row in incremental)
+
+    def test_created_tree(self):
+        root = self.channel.main_tree
+        stats = self.assertStatsUpToDate(root.tree_id)
+        self.assertEqual(stats[root.id]["resource_count"], root.get_descendants().exclude(kind_id=content_kinds.TOPIC).count())
+        self.assertGreater(stats[root.id]["resource_size"], 0)
+
+    def test_update_move_and_delete(self):
+        root = self.channel.main_tree
+        resource = root.get_descendants().exclude(kind_id=content_kinds.TOPIC).first()
+        resource.complete = False
+        resource.save()
+        self.assertStatsUpToDate(root.tree_id)
+
+        topic = root.get_descendants().filter(kind_id=content_kinds.TOPIC).exclude(pk=resource.parent_id).first()
+        resource.move_to(topic, "last-child")
+        self.assertStatsUpToDate(root.tree_id)
+
+        ContentNode.objects.get(pk=resource.parent_id).delete()
+        self.assertStatsUpToDate(root.tree_id)
+
+    def test_copy(self):
+        new_channel = testdata.channel()
+        self.channel.main_tree.copy_to(new_channel.main_tree, batch_size=2)
+        self.assertStatsUpToDate(new_channel.main_tree.tree_id)
+
+    def test_update_and_delete_shared_file(self):
+        new_channel = testdata.channel()
+        video = self.channel.main_tree.get_descendants().filter(kind_id=content_kinds.VIDEO).first()
+        video.copy_to(new_channel.main_tree, lazy=True)
+        tree_id = new_channel.main_tree.tree_id
+        self.assertStatsUpToDate(tree_id)
+
+        file = video.files.first()
+        file.file_size = (file.file_size or 0) + 1000
+        file.save()
+        self.assertStatsUpToDate(tree_id)
+
+        file.delete()
+        self.assertStatsUpToDate(tree_id)
+
+
+class FastRebuildTestCase(BaseTestCase):
+    def get_tree_fields(self, tree_id):
+        return list(ContentNode.objects.filter(tree_id=tree_id).order_by("lft").values_list("id", "lft", "rght", "level"))
+
+    def test_same_as_partial_rebuild(self):
+        tree_id = self.channel.main_tree.tree_id
+        expected = self.get_tree_fields(tree_id)
+        ContentNode.objects.filter(tree_id=tree_id).exclude(parent=None).update(rght=0, level=0)
+        ContentNode.objects.fast_rebuild(tree_id)
+        self.assertEqual(self.get_tree_fields(tree_id), expected)
+
+    def test_nodes_added_with_mptt_updates_disabled(self):
+        root = self.channel.main_tree
+        topic = root.get_descendants().filter(kind_id=content_kinds.TOPIC).first()
+        moved = root.get_descendants().exclude(kind_id=content_kinds.TOPIC).exclude(parent=topic).first()
+        other_tree_id = testdata.channel().main_tree.tree_id
+        with ContentNode.objects.disable_mptt_updates():
+            # Nodes created in bulk all get the same placeholder lft, and only sort_order orders them
+            second = ContentNode.objects.create(title="second", kind_id=content_kinds.TOPIC, parent=topic, sort_order=2)
+            first = ContentNode.objects.create(title="first", kind_id=content_kinds.TOPIC, parent=topic, sort_order=1)
+            ContentNode.objects.filter(pk__in=[first.pk, second.pk]).update(lft=topic.rght)
+            moved.parent = first
+            moved.save()
+        ContentNode.objects.filter(pk=moved.pk).update(tree_id=other_tree_id)
+
+        ContentNode.objects.fast_rebuild(root.tree_id)
+        root.refresh_from_db()
+        topic.refresh_from_db()
+        self.assertEqual(list(topic.get_children().values_list("title", flat=True))[-2:], ["first", "second"])
+        self.assertEqual(list(ContentNode.objects.get(pk=first.pk).get_children()), [moved])
+        tree = self.get_tree_fields(root.tree_id)
+        self.assertEqual(tree[0][1:], (1, 2 * len(tree), 0))
+        self.assertEqual(len(tree), root.get_descendants(include_self=True).count())
+
+
+class MPTTLockTestCase(TransactionTestCase):
+    def test_overlapping_operations_on_tree_are_serialized(self):
+        intervals = []
+        locked = threading.Event()
+
+        def operation():
+            try:
+                with ContentNode.objects.lock_mptt(1):
+                    start = time.time()
+                    locked.set()
+                    time.sleep(0.2)
+                    intervals.append((start, time.time()))
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=operation)
+        first.start()
+        self.assertTrue(locked.wait(5))
+        second = threading.Thread(target=operation)
+        second.start()
+        first.join()
+        second.join()
+
+        self.assertEqual(len(intervals), 2)
+        (_first_start, first_end), (second_start, _second_end) = sorted(intervals)
+        self.assertGreaterEqual(second_start, first_end)
+
+    def test_hold_time_observed_when_operation_fails(self):
+        sample = "contentcuration_mptt_lock_hold_seconds_count"
+        count = REGISTRY.get_sample_value(sample) or 0
+        with self.assertRaises(ValueError):
+            with ContentNode.objects.lock_mptt(1):
+                raise ValueError("Operation failed")
+        self.assertEqual(REGISTRY.get_sample_value(sample), count + 1)
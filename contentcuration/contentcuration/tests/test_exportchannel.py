@@ -1,13 +1,19 @@
 from __future__ import absolute_import
 
+import json
 import os
 import random
+import shutil
 import string
 import tempfile
+from io import BytesIO
 
 import pytest
+from django.core.files.storage import default_storage
 from kolibri_content import models as kolibri_models
 from kolibri_content.router import set_active_content_database
+from le_utils.constants import content_kinds
+from le_utils.constants import format_presets
 from mock import patch
 
 from .base import StudioTestCase
@@ -15,13 +21,21 @@ from .testdata import channel
 from .testdata import node as create_node
 from .testdata import slideshow
 from contentcuration import models as cc
+from contentcuration.utils.profiler import profile
+from contentcuration.utils.profiler import profile_phase
 from contentcuration.utils.publish import convert_channel_thumbnail
-from contentcuration.utils.publish import create_bare_contentnode
+from contentcuration.utils.publish import count_prerequisite_cycles
 from contentcuration.utils.publish import create_content_database
+from contentcuration.utils.publish import create_perseus_zip
 from contentcuration.utils.publish import create_slideshow_manifest
+from contentcuration.utils.publish import encode_thumbnails
 from contentcuration.utils.publish import fill_published_fields
+from contentcuration.utils.publish import get_kolibri_contentnode_fields
+from contentcuration.utils.publish import get_kolibri_license
 from contentcuration.utils.publish import map_prerequisites
+from contentcuration.utils.publish import mark_all_nodes_as_published
 from contentcuration.utils.publish import MIN_SCHEMA_VERSION
+from contentcuration.utils.publish import PerseusImageCache
 from contentcuration.utils.publish import prepare_export_database
 from contentcuration.utils.publish import set_channel_icon_encoding
 
@@ -32,6 +46,14 @@ def description():
     return "".join(random.sample(string.printable, 20))
 
 
+def create_kolibri_node(ccnode, channel):
+    return kolibri_models.ContentNode.objects.create(
+        parent_id=ccnode.parent and ccnode.parent.node_id,
+        available=True,
+        **get_kolibri_contentnode_fields(ccnode, channel.id, channel.name, None, None)
+    )
+
+
 class ExportChannelTestCase(StudioTestCase):
 
     @classmethod
@@ -66,6 +88,10 @@ class ExportChannelTestCase(StudioTestCase):
         new_video.parent = new_node
         new_video.save()
 
+        # Add a node that shares the files of the node it was imported from
+        self.source_video = channel().main_tree.get_descendants().filter(kind_id=content_kinds.VIDEO).first()
+        self.imported_video = self.source_video.copy_to(self.content_channel.main_tree, lazy=True)
+
         set_channel_icon_encoding(self.content_channel)
         self.tempdb = create_content_database(self.content_channel, True, None, True)
 
@@ -120,6 +146,32 @@ class ExportChannelTestCase(StudioTestCase):
         for node in nodes:
             self.assertEqual(node.channel_id, channel.id)
 
+    def test_contentnode_shared_files_data(self):
+        self.imported_video.refresh_from_db()
+        self.assertEqual(self.imported_video.content_source_id, self.source_video.id)
+        self.assertFalse(self.imported_video.files.exists())
+        files = kolibri_models.File.objects.filter(contentnode_id=self.imported_video.node_id)
+        self.assertEqual(
+            sorted(files.values_list('checksum', flat=True)),
+            sorted(self.source_video.files.values_list('checksum', flat=True)),
+        )
+        self.assertFalse(files.filter(pk__in=list(self.source_video.files.values_list('id', flat=True))).exists())
+
+    def test_get_kolibri_license_custom_descriptions(self):
+        custom_license = cc.License.objects.create(license_name="Custom license", is_custom=True)
+        ccnodes = [
+            cc.ContentNode(kind_id=content_kinds.VIDEO, license=custom_license, license_description=license_description)
+            for license_description in ["First description", "Second description", "First description"]
+        ]
+        kolibri_licenses = {}
+        licenses = [get_kolibri_license(ccnode, kolibri_licenses) for ccnode in ccnodes]
+        self.assertEqual(
+            [license.license_description for license in licenses],
+            ["First description", "Second description", "First description"],
+        )
+        self.assertEqual(licenses[0].pk, licenses[2].pk)
+        self.assertNotEqual(licenses[0].pk, licenses[1].pk)
+
     def test_contentnode_file_checksum_data(self):
         files = kolibri_models.File.objects.all()
         assert files.count() > 0
@@ -141,6 +193,153 @@ class ExportChannelTestCase(StudioTestCase):
     def test_channel_icon_encoding(self):
         self.assertIsNotNone(self.content_channel.icon_encoding)
 
+    def test_contentnode_tree_structure(self):
+        kolibri_nodes = kolibri_models.ContentNode.objects.all()
+        assert kolibri_nodes.count() > 0
+        for node in kolibri_nodes:
+            if node.parent_id:
+                parent = kolibri_nodes.get(pk=node.parent_id)
+                self.assertEqual(node.tree_id, parent.tree_id)
+                self.assertEqual(node.level, parent.level + 1)
+                self.assertTrue(parent.lft < node.lft < node.rght < parent.rght)
+            self.assertEqual((node.rght - node.lft - 1) // 2, node.get_descendant_count())
+
+    def test_contentnode_available(self):
+        kolibri_nodes = kolibri_models.ContentNode.objects.all()
+        assert kolibri_nodes.count() > 0
+        for node in kolibri_nodes:
+            self.assertTrue(node.available)
+            self.assertTrue(node.get_descendants(include_self=True).exclude(kind=content_kinds.TOPIC).exists())
+
+    def test_exercise_files_created(self):
+        exported_ids = kolibri_models.ContentNode.objects.filter(kind=content_kinds.EXERCISE).values_list('id', flat=True)
+        exercises = cc.ContentNode.objects.filter(node_id__in=list(exported_ids))
+        assert exercises.count() > 0
+        for exercise in exercises:
+            exercise_files = exercise.files.filter(preset_id=format_presets.EXERCISE)
+            self.assertEqual(exercise_files.count(), 1)
+            self.assertTrue(default_storage.exists(exercise_files[0].file_on_disk.name))
+
+    def test_perseus_zip_pooled_render_identical(self):
+        exercise = self.content_channel.main_tree.get_descendants().filter(kind_id=content_kinds.EXERCISE).first()
+        exercise_data = {'mastery_model': 'do_all', 'randomize': True}
+
+        expected = BytesIO()
+        create_perseus_zip(exercise, exercise_data, expected)
+
+        image_cache = PerseusImageCache()
+        try:
+            assessment_items = list(exercise.assessment_items.prefetch_related('files').order_by('order'))
+            actual = BytesIO()
+            create_perseus_zip(exercise, exercise_data, actual, assessment_items=assessment_items, image_cache=image_cache)
+        finally:
+            image_cache.close()
+        self.assertEqual(expected.getvalue(), actual.getvalue())
+
+    def test_force_exercises_reuses_cached_zips(self):
+        exercise_files = cc.File.objects.filter(
+            preset_id=format_presets.EXERCISE,
+            contentnode__tree_id=self.content_channel.main_tree.tree_id,
+        )
+        file_ids = set(exercise_files.values_list('id', flat=True))
+        assert len(file_ids) > 0
+        with patch('contentcuration.utils.publish.create_perseus_zip') as create_zip:
+            tempdb = create_content_database(self.content_channel, True, None, True)
+        os.remove(tempdb)
+        create_zip.assert_not_called()
+        self.assertEqual(file_ids, set(exercise_files.values_list('id', flat=True)))
+
+
+class IncrementalExportChannelTestCase(StudioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(IncrementalExportChannelTestCase, cls).setUpClass()
+        cls.patch_copy_db = patch('contentcuration.utils.publish.save_export_database')
+        cls.patch_copy_db.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(IncrementalExportChannelTestCase, cls).tearDownClass()
+        cls.patch_copy_db.stop()
+
+    def setUp(self):
+        super(IncrementalExportChannelTestCase, self).setUp()
+        self.content_channel = channel()
+        set_channel_icon_encoding(self.content_channel)
+        self.published_db = create_content_database(self.content_channel, True, None, True)
+        mark_all_nodes_as_published(self.content_channel)
+        self.tempdb = None
+
+    def tearDown(self):
+        super(IncrementalExportChannelTestCase, self).tearDown()
+        set_active_content_database(None)
+        for db in (self.published_db, self.tempdb):
+            if db and os.path.exists(db):
+                os.remove(db)
+
+    def _publish_incrementally(self):
+        def download_export_database(channel_id, tempdb):
+            shutil.copyfile(self.published_db, tempdb)
+            return True
+
+        with patch('contentcuration.utils.publish.download_export_database', side_effect=download_export_database):
+            self.tempdb = create_content_database(self.content_channel, True, None, False, incremental=True)
+        set_active_content_database(self.tempdb)
+
+    def test_incremental_export_changed_node(self):
+        node = self.content_channel.main_tree.get_descendants().exclude(kind_id=content_kinds.TOPIC).first()
+        node.title = "New title"
+        node.save()
+        self._publish_incrementally()
+        self.assertEqual(kolibri_models.ContentNode.objects.get(pk=node.node_id).title, "New title")
+
+    def test_incremental_export_deleted_node(self):
+        node = self.content_channel.main_tree.get_descendants().exclude(kind_id=content_kinds.TOPIC).first()
+        node.delete()
+        self._publish_incrementally()
+        self.assertFalse(kolibri_models.ContentNode.objects.filter(pk=node.node_id).exists())
+        self.assertFalse(kolibri_models.File.objects.filter(contentnode_id=node.node_id).exists())
+
+    def test_incremental_export_moved_node(self):
+        node = self.content_channel.main_tree.get_descendants().exclude(kind_id=content_kinds.TOPIC).last()
+        node.move_to(self.content_channel.main_tree, "first-child")
+        self._publish_incrementally()
+        kolibri_node = kolibri_models.ContentNode.objects.get(pk=node.node_id)
+        self.assertEqual(kolibri_node.parent_id, self.content_channel.main_tree.node_id)
+        self.assertEqual(kolibri_node.lft, 2)
+        self.assertTrue(kolibri_models.File.objects.filter(contentnode_id=node.node_id).exists())
+
+    def test_incremental_export_tags_and_languages(self):
+        nodes = list(self.content_channel.main_tree.get_descendants().exclude(kind_id=content_kinds.TOPIC)[:2])
+        tag = cc.ContentTag.objects.create(tag_name="shared tag", channel=self.content_channel)
+        for node in nodes:
+            node.tags.add(tag)
+            node.language_id = "fr"
+            node.save()
+        self._publish_incrementally()
+        for node in nodes:
+            kolibri_node = kolibri_models.ContentNode.objects.get(pk=node.node_id)
+            self.assertEqual([t.tag_name for t in kolibri_node.tags.all()], ["shared tag"])
+            self.assertEqual(kolibri_node.lang_id, "fr")
+        self.assertEqual(kolibri_models.ContentTag.objects.filter(tag_name="shared tag").count(), 1)
+
+    def test_incremental_export_matches_full_export(self):
+        node = self.content_channel.main_tree.get_descendants().exclude(kind_id=content_kinds.TOPIC).first()
+        node.delete()
+        self._publish_incrementally()
+        incremental_nodes = list(kolibri_models.ContentNode.objects.values_list("id", "parent_id", "lft", "rght", "level"))
+        set_active_content_database(None)
+
+        full_db = create_content_database(self.content_channel, True, None, False)
+        try:
+            set_active_content_database(full_db)
+            full_nodes = list(kolibri_models.ContentNode.objects.values_list("id", "parent_id", "lft", "rght", "level"))
+        finally:
+            set_active_content_database(None)
+            os.remove(full_db)
+        self.assertEqual(sorted(incremental_nodes), sorted(full_nodes))
+
 
 class ChannelExportUtilityFunctionTestCase(StudioTestCase):
     @classmethod
@@ -187,11 +386,25 @@ class ChannelExportUtilityFunctionTestCase(StudioTestCase):
     def test_create_slideshow_manifest(self):
         content_channel = cc.Channel.objects.create()
         ccnode = cc.ContentNode.objects.create(kind_id=slideshow(), extra_fields={})
-        kolibrinode = create_bare_contentnode(ccnode, ccnode.language, content_channel.id, content_channel.name)
+        kolibrinode = create_kolibri_node(ccnode, content_channel)
         create_slideshow_manifest(ccnode, kolibrinode)
         manifest_collection = cc.File.objects.filter(contentnode=ccnode, preset_id=u"slideshow_manifest")
         assert len(manifest_collection) == 1
 
+    def test_encode_thumbnails_once_per_source(self):
+        ccnodes = [cc.ContentNode.objects.create(kind_id=slideshow(), extra_fields={}) for i in range(3)]
+        thumbnail_files = [
+            (ccnode, cc.File(checksum="a" * 32, file_format=cc.FileFormat(extension="png"), contentnode_id=ccnode.id))
+            for ccnode in ccnodes
+        ]
+        encoding = "data:image/png;base64,dGVzdA=="
+        with patch("contentcuration.utils.publish.get_thumbnail_encoding", return_value=encoding) as get_encoding:
+            failed_node_ids = encode_thumbnails(thumbnail_files)
+        get_encoding.assert_called_once_with("{}.png".format("a" * 32))
+        self.assertEqual(failed_node_ids, set())
+        for ccnode in cc.ContentNode.objects.filter(id__in=[ccnode.id for ccnode in ccnodes]):
+            self.assertEqual(json.loads(ccnode.thumbnail_encoding)["base64"], encoding)
+
 
 class ChannelExportPrerequisiteTestCase(StudioTestCase):
     @classmethod
@@ -221,6 +434,31 @@ class ChannelExportPrerequisiteTestCase(StudioTestCase):
         cc.PrerequisiteContentRelationship.objects.create(target_node=exercise, prerequisite=node1)
         map_prerequisites(node1)
 
+    def test_prerequisites_bulk_mapped(self):
+        channel = cc.Channel.objects.create()
+        nodes = [cc.ContentNode.objects.create(kind_id="exercise", parent_id=channel.main_tree.pk) for i in range(3)]
+        for ccnode in [channel.main_tree] + nodes[:2]:
+            create_kolibri_node(ccnode, channel)
+
+        cc.PrerequisiteContentRelationship.objects.create(target_node=nodes[1], prerequisite=nodes[0])
+        # The target of this prerequisite is not exported
+        cc.PrerequisiteContentRelationship.objects.create(target_node=nodes[2], prerequisite=nodes[0])
+        with profile() as profiler:
+            with profile_phase('prerequisites'):
+                map_prerequisites(channel.main_tree)
+
+        target = kolibri_models.ContentNode.objects.get(pk=nodes[1].node_id)
+        self.assertEqual(list(target.has_prerequisite.values_list('pk', flat=True)), [nodes[0].node_id])
+        self.assertEqual(kolibri_models.ContentNode.has_prerequisite.through.objects.count(), 1)
+        counts = profiler.report()[0]['counts']
+        self.assertEqual(counts['orphaned_prerequisites'], 1)
+        self.assertEqual(counts['prerequisite_cycles'], 0)
+
+    def test_count_prerequisite_cycles(self):
+        self.assertEqual(count_prerequisite_cycles([('a', 'b'), ('b', 'c')]), 0)
+        self.assertEqual(count_prerequisite_cycles([('a', 'b'), ('b', 'c'), ('c', 'a'), ('d', 'd')]), 2)
+        self.assertEqual(count_prerequisite_cycles([('a', 'b'), ('b', 'a'), ('c', 'd'), ('d', 'c'), ('a', 'c')]), 2)
+
 
 class ChannelExportPublishedData(StudioTestCase):
     def test_fill_published_fields(self):
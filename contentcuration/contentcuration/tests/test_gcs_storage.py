@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 from future import standard_library
 standard_library.install_aliases()
+import gzip
 from io import BytesIO
 
 import pytest
@@ -10,8 +11,8 @@ from google.cloud.storage import Client
 from google.cloud.storage.blob import Blob
 from mixer.main import mixer
 from mock import create_autospec
-from mock import patch
 
+from contentcuration.utils.gcs_storage import DATABASE_CHUNK_SIZE
 from contentcuration.utils.gcs_storage import GoogleCloudStorage as gcs
 
 
@@ -73,17 +74,38 @@ class GoogleCloudStorageSaveTestCase(TestCase):
         self.storage.save(filename, self.content, blob_object=self.blob_obj)
         assert "private" in self.blob_obj.cache_control
 
-    @patch("contentcuration.utils.gcs_storage.BytesIO")
-    @patch("contentcuration.utils.gcs_storage.GoogleCloudStorage._is_file_empty", return_value=False)
-    def test_gzip_if_content_database(self, bytesio_mock, file_empty_mock):
+    def _get_uploaded_content(self):
+        uploaded = []
+        self.blob_obj.upload_from_file.side_effect = lambda fobj, **kwargs: uploaded.append(fobj.read())
+        return uploaded
+
+    def test_gzip_if_content_database(self):
         """
-        Check that if we're uploading a gzipped content database and
-        if the BytesIO object has been closed.
+        Check that if we're uploading a content database, it is uploaded gzipped.
         """
+        uploaded = self._get_uploaded_content()
         filename = "content/databases/myfile.sqlite3"
         self.storage.save(filename, self.content, blob_object=self.blob_obj)
         assert self.blob_obj.content_encoding == "gzip"
-        assert bytesio_mock.called
+        assert gzip.decompress(uploaded[0]) == b"content"
+
+    def test_does_not_gzip_gzipped_content_database(self):
+        """
+        Check that a content database that has already been gzipped is uploaded as it is.
+        """
+        uploaded = self._get_uploaded_content()
+        filename = "content/databases/myfile.sqlite3"
+        self.storage.save(filename, BytesIO(gzip.compress(b"content")), blob_object=self.blob_obj)
+        assert self.blob_obj.content_encoding == "gzip"
+        assert gzip.decompress(uploaded[0]) == b"content"
+
+    def test_uploads_content_database_in_chunks(self):
+        """
+        Check that content databases are uploaded in chunks, so they are not held in memory all at once.
+        """
+        filename = "content/databases/myfile.sqlite3"
+        self.storage.save(filename, self.content, blob_object=self.blob_obj)
+        assert self.blob_obj.chunk_size == DATABASE_CHUNK_SIZE
 
 
 class GoogleCloudStorageOpenTestCase(TestCase):
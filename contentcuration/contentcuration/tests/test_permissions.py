@@ -0,0 +1,42 @@
+from __future__ import absolute_import
+
+from .base import BaseTestCase
+from .testdata import channel
+from .testdata import user
+from contentcuration.models import AssessmentItem
+from contentcuration.models import ContentNode
+from contentcuration.models import File
+from contentcuration.permissions import EditPermissions
+
+
+class EditPermissionsTestCase(BaseTestCase):
+    def setUp(self):
+        super(EditPermissionsTestCase, self).setUp()
+        # A channel the user cannot edit
+        channel()
+        self.permissions = EditPermissions(self.user)
+
+    def assertSameEditable(self, model):
+        expected = model.filter_edit_queryset(model.objects.all(), self.user).values_list("pk", flat=True)
+        editable = self.permissions.filter_edit_queryset(model.objects.all()).values_list("pk", flat=True)
+        self.assertGreater(len(editable), 0)
+        self.assertEqual(sorted(editable), sorted(expected))
+
+    def test_contentnodes(self):
+        self.assertSameEditable(ContentNode)
+
+    def test_assessment_items(self):
+        self.assertSameEditable(AssessmentItem)
+
+    def test_files(self):
+        self.assertSameEditable(File)
+
+    def test_editable_tree_ids_resolved_once(self):
+        self.permissions.filter_edit_queryset(ContentNode.objects.all()).count()
+        with self.assertNumQueries(1):
+            self.permissions.filter_edit_queryset(AssessmentItem.objects.all()).count()
+        self.assertIn(self.channel.main_tree.tree_id, self.permissions.editable_tree_ids)
+
+    def test_other_user(self):
+        permissions = EditPermissions(user("other@user.com"))
+        self.assertFalse(permissions.filter_edit_queryset(AssessmentItem.objects.all()).exists())
@@ -0,0 +1,54 @@
+from __future__ import absolute_import
+
+from django.db import connection
+
+from .base import StudioTestCase
+from contentcuration.models import Channel
+from contentcuration.utils.profiler import get_active_profiler
+from contentcuration.utils.profiler import profile
+from contentcuration.utils.profiler import profile_phase
+from contentcuration.utils.profiler import record_bytes
+
+
+class ProfilerTestCase(StudioTestCase):
+    def test_phase_records_queries_and_bytes(self):
+        with profile() as profiler:
+            with profile_phase("count"):
+                Channel.objects.count()
+                Channel.objects.count()
+                record_bytes(10)
+        report = profiler.report()
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]["phase"], "count")
+        self.assertEqual(report[0]["queries"], 2)
+        self.assertEqual(report[0]["bytes"], 10)
+        self.assertGreaterEqual(report[0]["time"], 0)
+
+    def test_repeated_and_nested_phases(self):
+        with profile() as profiler:
+            for i in range(2):
+                with profile_phase("outer"):
+                    with profile_phase("inner"):
+                        Channel.objects.count()
+                        record_bytes(5)
+        phases = {phase["phase"]: phase for phase in profiler.report()}
+        self.assertEqual(phases["inner"]["queries"], 2)
+        self.assertEqual(phases["outer"]["queries"], 2)
+        self.assertEqual(phases["inner"]["bytes"], 10)
+        self.assertEqual(phases["outer"]["bytes"], 0)
+
+    def test_restores_connection(self):
+        force_debug_cursor = connection.force_debug_cursor
+        queries_log = connection.queries_log
+        with profile():
+            with profile_phase("count"):
+                Channel.objects.count()
+        self.assertIsNone(get_active_profiler())
+        self.assertEqual(connection.force_debug_cursor, force_debug_cursor)
+        self.assertIs(connection.queries_log, queries_log)
+
+    def test_noop_without_profiler(self):
+        with profile_phase("count"):
+            Channel.objects.count()
+            record_bytes(10)
+        self.assertIsNone(get_active_profiler())
@@ -114,6 +114,15 @@ class SushibarEndpointsTestCase(BaseAPITestCase):
                                       mapB={'kind': 'kind.pk'})
         assert not diff, 'Found difference in tree structures:' + str(diff)
 
+    def test_get_tree_data_shared_content(self):
+        exercise = self.channel.main_tree.get_descendants().filter(kind_id="exercise").first()
+        video = self.channel.main_tree.get_descendants().filter(kind_id="video").first()
+        target = cc.Channel.objects.create().main_tree
+        exercise_copy = exercise.copy_to(target, lazy=True)
+        video_copy = video.copy_to(target, lazy=True)
+        self.assertEqual(exercise_copy.get_tree_data()["count"], exercise.assessment_items.count())
+        self.assertEqual(video_copy.get_tree_data()["file_size"], video.get_tree_data()["file_size"])
+
     def test_get_tree_data_endpoint(self):
         channel_id = self.channel.id
         url = reverse_lazy('get_tree_data')
@@ -22,6 +22,7 @@ from ..testdata import user
 from contentcuration import ricecooker_versions as rc
 from contentcuration.models import Channel
 from contentcuration.models import ContentNode
+from contentcuration.models import Task
 from contentcuration.views import internal
 
 
@@ -136,6 +137,31 @@ class ApiAddNodesToTreeTestCase(StudioTestCase):
         # our original file object
         assert f.file_on_disk.read() == self.fileobj.file_on_disk.read()
 
+    def test_creates_nodes_in_bulk(self):
+        """
+        Check that several nodes are created in order, with their tags, skipping nodes already in the tree.
+        """
+        content_data = []
+        for i in range(3):
+            node_data = dict(self.sample_data["content_data"][0])
+            node_data.update(node_id=uuid.uuid4().hex, title="Bulk node {}".format(i), tags=["shared", "tag {}".format(i)])
+            content_data.append(node_data)
+        content_data.append(self.sample_data["content_data"][0])
+        response = self.admin_client().post(
+            reverse_lazy("api_add_nodes_to_tree"),
+            data={"root_id": self.root_node.id, "content_data": content_data},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.data["root_ids"]), 3)
+
+        nodes = ContentNode.objects.filter(pk__in=response.data["root_ids"].values()).order_by("sort_order")
+        self.assertEqual([node.title for node in nodes], ["Bulk node 0", "Bulk node 1", "Bulk node 2"])
+        for i, node in enumerate(nodes):
+            self.assertEqual(sorted(node.tags.values_list("tag_name", flat=True)), ["shared", "tag {}".format(i)])
+            self.assertEqual(node.files.count(), 1)
+        self.assertEqual(ContentNode.objects.filter(parent=self.root_node, title=self.title).count(), 1)
+
 
 class ApiAddExerciseNodesToTreeTestCase(StudioTestCase):
     """
@@ -533,6 +559,28 @@ class APICommitChannelEndpointTestCase(BaseAPITestCase):
         )
         self.assertEqual(response.status_code, 404)
 
+    def test_commit_retry_returns_same_task(self):
+        self.channel.chef_tree = self.channel.main_tree
+        self.channel.save()
+        data = {"channel_id": self.channel.id, "stage": True, "async": True}
+        response = self.post(reverse_lazy("api_finish_channel"), data)
+        self.assertEqual(response.status_code, 200, response.content)
+        task_id = response.json()["task_id"]
+
+        response = self.post(reverse_lazy("api_finish_channel"), data)
+        self.assertEqual(response.json()["task_id"], task_id)
+        self.assertEqual(Task.objects.filter(task_type="commit-channel").count(), 1)
+
+        response = self.get(
+            "{}?task_id={}".format(reverse_lazy("api_finish_channel_status"), task_id)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "SUCCESS")
+        self.assertEqual(response.json()["new_channel"], self.channel.id)
+        self.channel.refresh_from_db()
+        self.assertIsNone(self.channel.chef_tree)
+        self.assertEqual(self.channel.staging_tree_id, self.channel.main_tree_id)
+
 
 class APIActivateChannelEndpointTestCase(BaseAPITestCase):
     def test_200_post(self):
@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+
+import json
+from datetime import datetime
+
+import mock
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from contentcuration.viewsets.base import compile_field_map
+from contentcuration.viewsets.common import ValuesJSONRenderer
+
+
+def pop_source(item):
+    item.pop("source")
+    return "called"
+
+
+class CompileFieldMapTestCase(SimpleTestCase):
+    def test_compiled_field_map(self):
+        map_fields = compile_field_map(
+            {
+                "renamed": "name",
+                "called": pop_source,
+                "popped": "source",
+                "constant": None,
+            }
+        )
+        self.assertEqual(
+            map_fields({"name": "name", "source": "source"}),
+            {"renamed": "name", "called": "called", "popped": "source", "constant": None},
+        )
+
+
+class ValuesJSONRendererTestCase(SimpleTestCase):
+    data = [{"id": "abc", "count": 1, "modified": datetime(2020, 10, 1, 12, 30), "title": u"été", 1: None}]
+
+    def assertRendersSameData(self, rendered):
+        self.assertEqual(
+            json.loads(rendered.decode("utf-8")),
+            json.loads(JSONRenderer().render(self.data).decode("utf-8")),
+        )
+
+    def test_renders_same_data_with_orjson(self):
+        with mock.patch("contentcuration.viewsets.common.JSONRenderer.render") as render:
+            rendered = ValuesJSONRenderer().render(self.data)
+        render.assert_not_called()
+        self.assertRendersSameData(rendered)
+
+    def test_renders_same_data_without_orjson(self):
+        with mock.patch("contentcuration.viewsets.common.orjson", None):
+            self.assertRendersSameData(ValuesJSONRenderer().render(self.data))
+
+    def test_renders_integers_orjson_does_not_handle(self):
+        data = {"id": 2 ** 64}
+        self.assertEqual(json.loads(ValuesJSONRenderer().render(data).decode("utf-8")), data)
@@ -392,3 +392,42 @@ class CRUDTestCase(StudioAPITestCase):
             self.fail("Channel was not deleted")
         except models.Channel.DoesNotExist:
             pass
+
+
+class KeysetPaginationTestCase(StudioAPITestCase):
+    def setUp(self):
+        super(KeysetPaginationTestCase, self).setUp()
+        for name in ("b", "a", "c", "a", "b"):
+            models.Channel.objects.create(name=name)
+        self.user = testdata.user()
+        self.user.is_admin = True
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+
+    def test_pages_follow_ordering(self):
+        expected = list(models.Channel.objects.order_by("name", "id").values_list("id", flat=True))
+        response = self.client.get(reverse("admin-channels-list") + "?page_size=2&cursor=", format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(response.data["count"], len(expected))
+        ids = [channel["id"] for channel in response.data["results"]]
+        pages = [response]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"], format="json")
+            ids += [channel["id"] for channel in response.data["results"]]
+            pages.append(response)
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+
+        previous = self.client.get(pages[-1].data["previous"], format="json")
+        self.assertEqual(previous.data["results"], pages[-2].data["results"])
+
+    def test_descending_ordering(self):
+        expected = list(models.Channel.objects.order_by("-name", "-id").values_list("id", flat=True))
+        response = self.client.get(reverse("admin-channels-list") + "?ordering=-name&page_size=3&cursor=", format="json")
+        ids = [channel["id"] for channel in response.data["results"]]
+        response = self.client.get(response.data["next"], format="json")
+        ids += [channel["id"] for channel in response.data["results"]]
+        self.assertEqual(ids, expected)
+        self.assertIsNone(response.data["next"])
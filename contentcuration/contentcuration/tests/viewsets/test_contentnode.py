@@ -24,6 +24,7 @@ from contentcuration.viewsets.sync.constants import CONTENTNODE_PREREQUISITE
 from contentcuration.viewsets.sync.utils import generate_copy_event
 from contentcuration.viewsets.sync.utils import generate_create_event
 from contentcuration.viewsets.sync.utils import generate_delete_event
+from contentcuration.viewsets.sync.utils import generate_move_event
 from contentcuration.viewsets.sync.utils import generate_update_event
 
 
@@ -531,6 +532,35 @@ class SyncTestCase(StudioAPITestCase):
             models.ContentNode.objects.get(id=contentnode.id).title, new_title
         )
 
+    def test_update_contentnodes_tree_stats(self):
+        channel = testdata.channel()
+        user = testdata.user()
+        channel.editors.add(user)
+        root = channel.main_tree
+        resources = list(root.get_descendants().exclude(kind_id=content_kinds.TOPIC)[:2])
+        stats = models.ContentNodeTreeStats.objects.get(node=root)
+
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            self.sync_url,
+            [
+                generate_update_event(resources[0].id, CONTENTNODE, {"complete": False}),
+                generate_update_event(resources[1].id, CONTENTNODE, {"role_visibility": roles.COACH, "changed": True}),
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        updated_stats = models.ContentNodeTreeStats.objects.get(node=root)
+        self.assertEqual(updated_stats.error_count, stats.error_count + int(resources[0].complete))
+        self.assertEqual(updated_stats.coach_count, stats.coach_count + int(resources[1].role_visibility != roles.COACH))
+
+        # The ancestors of the nodes end up as they would be if rebuilt from scratch
+        fields = ("node_id",) + models.ContentNodeTreeStats.count_fields
+        tree_stats = models.ContentNodeTreeStats.objects.filter(node__tree_id=root.tree_id).order_by("node_id")
+        incremental = list(tree_stats.values_list(*fields))
+        models.ContentNodeTreeStats.rebuild(root.tree_id)
+        self.assertEqual(list(tree_stats.values_list(*fields)), incremental)
+
     def test_update_contentnode_extra_fields(self):
         user = testdata.user()
         contentnode = models.ContentNode.objects.create(**self.contentnode_db_metadata)
@@ -821,6 +851,54 @@ class SyncTestCase(StudioAPITestCase):
         except models.ContentNode.DoesNotExist:
             self.fail("ContentNode 2 was deleted")
 
+    def test_move_contentnodes(self):
+        channel = testdata.channel()
+        user = testdata.user()
+        channel.editors.add(user)
+        tree_id = channel.main_tree.tree_id
+        target = channel.main_tree.get_descendants().filter(kind_id=content_kinds.TOPIC).first()
+        children = list(target.get_children().values_list("id", flat=True))
+        nodes = list(
+            channel.main_tree.get_descendants()
+            .exclude(lft__gte=target.lft, rght__lte=target.rght)
+            .exclude(lft__lt=target.lft, rght__gt=target.rght)
+            .order_by("lft")
+            .values_list("id", flat=True)[:3]
+        )
+        self.assertEqual(len(nodes), 3)
+
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            self.sync_url,
+            [
+                generate_move_event(nodes[0], CONTENTNODE, target.id, "last-child"),
+                generate_move_event(nodes[1], CONTENTNODE, target.id, "last-child"),
+                generate_move_event(nodes[2], CONTENTNODE, target.id, "first-child"),
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            sorted(change["key"] for change in response.data["changes"] if change["mods"] == {"parent": target.id}),
+            sorted(nodes),
+        )
+        self.assertEqual(
+            list(target.get_children().values_list("id", flat=True)),
+            [nodes[2]] + children + [nodes[0], nodes[1]],
+        )
+
+        # The tree fields and tree stats end up as they would be if rebuilt from scratch
+        tree_fields = list(models.ContentNode.objects.filter(tree_id=tree_id).order_by("lft").values_list("id", "lft", "rght", "level"))
+        models.ContentNode.objects.fast_rebuild(tree_id)
+        self.assertEqual(
+            list(models.ContentNode.objects.filter(tree_id=tree_id).order_by("lft").values_list("id", "lft", "rght", "level")),
+            tree_fields,
+        )
+        stats = models.ContentNodeTreeStats.objects.filter(node__tree_id=tree_id).order_by("node_id")
+        tree_stats = list(stats.values_list("node_id", *models.ContentNodeTreeStats.count_fields))
+        models.ContentNodeTreeStats.rebuild(tree_id)
+        self.assertEqual(list(stats.values_list("node_id", *models.ContentNodeTreeStats.count_fields)), tree_stats)
+
     def test_copy_contentnode(self):
         channel = testdata.channel()
         user = testdata.user()
@@ -846,6 +924,41 @@ class SyncTestCase(StudioAPITestCase):
 
         self.assertEqual(new_node.parent_id, channel.main_tree_id)
 
+    def _copy_video_from_other_channel(self, lazy=None):
+        channel = testdata.channel()
+        source_channel = testdata.channel()
+        user = testdata.user()
+        channel.editors.add(user)
+        source_channel.editors.add(user)
+        video = source_channel.main_tree.get_descendants().filter(kind_id=content_kinds.VIDEO).first()
+        new_node_id = uuid.uuid4().hex
+        copy = generate_copy_event(new_node_id, CONTENTNODE, video.id, channel.main_tree_id)
+        if lazy is None:
+            del copy["lazy"]
+        else:
+            copy["lazy"] = lazy
+        self.client.force_authenticate(user=user)
+        response = self.client.post(self.sync_url, [copy], format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return video, models.ContentNode.objects.get(id=new_node_id)
+
+    def test_copy_contentnode_from_other_channel_copies_files(self):
+        video, new_node = self._copy_video_from_other_channel()
+        self.assertIsNone(new_node.content_source_id)
+        self.assertEqual(
+            sorted(new_node.files.values_list("checksum", flat=True)),
+            sorted(video.files.values_list("checksum", flat=True)),
+        )
+
+    def test_copy_contentnode_lazy(self):
+        video, new_node = self._copy_video_from_other_channel(lazy=True)
+        self.assertEqual(new_node.content_source_id, video.id)
+        self.assertFalse(new_node.files.exists())
+        self.assertEqual(
+            sorted(new_node.get_content_owner().files.values_list("checksum", flat=True)),
+            sorted(video.files.values_list("checksum", flat=True)),
+        )
+
     def test_cannot_copy_contentnode__source_permission(self):
         user = testdata.user()
         channel = testdata.channel()
@@ -1492,6 +1605,22 @@ class AnnotationsTest(StudioAPITestCase):
 
         self.assertEqual(serialized.get("resource_count"), 5)
 
+    def test_requested_fields(self):
+        topic_tree_node = testdata.tree()
+        self.channel.main_tree = topic_tree_node
+        self.channel.save()
+        response = self.client.get(
+            reverse("contentnode-detail", kwargs={"pk": topic_tree_node.id})
+            + "?fields=resource_count,title"
+        )
+        serialized = response.data
+
+        self.assertEqual(serialized.get("resource_count"), 5)
+        self.assertEqual(serialized.get("title"), self.channel.name)
+        self.assertEqual(serialized.get("total_count"), 7)
+        for field in ("coach_count", "error_count", "thumbnail_src", "tags", "root_id"):
+            self.assertNotIn(field, serialized)
+
     def test_coach_count(self):
         topic_tree_node = testdata.tree()
         self.channel.main_tree = topic_tree_node
@@ -10,6 +10,8 @@ from le_utils.constants import format_presets
 from contentcuration import models
 from contentcuration.tests import testdata
 from contentcuration.tests.base import StudioAPITestCase
+from contentcuration.viewsets.sync.constants import CREATED
+from contentcuration.viewsets.sync.constants import DELETED
 from contentcuration.viewsets.sync.constants import FILE
 from contentcuration.viewsets.sync.utils import generate_create_event
 from contentcuration.viewsets.sync.utils import generate_delete_event
@@ -109,6 +111,47 @@ class SyncTestCase(StudioAPITestCase):
             models.File.objects.get(id=file.id).preset_id, new_preset,
         )
 
+    def test_update_file_contentnode_tree_stats(self):
+        metadata = self.file_db_metadata
+        del metadata["contentnode_id"]
+        file = models.File.objects.create(file_size=1000, **metadata)
+        root = self.channel.main_tree
+        contentnode = root.get_descendants().exclude(kind_id=content_kinds.TOPIC).first()
+        resource_size = models.ContentNodeTreeStats.objects.get(node=root).resource_size
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            self.sync_url,
+            [generate_update_event(file.id, FILE, {"contentnode": contentnode.id})],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        stats = models.ContentNodeTreeStats.objects.get(node=root)
+        self.assertEqual(stats.resource_size, resource_size + 1000)
+        models.ContentNodeTreeStats.rebuild(root.tree_id)
+        stats.refresh_from_db()
+        self.assertEqual(stats.resource_size, resource_size + 1000)
+
+    def test_update_shared_file(self):
+        new_channel = testdata.channel()
+        new_channel.editors.add(self.user)
+        video = self.channel.main_tree.get_descendants().filter(kind_id=content_kinds.VIDEO).first()
+        video_copy = video.copy_to(new_channel.main_tree, lazy=True)
+        file = video.files.first()
+        new_preset = format_presets.VIDEO_LOW_RES
+
+        self.client.force_authenticate(user=self.user)
+        change = generate_update_event(file.id, FILE, {"preset": new_preset})
+        change["contentnode"] = video_copy.id
+        response = self.client.post(self.sync_url, [change], format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(models.File.objects.get(id=file.id).preset_id, file.preset_id)
+        file_copy = video_copy.files.get(checksum=file.checksum)
+        self.assertEqual(file_copy.preset_id, new_preset)
+        changes = response.data["changes"]
+        self.assertIn(file.id, [c["key"] for c in changes if c["type"] == DELETED])
+        self.assertIn(file_copy.id, [c["key"] for c in changes if c["type"] == CREATED])
+
     def test_update_file_no_channel(self):
         file_metadata = self.file_db_metadata
         contentnode_id = file_metadata.pop("contentnode_id")
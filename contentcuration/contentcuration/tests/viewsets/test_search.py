@@ -0,0 +1,34 @@
+from __future__ import absolute_import
+
+from django.core.urlresolvers import reverse
+
+from contentcuration.tests import testdata
+from contentcuration.tests.base import StudioAPITestCase
+
+
+class KeysetPaginationTestCase(StudioAPITestCase):
+    def setUp(self):
+        super(KeysetPaginationTestCase, self).setUp()
+        self.channel = testdata.channel()
+        self.channel.public = True
+        self.channel.save()
+        self.user = testdata.user()
+        self.client.force_authenticate(user=self.user)
+
+    def test_cursor_pages_match_page_number_pages(self):
+        url = reverse("search-list") + "?channel_list=public&resources=true&page_size=100"
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        expected = [node["id"] for node in response.data["results"]]
+        self.assertGreater(len(expected), 2)
+
+        response = self.client.get(reverse("search-list") + "?channel_list=public&resources=true&page_size=2&cursor=", format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(response.data["previous"])
+        self.assertNotIn("page_number", response.data)
+        self.assertEqual(response.data["count"], len(expected))
+        ids = [node["id"] for node in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"], format="json")
+            ids += [node["id"] for node in response.data["results"]]
+        self.assertEqual(ids, expected)
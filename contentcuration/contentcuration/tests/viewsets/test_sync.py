@@ -0,0 +1,148 @@
+from __future__ import absolute_import
+
+import json
+from datetime import timedelta
+
+from django.core.urlresolvers import reverse
+from django.utils import timezone
+
+from contentcuration import models
+from contentcuration.tests import testdata
+from contentcuration.tests.base import StudioAPITestCase
+from contentcuration.utils.garbage_collect import clean_up_user_change_events
+from contentcuration.views.base import current_user_for_context
+from contentcuration.viewsets.sync.constants import CHANNEL
+from contentcuration.viewsets.sync.constants import DELETED
+from contentcuration.viewsets.sync.constants import UPDATED
+from contentcuration.viewsets.sync.endpoint import plan_changes
+from contentcuration.viewsets.sync.utils import add_event_for_user
+from contentcuration.viewsets.sync.utils import generate_delete_event
+from contentcuration.viewsets.sync.utils import generate_update_event
+
+
+class UserEventsTestCase(StudioAPITestCase):
+    @property
+    def sync_url(self):
+        return reverse("sync")
+
+    def setUp(self):
+        super(UserEventsTestCase, self).setUp()
+        self.user = testdata.user()
+        self.client.force_authenticate(user=self.user)
+
+    def _add_event(self, name):
+        event = generate_update_event("channel_id", CHANNEL, {"name": name})
+        add_event_for_user(self.user.id, event)
+        return event
+
+    def test_sync_without_user_rev_returns_latest_rev(self):
+        self._add_event("old name")
+        response = self.client.post(self.sync_url, [], format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn("changes", response.data)
+        self.assertEqual(response.data["user_rev"], models.UserChangeEvent.objects.get().id)
+
+    def test_sync_returns_events_after_user_rev(self):
+        response = self.client.post(self.sync_url, [], format="json")
+        user_rev = response.data["user_rev"]
+        event1 = self._add_event("name 1")
+        event2 = self._add_event("name 2")
+
+        response = self.client.post(self.sync_url + "?user_rev={}".format(user_rev), [], format="json")
+        self.assertEqual(response.data["changes"], [event1, event2])
+
+        # Events are kept, but are not returned again once the client has seen them
+        user_rev = response.data["user_rev"]
+        response = self.client.post(self.sync_url + "?user_rev={}".format(user_rev), [], format="json")
+        self.assertNotIn("changes", response.data)
+        self.assertEqual(response.data["user_rev"], user_rev)
+        self.assertEqual(models.UserChangeEvent.objects.count(), 2)
+
+    def test_page_user_rev_returns_events_added_after_render(self):
+        self._add_event("old name")
+        user_rev = json.loads(json.loads(current_user_for_context(self.user)))["user_rev"]
+        self.assertEqual(user_rev, models.UserChangeEvent.objects.get().id)
+        event = self._add_event("new name")
+
+        response = self.client.post(self.sync_url + "?user_rev={}".format(user_rev), [], format="json")
+        self.assertEqual(response.data["changes"], [event])
+
+    def test_events_for_other_users_not_returned(self):
+        other_user = testdata.user("other@user.com")
+        add_event_for_user(other_user.id, generate_update_event("channel_id", CHANNEL, {"name": "name"}))
+        response = self.client.post(self.sync_url + "?user_rev=0", [], format="json")
+        self.assertNotIn("changes", response.data)
+
+    def test_clean_up_user_change_events(self):
+        self._add_event("old name")
+        self._add_event("new name")
+        models.UserChangeEvent.objects.filter(event__mods__name="old name").update(created=timezone.now() - timedelta(days=30))
+        clean_up_user_change_events(retention=timedelta(days=14))
+        self.assertEqual([e.event["mods"]["name"] for e in models.UserChangeEvent.objects.all()], ["new name"])
+
+
+class SyncPlanTestCase(StudioAPITestCase):
+    @property
+    def sync_url(self):
+        return reverse("sync")
+
+    def setUp(self):
+        super(SyncPlanTestCase, self).setUp()
+        self.user = testdata.user()
+        self.channel = testdata.channel()
+        self.channel.editors.add(self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_plan_merges_updates(self):
+        plan = plan_changes(
+            [
+                dict(generate_update_event("a", CHANNEL, {"name": "old", "content_defaults": {"author": "a"}}), rev=1),
+                dict(generate_update_event("b", CHANNEL, {"name": "other"}), rev=2),
+                dict(generate_update_event("a", CHANNEL, {"name": "new", "content_defaults.author": "b"}), rev=3),
+            ]
+        )
+        self.assertEqual(len(plan), 1)
+        table_name, change_type, changes = plan[0]
+        self.assertEqual(change_type, UPDATED)
+        self.assertEqual([change["key"] for change in changes], ["a", "b"])
+        self.assertEqual(changes[0]["mods"], {"name": "new", "content_defaults": {"author": "b"}})
+        self.assertEqual(changes[0]["rev"], 3)
+
+    def test_plan_drops_updates_to_deleted_keys(self):
+        plan = plan_changes(
+            [
+                generate_update_event("a", CHANNEL, {"name": "new"}),
+                generate_delete_event("a", CHANNEL),
+            ]
+        )
+        self.assertEqual([(change_type, len(changes)) for _table, change_type, changes in plan], [(DELETED, 1)])
+
+    def test_sync_merged_updates(self):
+        response = self.client.post(
+            self.sync_url,
+            [
+                generate_update_event(self.channel.id, CHANNEL, {"name": "first"}),
+                generate_update_event(self.channel.id, CHANNEL, {"description": "description"}),
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        channel = models.Channel.objects.get(id=self.channel.id)
+        self.assertEqual(channel.name, "first")
+        self.assertEqual(channel.description, "description")
+
+    def test_sync_update_not_editable(self):
+        other_channel = testdata.channel()
+        with self.settings(TEST_ENV=False):
+            response = self.client.post(
+                self.sync_url,
+                [
+                    generate_update_event(self.channel.id, CHANNEL, {"name": "new name"}),
+                    generate_update_event(other_channel.id, CHANNEL, {"name": "new name"}),
+                ],
+                format="json",
+            )
+        self.assertEqual(response.status_code, 207, response.content)
+        self.assertEqual([error["key"] for error in response.data["errors"]], [other_channel.id])
+        self.assertEqual(models.Channel.objects.get(id=self.channel.id).name, "new name")
+        self.assertNotEqual(models.Channel.objects.get(id=other_channel.id).name, "new name")
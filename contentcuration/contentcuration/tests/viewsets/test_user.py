@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from django.core.urlresolvers import reverse
 
+from contentcuration import models
 from contentcuration.tests import testdata
 from contentcuration.tests.base import StudioAPITestCase
 from contentcuration.viewsets.sync.constants import EDITOR_M2M
@@ -91,3 +92,31 @@ class CRUDTestCase(StudioAPITestCase):
             reverse("user-detail", kwargs={"pk": self.user.id})
         )
         self.assertEqual(response.status_code, 405, response.content)
+
+
+class KeysetPaginationTestCase(StudioAPITestCase):
+    def setUp(self):
+        super(KeysetPaginationTestCase, self).setUp()
+        for i, first_name in enumerate(("b", "a", "c", "a", "b")):
+            user = testdata.user(email="user{}@test.com".format(i))
+            user.first_name = first_name
+            user.save()
+        self.user = testdata.user()
+        self.user.is_admin = True
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+
+    def test_pages_follow_ordering(self):
+        users = models.User.objects.values_list("id", "first_name", "last_name")
+        expected = [user_id for user_id, first_name, last_name in sorted(
+            users, key=lambda user: ("{} {}".format(user[1], user[2]), user[0])
+        )]
+        response = self.client.get(reverse("admin-users-list") + "?page_size=2&cursor=", format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(response.data["previous"])
+        ids = [user["id"] for user in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"], format="json")
+            ids += [user["id"] for user in response.data["results"]]
+        self.assertEqual(ids, expected)
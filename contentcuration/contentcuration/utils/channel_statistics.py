@@ -0,0 +1,195 @@
+"""
+Statistics about the content in a tree, like the number of resources of each kind, the languages used and
+the total size of the files, shared by publishing, the staged diff, the channel details and the CSV exports.
+"""
+from django.db.models import Count
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+from le_utils.constants import content_kinds
+from le_utils.constants import format_presets
+from le_utils.constants import roles
+
+from contentcuration.models import AssessmentItem
+from contentcuration.models import ContentNode
+from contentcuration.models import File
+
+
+class ChannelStatistics(object):
+    """
+    Statistics for the descendants of root_node, optionally only counting the published ones.
+
+    Each group of statistics is worked out from a single grouped query over the tree interval of root_node
+    the first time one of them is used, so callers only pay for the numbers they need, and only once.
+    The files and assessment items of nodes that share those of their content_source are counted once.
+    """
+
+    def __init__(self, root_node, published_only=False):
+        self.root_node = root_node
+        self.published_only = published_only
+
+    def _tree_filter(self, prefix=""):
+        tree_filter = {
+            prefix + "tree_id": self.root_node.tree_id,
+            prefix + "lft__gt": self.root_node.lft,
+            prefix + "rght__lt": self.root_node.rght,
+        }
+        if self.published_only:
+            tree_filter[prefix + "published"] = True
+        return tree_filter
+
+    def _content_owners(self):
+        return ContentNode.objects.filter(**self._tree_filter()).annotate(
+            content_owner_id=Coalesce("content_source_id", "id")
+        )
+
+    def _content_filter(self, prefix=""):
+        """
+        Filters files or assessment items to those of the nodes, or of the nodes they share them with.
+        """
+        return {prefix + "contentnode__in": self._content_owners().values("content_owner_id")}
+
+    @cached_property
+    def _node_groups(self):
+        return list(
+            ContentNode.objects.filter(**self._tree_filter())
+            .values("kind_id", "language_id", "language__native_name", "license__license_name", "role_visibility")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+
+    @cached_property
+    def _file_groups(self):
+        return list(
+            File.objects.filter(**self._content_filter())
+            .values("preset_id", "language_id", "contentnode__kind_id")
+            .annotate(count=Count("id"), size=Sum("file_size"))
+            .order_by()
+        )
+
+    def _resource_node_groups(self):
+        return [group for group in self._node_groups if group["kind_id"] != content_kinds.TOPIC]
+
+    def _count_kinds(self, node_groups):
+        kind_counts = {}
+        for group in node_groups:
+            kind_counts[group["kind_id"]] = kind_counts.get(group["kind_id"], 0) + group["count"]
+        return [{"kind_id": kind_id, "count": count} for kind_id, count in sorted(kind_counts.items())]
+
+    @property
+    def node_count(self):
+        return sum(group["count"] for group in self._node_groups)
+
+    @property
+    def resource_count(self):
+        return sum(group["count"] for group in self._resource_node_groups())
+
+    @property
+    def kind_counts(self):
+        """
+        The number of nodes of each kind, including topics, as a list of {"kind_id", "count"} ordered by kind.
+        """
+        return self._count_kinds(self._node_groups)
+
+    @property
+    def resource_kind_counts(self):
+        return self._count_kinds(self._resource_node_groups())
+
+    def get_kind_count(self, kind_id):
+        return sum(group["count"] for group in self._node_groups if group["kind_id"] == kind_id)
+
+    @property
+    def coach_content_count(self):
+        return sum(group["count"] for group in self._resource_node_groups() if group["role_visibility"] == roles.COACH)
+
+    @property
+    def languages(self):
+        """
+        The ids of the languages set on the nodes.
+        """
+        return set(group["language_id"] for group in self._node_groups if group["language_id"])
+
+    @property
+    def language_names(self):
+        return set(group["language__native_name"] for group in self._node_groups if group["language__native_name"])
+
+    @property
+    def licenses(self):
+        """
+        The names of the licenses used by the resources.
+        """
+        return set(
+            group["license__license_name"] for group in self._resource_node_groups() if group["license__license_name"]
+        )
+
+    @property
+    def file_languages(self):
+        """
+        The ids of the languages set on the files of the nodes.
+        """
+        return set(group["language_id"] for group in self._file_groups if group["language_id"])
+
+    @property
+    def subtitle_languages(self):
+        """
+        The ids of the languages of the subtitles of the resources.
+        """
+        return set(
+            group["language_id"] for group in self._file_groups
+            if group["language_id"] and group["preset_id"] == format_presets.VIDEO_SUBTITLE
+            and group["contentnode__kind_id"] != content_kinds.TOPIC
+        )
+
+    @property
+    def subtitle_count(self):
+        return sum(group["count"] for group in self._file_groups if group["preset_id"] == format_presets.VIDEO_SUBTITLE)
+
+    @property
+    def file_size(self):
+        """
+        The total size of the files of the nodes, counting files that are used more than once each time they are used.
+        """
+        return sum(group["size"] or 0 for group in self._file_groups)
+
+    @cached_property
+    def size(self):
+        """
+        The total size of the distinct files of the nodes.
+        """
+        return File.objects.filter(**self._content_filter()).values("checksum", "file_size").distinct() \
+            .aggregate(size=Sum("file_size"))["size"] or 0
+
+    @cached_property
+    def resource_size(self):
+        """
+        The total size of the distinct files of the resources.
+        """
+        return File.objects.filter(**self._content_filter()) \
+            .exclude(contentnode__kind_id=content_kinds.TOPIC) \
+            .values("checksum", "file_size").distinct() \
+            .aggregate(size=Sum("file_size"))["size"] or 0
+
+    @cached_property
+    def node_file_sizes(self):
+        """
+        The total size of the distinct files of each node, by node id.
+        """
+        owner_file_sizes = {}
+        node_files = File.objects.filter(**self._content_filter()) \
+            .values_list("contentnode_id", "checksum", "file_size").distinct()
+        for contentnode_id, _checksum, file_size in node_files:
+            owner_file_sizes[contentnode_id] = owner_file_sizes.get(contentnode_id, 0) + (file_size or 0)
+        return {
+            node_id: owner_file_sizes[owner_id]
+            for node_id, owner_id in self._content_owners().values_list("id", "content_owner_id")
+            if owner_id in owner_file_sizes
+        }
+
+    @cached_property
+    def assessment_count(self):
+        return AssessmentItem.objects.filter(**self._content_filter()).count()
+
+    @cached_property
+    def assessment_file_size(self):
+        return File.objects.filter(**self._content_filter("assessment_item__")) \
+            .aggregate(size=Sum("file_size"))["size"] or 0
@@ -22,6 +22,7 @@ from le_utils.constants import exercises
 
 from contentcuration.models import Channel
 from contentcuration.models import generate_storage_url
+from contentcuration.utils.channel_statistics import ChannelStatistics
 
 if sys.version_info.major == 2:
     reload(sys)
@@ -46,14 +47,16 @@ def write_channel_csv_file(channel, force=False, site=None, show_progress=False)
 
             nodes = channel.main_tree.get_descendants()\
                 .exclude(kind_id=content_kinds.TOPIC)\
-                .select_related('license', 'language', 'parent')\
-                .prefetch_related('files', 'assessment_items', 'tags')
+                .select_related('license', 'language', 'parent', 'content_source')\
+                .prefetch_related('files', 'assessment_items', 'content_source__assessment_items', 'tags')
             if show_progress:
                 bar = progressbar.ProgressBar(max_value=nodes.count())
 
+            # Get the file sizes of all the nodes at once, rather than with a query for each node
+            node_file_sizes = ChannelStatistics(channel.main_tree).node_file_sizes
             index = 0
             for node in nodes:
-                _write_content_csv(writer, node, site)
+                _write_content_csv(writer, node, site, file_size=node_file_sizes.get(node.id, 0))
                 if show_progress:
                     index += 1
                     bar.update(index)
@@ -67,18 +70,18 @@ def _csv_file_exists(csv_path, channel):
     return os.path.isfile(csv_path) and _creation_date(csv_path) >= last_modified
 
 
-def _write_content_csv(writer, node, site):
+def _write_content_csv(writer, node, site, file_size=None):
     path = "/".join(node.get_ancestors().order_by("level").values_list("title", flat=True))
     url = "/".join([site, "channels", node.get_channel().pk, "view", node.parent.node_id[:7], node.node_id[:7]])
     language = node.language.readable_name if node.language else "Default to topic language"
     license = node.license.license_name if node.license else "No license"
-    file_size = _format_size(node.files.values('checksum', 'file_size')
-                             .distinct()
-                             .aggregate(size=Sum('file_size'))['size'] or 0)
+    if file_size is None:
+        file_size = node.get_content_owner().files.values('checksum', 'file_size').distinct().aggregate(size=Sum('file_size'))['size'] or 0
+    file_size = _format_size(file_size)
     tags = ", ".join(node.tags.values_list('tag_name', flat=True))
     questions = ""
     if node.kind_id == content_kinds.EXERCISE:
-        questions = " ".join([_format_question(q) for q in node.assessment_items.all().order_by("order")])
+        questions = " ".join([_format_question(q) for q in node.get_content_owner().assessment_items.all().order_by("order")])
     return writer.writerow([path, node.title, node.kind_id.capitalize(), node.description, url,
                             node.author, language, license, node.license_description, node.copyright_holder, file_size, tags, questions])
 
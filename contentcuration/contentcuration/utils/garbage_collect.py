@@ -3,10 +3,12 @@
 Studio garbage collection utilities. Clean up all these old, unused records!
 """
 from django.conf import settings
+from django.utils import timezone
 from le_utils.constants import content_kinds
 
 from contentcuration.models import ContentNode
 from contentcuration.models import File
+from contentcuration.models import UserChangeEvent
 
 
 def get_deleted_chefs_root():
@@ -48,6 +50,11 @@ def clean_up_contentnodes(delete_older_than=settings.ORPHAN_DATE_CLEAN_UP_THRESH
     )
     tree_id = garbage_node.tree_id
 
+    # nodes that are kept may share the files of the nodes to delete, so give them their own first
+    ContentNode.objects.release_content_references(
+        ContentNode.objects.get_queryset_descendants(nodes_to_clean_up, include_self=True)
+    )
+
     # delete all files first
     clean_up_files(nodes_to_clean_up)
 
@@ -55,7 +62,7 @@ def clean_up_contentnodes(delete_older_than=settings.ORPHAN_DATE_CLEAN_UP_THRESH
     nodes_to_clean_up.delete()
     # tell MPTT to rebuild our tree values, so descendant counts
     # will be right again.
-    ContentNode._tree_manager.partial_rebuild(tree_id)
+    ContentNode.objects.fast_rebuild(tree_id)
 
 
 def clean_up_files(contentnode_ids):
@@ -82,3 +89,10 @@ def clean_up_files(contentnode_ids):
     # finally, remove the entries from object storage
     # use _raw_delete for much fast file deletions
     files._raw_delete(files.db)
+
+
+def clean_up_user_change_events(retention=settings.USER_CHANGE_EVENTS_RETENTION):
+    """
+    Clean up the user change events that were added longer ago than `retention`.
+    """
+    UserChangeEvent.objects.filter(created__lt=timezone.now() - retention).delete()
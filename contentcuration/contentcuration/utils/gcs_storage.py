@@ -1,7 +1,7 @@
 import logging
+import shutil
 import tempfile
 from gzip import GzipFile
-from io import BytesIO
 
 import backoff
 from django.core.files import File
@@ -16,8 +16,17 @@ CONTENT_DATABASES_MAX_AGE = 5  # seconds
 
 MAX_RETRY_TIME = 60  # seconds
 
+# Database files are compressed and uploaded in chunks of this size, so they are never held in memory
+# all at once. Resumable uploads require the chunk size to be a multiple of 256KB.
+DATABASE_CHUNK_SIZE = 8 * 1024 * 1024  # bytes
+
+GZIP_MAGIC_NUMBER = b"\x1f\x8b"
+
 
 class GoogleCloudStorage(Storage):
+    # Database files are stored gzipped, see save()
+    gzip_database_files = True
+
     def __init__(self, client=None):
         from django.conf import settings
 
@@ -88,15 +97,19 @@ class GoogleCloudStorage(Storage):
             blob.cache_control = "private, max-age={}, no-transform".format(
                 CONTENT_DATABASES_MAX_AGE
             )
+            blob.chunk_size = DATABASE_CHUNK_SIZE
 
             # Compress the database file so that users can save bandwith and download faster.
-            buffer = BytesIO()
-            compressed = GzipFile(fileobj=buffer, mode="w")
-            compressed.write(fobj.read())
-            compressed.close()
+            # The file is compressed into a temporary file a chunk at a time to keep memory use bounded.
+            # Files that have already been gzipped, like the ones saved while publishing, are uploaded as they are.
+            fobj.seek(0)
+            if not self._is_gzipped(fobj):
+                buffer = tempfile.TemporaryFile()
+                with GzipFile(fileobj=buffer, mode="wb") as compressed:
+                    shutil.copyfileobj(fobj, compressed, DATABASE_CHUNK_SIZE)
+                fobj = buffer
 
             blob.content_encoding = "gzip"
-            fobj = buffer
 
         # determine the current file's mimetype based on the name
         # import determine_content_type lazily in here, so we don't get into an infinite loop with circular dependencies
@@ -115,7 +128,7 @@ class GoogleCloudStorage(Storage):
             fobj, content_type=content_type,
         )
 
-        # Close StringIO object and discard memory buffer if created
+        # Close and discard the temporary compressed file if created
         if buffer:
             buffer.close()
 
@@ -170,6 +183,16 @@ class GoogleCloudStorage(Storage):
     def is_database_file(filename):
         return filename.endswith(".sqlite3")
 
+    @staticmethod
+    def _is_gzipped(fobj):
+        """
+        Return True if the file starts with the gzip magic number, leaving the file at its current location.
+        """
+        current_location = fobj.tell()
+        magic_number = fobj.read(len(GZIP_MAGIC_NUMBER))
+        fobj.seek(current_location)
+        return magic_number == GZIP_MAGIC_NUMBER
+
     @staticmethod
     def _is_file_empty(fobj):
         """
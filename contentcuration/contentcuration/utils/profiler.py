@@ -0,0 +1,148 @@
+"""
+A lightweight profiler for finding where long running operations, like publishing a channel, spend their time.
+
+The work is split into named phases, and each phase records its wall time, the number of database queries
+it made and the number of bytes it moved, along with any other counts the code records for it. A profiler
+is activated for the current thread with `profile`, so that code deep inside the operation can record
+phases without having the profiler passed down to it:
+
+    with profile() as profiler:
+        with profile_phase("thumbnails"):
+            encoding = encode_thumbnail()
+            record_bytes(len(encoding))
+    profiler.report()
+
+Outside of `profile`, `profile_phase`, `record_bytes` and `record_count` do nothing.
+"""
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
+from kolibri_content.router import get_active_content_database
+
+THREAD_LOCAL = threading.local()
+
+
+class QueryCounter(collections.deque):
+    """
+    Stands in for the queries_log of a connection, to count the queries it runs without keeping them in memory.
+    """
+
+    def __init__(self):
+        super(QueryCounter, self).__init__(maxlen=0)
+        self.count = 0
+
+    def append(self, query):
+        self.count += 1
+
+
+class Profiler(object):
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self._phase_stack = []
+        self._connections = {}
+
+    def _get_query_count(self):
+        """
+        Returns the number of queries made on the default and active content databases since they were first seen.
+        """
+        for alias in (DEFAULT_DB_ALIAS, get_active_content_database(return_none_if_not_set=True)):
+            if alias and alias not in self._connections:
+                connection = connections[alias]
+                self._connections[alias] = (connection, connection.force_debug_cursor, connection.queries_log)
+                # Queries are only logged by debug cursors
+                connection.force_debug_cursor = True
+                connection.queries_log = QueryCounter()
+        return sum(connection.queries_log.count for connection, _, _ in self._connections.values())
+
+    def _get_phase(self, name):
+        return self.phases.setdefault(name, {'time': 0.0, 'queries': 0, 'bytes': 0, 'counts': collections.OrderedDict()})
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Records the time, queries and bytes of the block as the phase `name`. A phase can be entered more than once,
+        in which case its totals are added up, and phases can be nested inside one another.
+        """
+        start_time = time.time()
+        start_queries = self._get_query_count()
+        self._phase_stack.append(name)
+        try:
+            yield
+        finally:
+            self._phase_stack.pop()
+            phase = self._get_phase(name)
+            phase['time'] += time.time() - start_time
+            phase['queries'] += self._get_query_count() - start_queries
+
+    def record_bytes(self, size):
+        if self._phase_stack:
+            self._get_phase(self._phase_stack[-1])['bytes'] += size
+
+    def record_count(self, name, count):
+        if self._phase_stack:
+            counts = self._get_phase(self._phase_stack[-1])['counts']
+            counts[name] = counts.get(name, 0) + count
+
+    def stop(self):
+        for connection, force_debug_cursor, queries_log in self._connections.values():
+            connection.force_debug_cursor = force_debug_cursor
+            connection.queries_log = queries_log
+        self._connections = {}
+
+    def report(self):
+        """
+        Returns the phases in the order they were finished, with their times rounded to milliseconds.
+        Phases that recorded other counts include them under 'counts'.
+        """
+        report = []
+        for name, phase in self.phases.items():
+            phase_report = {'phase': name, 'time': round(phase['time'], 3), 'queries': phase['queries'], 'bytes': phase['bytes']}
+            if phase['counts']:
+                phase_report['counts'] = dict(phase['counts'])
+            report.append(phase_report)
+        return report
+
+
+def get_active_profiler():
+    return getattr(THREAD_LOCAL, 'ACTIVE_PROFILER', None)
+
+
+@contextmanager
+def profile():
+    """
+    Activates a new profiler for the current thread.
+    """
+    profiler = Profiler()
+    previous_profiler = get_active_profiler()
+    THREAD_LOCAL.ACTIVE_PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        THREAD_LOCAL.ACTIVE_PROFILER = previous_profiler
+
+
+@contextmanager
+def profile_phase(name):
+    profiler = get_active_profiler()
+    if profiler:
+        with profiler.phase(name):
+            yield
+    else:
+        yield
+
+
+def record_bytes(size):
+    profiler = get_active_profiler()
+    if profiler:
+        profiler.record_bytes(size)
+
+
+def record_count(name, count):
+    profiler = get_active_profiler()
+    if profiler:
+        profiler.record_count(name, count)
@@ -1,30 +1,35 @@
 from __future__ import division
 
 import collections
+import hashlib
 import itertools
 import json
 import logging as logmodule
 import math
 import os
 import re
+import shutil
 import tempfile
+import threading
+import time
 import traceback
 import uuid
 import zipfile
 from builtins import str
-from itertools import chain
+from gzip import GzipFile
+from multiprocessing.dummy import Pool
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files import File
 from django.core.files.storage import default_storage as storage
 from django.core.management import call_command
 from django.db import transaction
-from django.db.models import Count
 from django.db.models import Q
-from django.db.models import Sum
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
+from django_bulk_update.helper import bulk_update
 from kolibri_content import models as kolibrimodels
 from kolibri_content.router import get_active_content_database
 from kolibri_content.router import using_content_database
@@ -34,14 +39,19 @@ from le_utils.constants import file_formats
 from le_utils.constants import format_presets
 from le_utils.constants import roles
 from past.builtins import basestring
-from past.utils import old_div
 
 from contentcuration import models as ccmodels
+from contentcuration.api import write_raw_content_to_storage
 from contentcuration.statistics import record_publish_stats
+from contentcuration.utils.channel_statistics import ChannelStatistics
 from contentcuration.utils.files import create_thumbnail_from_base64
 from contentcuration.utils.files import get_thumbnail_encoding
 from contentcuration.utils.parser import extract_value
 from contentcuration.utils.parser import load_json_string
+from contentcuration.utils.profiler import profile
+from contentcuration.utils.profiler import profile_phase
+from contentcuration.utils.profiler import record_bytes
+from contentcuration.utils.profiler import record_count
 from contentcuration.utils.sentry import report_exception
 
 
@@ -51,6 +61,16 @@ logging = logmodule.getLogger(__name__)
 PERSEUS_IMG_DIR = exercises.IMG_PLACEHOLDER + "/images"
 THUMBNAIL_DIMENSION = 128
 MIN_SCHEMA_VERSION = "1"
+# Default maximum number of parameters allowed in a single SQLite query
+SQLITE_MAX_VARIABLE_NUMBER = 999
+# Number of threads used to render exercise zips and fetch their images
+PERSEUS_POOL_SIZE = 8
+# Number of threads used to download and resize thumbnails
+THUMBNAIL_POOL_SIZE = 8
+# Increment this when the way exercise zips are rendered changes, so that cached zips are not reused
+PERSEUS_ZIP_CACHE_VERSION = 1
+# Size of the chunks the export database is compressed in, so that it is never read into memory all at once
+EXPORT_DATABASE_CHUNK_SIZE = 8 * 1024 * 1024
 
 
 def send_emails(channel, user_id, version_notes=''):
@@ -69,27 +89,51 @@ def send_emails(channel, user_id, version_notes=''):
             user.email_user(subject, message, settings.DEFAULT_FROM_EMAIL, )
 
 
-def create_content_database(channel, force, user_id, force_exercises, task_object=None):
+def create_content_database(channel, force, user_id, force_exercises, task_object=None, incremental=False, timings=None):
+    """
+    Builds the export database for channel in a temporary file and uploads it to storage.
+
+    The number of seconds spent building, compressing and uploading the database are recorded
+    in timings, and are reported in the task progress if there is a task_object.
+    """
+    timings = {} if timings is None else timings
+    start = time.time()
     # increment the channel version
     if not force:
         raise_if_nodes_are_all_unchanged(channel)
     fh, tempdb = tempfile.mkstemp(suffix=".sqlite3")
+    with profile_phase('db_prep'):
+        # Only publish incrementally if there is a previously published database to start from
+        incremental = incremental and download_export_database(channel.pk, tempdb)
+        if incremental:
+            record_bytes(os.path.getsize(tempdb))
 
     with using_content_database(tempdb):
         channel.main_tree.publishing = True
         channel.main_tree.save()
 
-        prepare_export_database(tempdb)
+        with profile_phase('db_prep'):
+            if incremental:
+                prepare_incremental_export_database(tempdb)
+            else:
+                prepare_export_database(tempdb)
         if task_object:
             task_object.update_state(state='STARTED', meta={'progress': 10.0})
-        map_channel_to_kolibri_channel(channel)
-        map_content_nodes(channel.main_tree, channel.language, channel.id, channel.name, user_id=user_id,
-                          force_exercises=force_exercises, task_object=task_object, starting_percent=10.0)
+        with profile_phase('node_mapping'):
+            map_channel_to_kolibri_channel(channel)
+            map_content_nodes(channel.main_tree, channel.language, channel.id, channel.name, user_id=user_id,
+                              force_exercises=force_exercises, task_object=task_object, starting_percent=10.0,
+                              incremental=incremental)
         # It should be at this percent already, but just in case.
         if task_object:
             task_object.update_state(state='STARTED', meta={'progress': 90.0})
-        map_prerequisites(channel.main_tree)
-        save_export_database(channel.pk)
+        with profile_phase('prerequisites'):
+            map_prerequisites(channel.main_tree)
+        timings['build'] = time.time() - start
+        with profile_phase('save'):
+            save_export_database(channel.pk, timings=timings)
+        if task_object:
+            task_object.update_state(state='STARTED', meta={'progress': 90.0, 'timings': timings})
 
     return tempdb
 
@@ -111,56 +155,257 @@ def assign_license_to_contentcuration_nodes(channel, license):
     channel.main_tree.get_family().update(license_id=license.pk)
 
 
-def map_content_nodes(root_node, default_language, channel_id, channel_name, user_id=None,
-                      force_exercises=False, task_object=None, starting_percent=10.0):
-
-    # make sure we process nodes higher up in the tree first, or else when we
-    # make mappings the parent nodes might not be there
+def map_content_nodes(root_node, default_language, channel_id, channel_name, user_id=None,  # noqa C901
+                      force_exercises=False, task_object=None, starting_percent=10.0, incremental=False):
+    """
+    Maps the tree under root_node into the active export database.
 
-    node_queue = collections.deque()
-    node_queue.append(root_node)
+    The whole tree is read once in lft order and the Kolibri rows are written with
+    bulk_create, so the number of queries made does not grow with the number of nodes.
 
+    If incremental is set, the active export database is expected to hold the previously
+    published tree, and only the nodes that have changed since then are rewritten.
+    """
     task_percent_total = 80.0
-    total_nodes = root_node.get_descendant_count() + 1  # make sure we include root_node
-    percent_per_node = old_div(task_percent_total, total_nodes)
-
-    current_node_percent = 0.0
 
-    def queue_get_return_none_when_empty():
-        try:
-            return node_queue.popleft()
-        except IndexError:
-            return None
+    def report_progress(fraction):
+        if task_object:
+            progress_percent = starting_percent + min(task_percent_total, task_percent_total * fraction)
+            task_object.update_state(state='STARTED', meta={'progress': progress_percent})
 
     with transaction.atomic():
-        with ccmodels.ContentNode.objects.delay_mptt_updates(), kolibrimodels.ContentNode.objects.delay_mptt_updates():
-            for node in iter(queue_get_return_none_when_empty, None):
-                logging.debug("Mapping node with id {id}".format(
-                    id=node.pk))
-
-                if node.get_descendants(include_self=True).exclude(kind_id=content_kinds.TOPIC).exists() and node.complete:
-                    children = (node.children.all())
-                    node_queue.extend(children)
-
-                    kolibrinode = create_bare_contentnode(node, default_language, channel_id, channel_name)
-
-                    if node.kind.kind == content_kinds.EXERCISE:
-                        exercise_data = process_assessment_metadata(node, kolibrinode)
-                        if force_exercises or node.changed or not \
-                                node.files.filter(preset_id=format_presets.EXERCISE).exists():
-                            create_perseus_exercise(node, kolibrinode, exercise_data, user_id=user_id)
-                    elif node.kind.kind == content_kinds.SLIDESHOW:
-                        create_slideshow_manifest(node, kolibrinode, user_id=user_id)
-                    create_associated_file_objects(kolibrinode, node)
-                    map_tags_to_node(kolibrinode, node)
-
-                # if we have a large amount of nodes, like, say, 44000, we don't want to update the percent
-                # of the task every node due to the latency involved, so only update in 1 percent increments.
-                new_node_percent = current_node_percent + percent_per_node
-                if task_object and new_node_percent > math.ceil(current_node_percent):
-                    progress_percent = min(task_percent_total + starting_percent, starting_percent + new_node_percent)
-                    task_object.update_state(state='STARTED', meta={'progress': progress_percent})
-                current_node_percent = new_node_percent
+        with ccmodels.ContentNode.objects.delay_mptt_updates():
+            ccnodes = get_publishable_nodes(root_node)
+            tree_filter = {
+                'contentnode__tree_id': root_node.tree_id,
+                'contentnode__lft__gte': root_node.lft,
+                'contentnode__lft__lte': root_node.rght,
+            }
+
+            dimensions = ExportDimensionCache(ccnodes, default_language, tree_filter)
+            dimensions.create_languages()
+
+            node_ids = {ccnode.id: ccnode.node_id for ccnode in ccnodes}
+            kolibri_licenses = {}
+            kolibrinodes = []
+            for ccnode in ccnodes:
+                kolibrinodes.append(kolibrimodels.ContentNode(
+                    parent_id=node_ids[ccnode.parent_id] if ccnode.id != root_node.id else None,
+                    available=True,  # get_publishable_nodes only returns nodes with non-topic descendants
+                    **get_kolibri_contentnode_fields(
+                        ccnode,
+                        channel_id,
+                        channel_name,
+                        get_kolibri_license(ccnode, kolibri_licenses),
+                        dimensions.get_language(ccnode),
+                    )
+                ))
+            set_kolibri_tree_fields(kolibrinodes)
+            if incremental:
+                ccnodes, kolibrinodes = update_published_kolibri_nodes(ccnodes, kolibrinodes, force_exercises=force_exercises)
+            else:
+                kolibrimodels.ContentNode.objects.bulk_create(kolibrinodes)
+                logging.debug("Created {} Kolibri ContentNodes".format(len(kolibrinodes)))
+            report_progress(0.1)
+
+            # Generate the files that are derived from node content, exercises and slideshows.
+            # Nodes that share the content of the node they were imported from read it from that node.
+            exercise_content_ids = {
+                n.id: n.content_source_id or n.id for n in ccnodes if n.kind_id == content_kinds.EXERCISE
+            }
+            assessment_items_by_node = collections.defaultdict(list)
+            assessment_items = ccmodels.AssessmentItem.objects.filter(contentnode_id__in=set(exercise_content_ids.values()))\
+                .prefetch_related('files').order_by('order')
+            for assessment_item in assessment_items:
+                assessment_items_by_node[assessment_item.contentnode_id].append(assessment_item)
+            nodes_with_exercise_file = set(
+                ccmodels.File.objects.filter(
+                    preset_id=format_presets.EXERCISE, contentnode_id__in=set(exercise_content_ids.values())
+                ).values_list('contentnode_id', flat=True)
+            )
+
+            assessment_metadata = []
+            exercises_to_render = []
+            slideshows = []
+            for ccnode, kolibrinode in zip(ccnodes, kolibrinodes):
+                if ccnode.kind_id == content_kinds.EXERCISE:
+                    items = assessment_items_by_node[exercise_content_ids[ccnode.id]]
+                    exercise_data, metadata = get_assessment_metadata(ccnode, kolibrinode, items)
+                    assessment_metadata.append(metadata)
+                    if force_exercises or ccnode.changed or exercise_content_ids[ccnode.id] not in nodes_with_exercise_file:
+                        exercises_to_render.append((ccnode, exercise_data, items))
+                elif ccnode.kind_id == content_kinds.SLIDESHOW:
+                    slideshows.append((ccnode, kolibrinode))
+            kolibrimodels.AssessmentMetaData.objects.bulk_create(assessment_metadata)
+
+            # Exercise zips and slideshow manifests are written to the nodes, so only those nodes
+            # are given their own copies of the content they share before they are generated
+            materialize_nodes([ccnode for ccnode, _data, _items in exercises_to_render] + [ccnode for ccnode, _kolibrinode in slideshows])
+            for ccnode, kolibrinode in slideshows:
+                create_slideshow_manifest(ccnode, kolibrinode, user_id=user_id)
+
+            def report_exercise_progress(index, total):
+                # Generating exercise zips is the slowest part of the mapping, but we don't want
+                # to update the task progress for every node, so only update in 1 percent increments.
+                if math.floor(100.0 * index / total) != math.floor(100.0 * (index + 1) / total):
+                    report_progress(0.1 + 0.7 * (index + 1) / total)
+
+            with profile_phase('exercise_zips'):
+                create_perseus_exercises(exercises_to_render, user_id=user_id, progress_callback=report_exercise_progress)
+
+            create_associated_file_objects(ccnodes, kolibrinodes, tree_filter)
+            report_progress(0.9)
+            dimensions.map_tags_to_nodes(kolibrinodes)
+            report_progress(1.0)
+
+
+def materialize_nodes(ccnodes):
+    """
+    Gives the nodes out of ccnodes that share the files and assessment items of another node their own.
+    """
+    shared_nodes = [ccnode for ccnode in ccnodes if ccnode.content_source_id]
+    ccmodels.ContentNode.objects.materialize_content([ccnode.id for ccnode in shared_nodes])
+    for ccnode in shared_nodes:
+        ccnode.content_source_id = None
+
+
+def get_exported_files(ccnodes, tree_filter):
+    """
+    Returns the files of the exported nodes as (ccnode, file) pairs, from a single query.
+    The files of nodes that share those of another node are read from that node.
+    """
+    nodes_by_content_id = collections.defaultdict(list)
+    for ccnode in ccnodes:
+        nodes_by_content_id[ccnode.content_source_id or ccnode.id].append(ccnode)
+    shared_ids = [ccnode.content_source_id for ccnode in ccnodes if ccnode.content_source_id]
+    return [
+        (ccnode, ccfilemodel) for ccfilemodel in ccmodels.File.objects.filter(Q(**tree_filter) | Q(contentnode_id__in=shared_ids))
+        .exclude(Q(preset_id=format_presets.EXERCISE_IMAGE) | Q(preset_id=format_presets.EXERCISE_GRAPHIE))
+        .select_related('preset', 'file_format', 'language', 'uploaded_by')
+        for ccnode in nodes_by_content_id[ccfilemodel.contentnode_id]
+    ]
+
+
+def get_publishable_nodes(root_node):
+    """
+    Reads the tree under root_node in a single query and returns the nodes to export, in lft order.
+
+    A node is exported if it has a non-topic node in its subtree (including itself), and if it and all
+    of its ancestors are complete. Both are worked out from the lft ordering in memory.
+    """
+    nodes = list(
+        root_node.get_descendants(include_self=True)
+        .select_related('license', 'language')
+        .order_by('lft')
+    )
+
+    # Walk backwards through the tree so that every node is visited after all of its descendants
+    available = set()
+    for node in reversed(nodes):
+        if node.kind_id != content_kinds.TOPIC or node.id in available:
+            available.add(node.id)
+            available.add(node.parent_id)
+
+    publishable_ids = set()
+    publishable = []
+    for node in nodes:
+        if node.id in available and node.complete and (node.id == root_node.id or node.parent_id in publishable_ids):
+            publishable_ids.add(node.id)
+            publishable.append(node)
+    return publishable
+
+
+def set_kolibri_tree_fields(kolibrinodes):
+    """
+    Sets the MPTT fields on unsaved Kolibri nodes so they can be bulk created.
+    Nodes must be passed in depth first order, with every parent before its children.
+    """
+    if not kolibrinodes:
+        return
+    opts = kolibrimodels.ContentNode._mptt_meta
+    # Keep the tree id of a previously published tree, if there is one
+    tree_id = kolibrimodels.ContentNode.objects.filter(pk=kolibrinodes[0].id).values_list(opts.tree_id_attr, flat=True).first() \
+        or kolibrimodels.ContentNode.objects._get_next_tree_id()
+    cursor = 1
+    stack = []
+    for kolibrinode in kolibrinodes:
+        while stack and stack[-1].id != kolibrinode.parent_id:
+            setattr(stack.pop(), opts.right_attr, cursor)
+            cursor += 1
+        setattr(kolibrinode, opts.tree_id_attr, tree_id)
+        setattr(kolibrinode, opts.level_attr, len(stack))
+        setattr(kolibrinode, opts.left_attr, cursor)
+        cursor += 1
+        stack.append(kolibrinode)
+    while stack:
+        setattr(stack.pop(), opts.right_attr, cursor)
+        cursor += 1
+
+
+def update_published_kolibri_nodes(ccnodes, kolibrinodes, force_exercises=False):
+    """
+    Brings the nodes of a previously published export database up to date with the tree
+    for an incremental publish.
+
+    New nodes are created and nodes that are no longer published are deleted. Nodes that have
+    not changed keep their rows, and only have their position in the tree updated if they have
+    moved. Changed nodes have their rows updated and their files, tags and assessment metadata
+    deleted. The new and changed nodes are returned so that those can be recreated.
+    """
+    opts = kolibrimodels.ContentNode._mptt_meta
+    tree_fields = ('parent', opts.tree_id_attr, opts.left_attr, opts.right_attr, opts.level_attr)
+    published = {
+        n['id']: n for n in kolibrimodels.ContentNode.objects.values('id', 'parent_id', 'lang_id', *tree_fields[1:])
+    }
+
+    new_kolibrinodes = []
+    changed_kolibrinodes = []
+    moved_kolibrinodes = []
+    ccnodes_to_map = []
+    kolibrinodes_to_map = []
+    for ccnode, kolibrinode in zip(ccnodes, kolibrinodes):
+        published_node = published.pop(kolibrinode.id, None)
+        if published_node is None:
+            new_kolibrinodes.append(kolibrinode)
+        elif ccnode.changed \
+                or ccnode.parent_id is None \
+                or (force_exercises and ccnode.kind_id == content_kinds.EXERCISE) \
+                or published_node['lang_id'] != kolibrinode.lang_id:
+            changed_kolibrinodes.append(kolibrinode)
+        else:
+            if published_node['parent_id'] != kolibrinode.parent_id or \
+                    any(published_node[field] != getattr(kolibrinode, field) for field in tree_fields[1:]):
+                moved_kolibrinodes.append(kolibrinode)
+            continue
+        ccnodes_to_map.append(ccnode)
+        kolibrinodes_to_map.append(kolibrinode)
+
+    kolibrimodels.ContentNode.objects.bulk_create(new_kolibrinodes)
+    # Sync every row that stays in the tree before deleting anything, so that deletes
+    # only cascade to nodes that are no longer published.
+    # Each updated field takes two query parameters per row
+    bulk_update(changed_kolibrinodes, using=get_active_content_database(),
+                batch_size=SQLITE_MAX_VARIABLE_NUMBER // (2 * len(kolibrimodels.ContentNode._meta.concrete_fields) + 1))
+    bulk_update(moved_kolibrinodes, update_fields=tree_fields, using=get_active_content_database(),
+                batch_size=SQLITE_MAX_VARIABLE_NUMBER // (2 * len(tree_fields) + 1))
+    delete_kolibri_node_rows(kolibrimodels.ContentNode, 'pk__in', list(published))
+    changed_ids = [kolibrinode.id for kolibrinode in changed_kolibrinodes]
+    delete_kolibri_node_rows(kolibrimodels.File, 'contentnode_id__in', changed_ids)
+    delete_kolibri_node_rows(kolibrimodels.AssessmentMetaData, 'contentnode_id__in', changed_ids)
+    delete_kolibri_node_rows(kolibrimodels.ContentNode.tags.through, 'contentnode_id__in', changed_ids)
+    kolibrimodels.LocalFile.objects.delete_orphan_file_objects()
+    kolibrimodels.ContentTag.objects.filter(tagged_content__isnull=True).delete()
+
+    logging.info("Incremental publish created {} nodes, updated {}, moved {} and deleted {}".format(
+        len(new_kolibrinodes), len(changed_kolibrinodes), len(moved_kolibrinodes), len(published)))
+
+    return ccnodes_to_map, kolibrinodes_to_map
+
+
+def delete_kolibri_node_rows(model, lookup, node_ids):
+    # Delete in chunks to keep the number of query parameters under the SQLite limit
+    for i in range(0, len(node_ids), SQLITE_MAX_VARIABLE_NUMBER):
+        model.objects.filter(**{lookup: node_ids[i:i + SQLITE_MAX_VARIABLE_NUMBER]}).delete()
 
 
 def create_slideshow_manifest(ccnode, kolibrinode, user_id=None):
@@ -193,79 +438,203 @@ def create_slideshow_manifest(ccnode, kolibrinode, user_id=None):
         temp_manifest.close()
 
 
-def create_bare_contentnode(ccnode, default_language, channel_id, channel_name):
-    logging.debug("Creating a Kolibri contentnode for instance id {}".format(
-        ccnode.node_id))
-
-    kolibri_license = None
-    if ccnode.license is not None:
-        kolibri_license = create_kolibri_license_object(ccnode)[0]
-
-    language = None
-    if ccnode.language or default_language:
-        language, _new = get_or_create_language(ccnode.language or default_language)
-
+def get_kolibri_contentnode_fields(ccnode, channel_id, channel_name, kolibri_license, language):
     options = {}
     if ccnode.extra_fields and 'options' in ccnode.extra_fields:
         options = ccnode.extra_fields['options']
 
-    kolibrinode, is_new = kolibrimodels.ContentNode.objects.update_or_create(
-        pk=ccnode.node_id,
-        defaults={
-            'kind': ccnode.kind.kind,
-            'title': ccnode.title if ccnode.parent else channel_name,
-            'content_id': ccnode.content_id,
-            'channel_id': channel_id,
-            'author': ccnode.author or "",
-            'description': ccnode.description,
-            'sort_order': ccnode.sort_order,
-            'license_owner': ccnode.copyright_holder or "",
-            'license': kolibri_license,
-            'available': ccnode.get_descendants(include_self=True).exclude(kind_id=content_kinds.TOPIC).exists(),  # Hide empty topics
-            'stemmed_metaphone': "",  # Stemmed metaphone is no longer used, and will cause no harm if blank
-            'lang': language,
-            'license_name': kolibri_license.license_name if kolibri_license is not None else None,
-            'license_description': kolibri_license.license_description if kolibri_license is not None else None,
-            'coach_content': ccnode.role_visibility == roles.COACH,
-            'options': json.dumps(options)
-        }
-    )
+    return {
+        'id': ccnode.node_id,
+        'kind': ccnode.kind_id,
+        'title': ccnode.title if ccnode.parent_id else channel_name,
+        'content_id': ccnode.content_id,
+        'channel_id': channel_id,
+        'author': ccnode.author or "",
+        'description': ccnode.description,
+        'sort_order': ccnode.sort_order,
+        'license_owner': ccnode.copyright_holder or "",
+        'license': kolibri_license,
+        'stemmed_metaphone': "",  # Stemmed metaphone is no longer used, and will cause no harm if blank
+        'lang_id': language and language.pk,
+        'license_name': kolibri_license.license_name if kolibri_license is not None else None,
+        'license_description': kolibri_license.license_description if kolibri_license is not None else None,
+        'coach_content': ccnode.role_visibility == roles.COACH,
+        'options': json.dumps(options)
+    }
+
+
+def get_kolibri_license(ccnode, kolibri_licenses):
+    """
+    Returns the Kolibri license for ccnode, using kolibri_licenses as a cache of licenses
+    already created in the export database.
+    """
+    if ccnode.license is None:
+        return None
+    key = (ccnode.license_id, ccnode.license_description if ccnode.license.is_custom else None)
+    if key not in kolibri_licenses:
+        kolibri_licenses[key] = create_kolibri_license_object(ccnode)[0]
+    return kolibri_licenses[key]
+
+
+def get_kolibri_language_fields(language):
+    return {
+        'id': language.pk,
+        'lang_code': language.lang_code,
+        'lang_subcode': language.lang_subcode,
+        'lang_name': language.lang_name if hasattr(language, 'lang_name') else language.native_name,
+        'lang_direction': language.lang_direction,
+    }
+
 
-    if ccnode.parent:
-        logging.debug("Associating {child} with parent {parent}".format(
-            child=kolibrinode.pk,
-            parent=ccnode.parent.node_id
+class ExportDimensionCache(object):
+    """
+    The languages and tags used by the nodes of an export.
+
+    They are all read from the tree up front, so that each is written to the export database
+    with a single bulk insert, and the node mapper only has to look them up in memory.
+    """
+
+    def __init__(self, ccnodes, default_language, tree_filter):
+        self.default_language = default_language
+        exported_node_ids = set(ccnode.node_id for ccnode in ccnodes)
+
+        languages = [ccnode.language for ccnode in ccnodes if ccnode.language]
+        if default_language:
+            languages.append(default_language)
+        shared_ids = [ccnode.content_source_id for ccnode in ccnodes if ccnode.content_source_id]
+        languages.extend(ccmodels.Language.objects.filter(
+            pk__in=ccmodels.File.objects.filter(Q(**tree_filter) | Q(contentnode_id__in=shared_ids)).values('language_id')
         ))
-        kolibrinode.parent = kolibrimodels.ContentNode.objects.get(pk=ccnode.parent.node_id)
+        self.languages = {
+            language.pk: kolibrimodels.Language(**get_kolibri_language_fields(language)) for language in languages
+        }
 
-    kolibrinode.save()
-    logging.debug("Created Kolibri ContentNode with node id {}".format(ccnode.node_id))
-    logging.debug("Kolibri node count: {}".format(kolibrimodels.ContentNode.objects.all().count()))
+        self.tags = {}
+        self.node_tag_ids = collections.defaultdict(list)
+        for relation in ccmodels.ContentNode.tags.through.objects.filter(**tree_filter)\
+                .values('contentnode__node_id', 'contenttag_id', 'contenttag__tag_name'):
+            if relation['contentnode__node_id'] not in exported_node_ids:
+                continue
+            if relation['contenttag_id'] not in self.tags:
+                self.tags[relation['contenttag_id']] = kolibrimodels.ContentTag(
+                    pk=relation['contenttag_id'],
+                    tag_name=relation['contenttag__tag_name'],
+                )
+            self.node_tag_ids[relation['contentnode__node_id']].append(relation['contenttag_id'])
+
+    def get_language(self, ccnode):
+        """
+        Returns the Kolibri language of ccnode, falling back to the default language of the export.
+        """
+        language = ccnode.language or self.default_language
+        return language and self.languages[language.pk]
+
+    def create_languages(self):
+        """
+        Bulk creates the languages that are not already in the export database.
+        """
+        existing = set(kolibrimodels.Language.objects.values_list('pk', flat=True))
+        kolibrimodels.Language.objects.bulk_create([
+            language for language_id, language in self.languages.items() if language_id not in existing
+        ])
+
+    def map_tags_to_nodes(self, kolibrinodes):
+        """
+        Bulk creates the tags of kolibrinodes that are not already in the export database,
+        and then the relationships between the nodes and their tags.
+        """
+        tag_relations = [
+            kolibrimodels.ContentNode.tags.through(contentnode_id=kolibrinode.id, contenttag_id=tag_id)
+            for kolibrinode in kolibrinodes for tag_id in self.node_tag_ids[kolibrinode.id]
+        ]
+        tag_ids = set(relation.contenttag_id for relation in tag_relations)
+        existing = set(kolibrimodels.ContentTag.objects.values_list('pk', flat=True))
+        kolibrimodels.ContentTag.objects.bulk_create([
+            tag for tag_id, tag in self.tags.items() if tag_id in tag_ids and tag_id not in existing
+        ])
+        kolibrimodels.ContentNode.tags.through.objects.bulk_create(tag_relations)
+
+
+def get_cached_thumbnail_encoding(ccnode):
+    """
+    Returns the base64 thumbnail encoding saved on ccnode, if there is one.
+    Raises a ValueError if the saved encoding is not in the correct format.
+    """
+    return ccnode.thumbnail_encoding and load_json_string(ccnode.thumbnail_encoding).get('base64')
 
-    return kolibrinode
 
+def encode_thumbnails(thumbnail_files):  # noqa C901
+    """
+    Generates the thumbnail encodings for the nodes whose thumbnail files have not been encoded yet,
+    from a list of (ccnode, file) pairs.
 
-def get_or_create_language(language):
-    return kolibrimodels.Language.objects.get_or_create(
-        id=language.pk,
-        lang_code=language.lang_code,
-        lang_subcode=language.lang_subcode,
-        lang_name=language.lang_name if hasattr(language, 'lang_name') else language.native_name,
-        lang_direction=language.lang_direction
-    )
+    Each distinct thumbnail image is only downloaded and resized once, however many nodes share it,
+    in a pool of threads. The encodings are then saved on the nodes in one bulk update.
+    Returns the ids of the nodes whose thumbnails could not be encoded.
+    """
+    nodes_by_thumbnail = collections.OrderedDict()
+    scheduled_node_ids = set()
+    for ccnode, ccfilemodel in thumbnail_files:
+        # Like create_associated_thumbnail, only the first thumbnail file of a node is encoded
+        if ccnode.id in scheduled_node_ids:
+            continue
+        try:
+            if get_cached_thumbnail_encoding(ccnode):
+                continue
+        except ValueError:
+            # create_associated_thumbnail reports these
+            continue
+        scheduled_node_ids.add(ccnode.id)
+        nodes_by_thumbnail.setdefault(str(ccfilemodel), []).append(ccnode)
+
+    def encode_thumbnail(filename):
+        try:
+            return get_thumbnail_encoding(filename)
+        except IOError:
+            # ImageMagick may raise an IOError if the file is not a thumbnail.
+            return None
+
+    pool = Pool(THUMBNAIL_POOL_SIZE)
+    try:
+        encodings = pool.map(encode_thumbnail, list(nodes_by_thumbnail))
+    finally:
+        pool.close()
+        pool.join()
+
+    failed_node_ids = set()
+    encoded_nodes = []
+    for encoding, nodes in zip(encodings, nodes_by_thumbnail.values()):
+        if not encoding:
+            for ccnode in nodes:
+                logging.error("ERROR: cannot identify the thumbnail ({}: {})".format(ccnode.id, ccnode.thumbnail_encoding))
+                failed_node_ids.add(ccnode.id)
+            continue
+        record_bytes(len(encoding))
+        thumbnail_encoding = json.dumps({
+            "base64": encoding,
+            "points": [],
+            "zoom": 0,
+        })
+        for ccnode in nodes:
+            ccnode.thumbnail_encoding = thumbnail_encoding
+            encoded_nodes.append(ccnode)
+    bulk_update(encoded_nodes, update_fields=['thumbnail_encoding'])
+    logging.debug("Encoded {} thumbnails for {} nodes".format(len(nodes_by_thumbnail), len(encoded_nodes)))
+    return failed_node_ids
 
 
-def create_associated_thumbnail(ccnode, ccfilemodel):
+def create_associated_thumbnail(ccnode, ccfilemodel, thumbnails=None):
     """
         Gets the appropriate thumbnail for export (uses or generates a base64 encoding)
         Args:
             ccnode (<ContentNode>): node to derive thumbnail from (if encoding is provided)
             ccfilemodel (<File>): file to get thumbnail from if no encoding is available
+            thumbnails (dict, optional): thumbnail files already created, so identical thumbnails are only stored once
         Returns <File> model of encoded, resized thumbnail
     """
     encoding = None
     try:
-        encoding = ccnode.thumbnail_encoding and load_json_string(ccnode.thumbnail_encoding).get('base64')
+        encoding = get_cached_thumbnail_encoding(ccnode)
     except ValueError:
         logging.error("ERROR: node thumbnail is not in correct format ({}: {})".format(ccnode.id, ccnode.thumbnail_encoding))
         return
@@ -278,6 +647,7 @@ def create_associated_thumbnail(ccnode, ccfilemodel):
             # ImageMagick may raise an IOError if the file is not a thumbnail. Catch that then just return early.
             logging.error("ERROR: cannot identify the thumbnail ({}: {})".format(ccnode.id, ccnode.thumbnail_encoding))
             return
+        record_bytes(len(encoding))
         ccnode.thumbnail_encoding = json.dumps({
             "base64": encoding,
             "points": [],
@@ -285,35 +655,56 @@ def create_associated_thumbnail(ccnode, ccfilemodel):
         })
         ccnode.save()
 
-    return create_thumbnail_from_base64(
-        encoding,
-        uploaded_by=ccfilemodel.uploaded_by,
-        file_format_id=ccfilemodel.file_format_id,
-        preset_id=ccfilemodel.preset_id
-    )
+    thumbnails = {} if thumbnails is None else thumbnails
+    key = (encoding, ccfilemodel.file_format_id, ccfilemodel.preset_id)
+    if key not in thumbnails:
+        thumbnails[key] = create_thumbnail_from_base64(
+            encoding,
+            uploaded_by=ccfilemodel.uploaded_by,
+            file_format_id=ccfilemodel.file_format_id,
+            preset_id=ccfilemodel.preset_id
+        )
+    return thumbnails[key]
 
 
-def create_associated_file_objects(kolibrinode, ccnode):
-    logging.debug("Creating LocalFile and File objects for Node {}".format(kolibrinode.id))
-    for ccfilemodel in ccnode.files.exclude(Q(preset_id=format_presets.EXERCISE_IMAGE) | Q(preset_id=format_presets.EXERCISE_GRAPHIE)):
-        preset = ccfilemodel.preset
-        fformat = ccfilemodel.file_format
-        if ccfilemodel.language:
-            get_or_create_language(ccfilemodel.language)
+def create_associated_file_objects(ccnodes, kolibrinodes, tree_filter):
+    """
+    Bulk creates the Kolibri File and LocalFile objects for all the exported nodes
+    from a single query for the files in the tree.
+    """
+    logging.debug("Creating LocalFile and File objects for {} nodes".format(len(kolibrinodes)))
+    kolibrinodes_by_id = {ccnode.id: kolibrinode for ccnode, kolibrinode in zip(ccnodes, kolibrinodes)}
+    ccfiles = get_exported_files(ccnodes, tree_filter)
 
-        if preset.thumbnail:
-            ccfilemodel = create_associated_thumbnail(ccnode, ccfilemodel) or ccfilemodel
+    with profile_phase('thumbnails'):
+        unencoded_node_ids = encode_thumbnails([(n, f) for n, f in ccfiles if f.preset.thumbnail])
 
-        kolibrilocalfilemodel, new = kolibrimodels.LocalFile.objects.get_or_create(
-            pk=ccfilemodel.checksum,
-            defaults={
-                'extension': fformat.extension,
-                'file_size': ccfilemodel.file_size,
-            }
-        )
+    kolibrilocalfiles = collections.OrderedDict()
+    kolibrifiles = []
+    thumbnails = {}
+    for ccnode, ccfilemodel in ccfiles:
+        preset = ccfilemodel.preset
+        fformat = ccfilemodel.file_format
+        kolibrinode = kolibrinodes_by_id[ccnode.id]
+        file_id = ccfilemodel.pk
+        if ccfilemodel.contentnode_id != ccnode.id:
+            # The file is shared with the node it was imported from, so give it an id of its own in the export
+            file_id = uuid.uuid5(uuid.UUID(ccnode.id), file_id).hex
+
+        if preset.thumbnail and ccnode.id not in unencoded_node_ids:
+            with profile_phase('thumbnails'):
+                ccfilemodel = create_associated_thumbnail(ccnode, ccfilemodel, thumbnails=thumbnails) or ccfilemodel
+
+        if ccfilemodel.checksum not in kolibrilocalfiles:
+            kolibrilocalfiles[ccfilemodel.checksum] = kolibrimodels.LocalFile(
+                pk=ccfilemodel.checksum,
+                extension=fformat.extension,
+                file_size=ccfilemodel.file_size,
+            )
 
-        kolibrimodels.File.objects.create(
-            pk=ccfilemodel.pk,
+        kolibrifiles.append(kolibrimodels.File(
+            # Use the id of the node's file, as thumbnail files may be shared between nodes
+            pk=file_id,
             checksum=ccfilemodel.checksum,
             extension=fformat.extension,
             available=True,  # TODO: Set this to False, once we have availability stamping implemented in Kolibri
@@ -321,43 +712,187 @@ def create_associated_file_objects(kolibrinode, ccnode):
             contentnode=kolibrinode,
             preset=preset.pk,
             supplementary=preset.supplementary,
-            lang_id=ccfilemodel.language and ccfilemodel.language.pk,
+            lang_id=ccfilemodel.language_id,
             thumbnail=preset.thumbnail,
             priority=preset.order,
-            local_file=kolibrilocalfilemodel,
-        )
+            local_file_id=ccfilemodel.checksum,
+        ))
 
+    existing = set(kolibrimodels.LocalFile.objects.values_list('pk', flat=True))
+    kolibrimodels.LocalFile.objects.bulk_create([f for checksum, f in kolibrilocalfiles.items() if checksum not in existing])
+    kolibrimodels.File.objects.bulk_create(kolibrifiles)
 
-def create_perseus_exercise(ccnode, kolibrinode, exercise_data, user_id=None):
-    logging.debug("Creating Perseus Exercise for Node {}".format(ccnode.title))
-    filename = "{0}.{ext}".format(ccnode.title, ext=file_formats.PERSEUS)
-    temppath = None
-    try:
-        with tempfile.NamedTemporaryFile(suffix="zip", delete=False) as tempf:
-            temppath = tempf.name
-            create_perseus_zip(ccnode, exercise_data, tempf)
-            file_size = tempf.tell()
-            tempf.flush()
 
-            ccnode.files.filter(preset_id=format_presets.EXERCISE).delete()
+class PerseusImageCache(object):
+    """
+    Reads exercise images from storage for the exercises rendered during a publish.
+
+    Each image is only downloaded once, however many exercises use it, and is kept in a
+    temporary directory rather than in memory. It is safe to use from multiple threads.
+    """
 
-            assessment_file_obj = ccmodels.File.objects.create(
-                file_on_disk=File(open(temppath, 'rb'), name=filename),
-                contentnode=ccnode,
-                file_format_id=file_formats.PERSEUS,
-                preset_id=format_presets.EXERCISE,
-                original_filename=filename,
-                file_size=file_size,
-                uploaded_by_id=user_id,
-            )
-            logging.debug("Created exercise for {0} with checksum {1}".format(ccnode.title, assessment_file_obj.checksum))
+    def __init__(self):
+        self.directory = tempfile.mkdtemp()
+        self._lock = threading.Lock()
+        self._image_locks = {}
+
+    def read(self, storage_name):
+        with self._lock:
+            image_lock = self._image_locks.setdefault(storage_name, threading.Lock())
+        path = os.path.join(self.directory, storage_name.replace('/', '_'))
+        with image_lock:
+            if not os.path.exists(path):
+                with storage.open(storage_name, 'rb') as content, open(path, 'wb') as imgfile:
+                    shutil.copyfileobj(content, imgfile)
+        with open(path, 'rb') as imgfile:
+            return imgfile.read()
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def read_perseus_image(storage_name, image_cache=None):
+    if image_cache:
+        return image_cache.read(storage_name)
+    with storage.open(storage_name, 'rb') as content:
+        return content.read()
+
+
+def get_perseus_zip_cache_key(exercise_data, assessment_items):
+    """
+    Returns a cache key made from a hash of everything that an exercise zip is rendered from,
+    so that exercises with the same content, such as copies in other channels, share a key.
+    """
+    zip_inputs = {
+        'version': PERSEUS_ZIP_CACHE_VERSION,
+        'exercise_data': exercise_data,
+        'assessment_items': [
+            {
+                'assessment_id': item.assessment_id,
+                'type': item.type,
+                'question': item.question,
+                'answers': item.answers,
+                'hints': item.hints,
+                'raw_data': item.raw_data,
+                'randomize': item.randomize,
+                'files': sorted(
+                    [f.checksum or '', f.file_format_id or '', f.preset_id or '', f.original_filename or '']
+                    for f in item.files.all()
+                ),
+            }
+            for item in assessment_items
+        ],
+    }
+    return "perseus_zip_{}".format(hashlib.md5(json.dumps(zip_inputs, sort_keys=True).encode('utf-8')).hexdigest())
+
+
+def get_cached_perseus_zips(cache_keys):
+    """
+    Returns the cached zip checksums and sizes for cache_keys, leaving out any whose
+    zip is no longer referenced by a File, as its stored object may have been deleted.
+    """
+    cached_zips = cache.get_many(cache_keys)
+    stored_checksums = set(
+        ccmodels.File.objects.filter(
+            checksum__in=[cached_zip['checksum'] for cached_zip in cached_zips.values()],
+            file_format_id=file_formats.PERSEUS,
+        ).values_list('checksum', flat=True)
+    )
+    return {key: cached_zip for key, cached_zip in cached_zips.items() if cached_zip['checksum'] in stored_checksums}
+
+
+def create_perseus_exercises(exercises_to_render, user_id=None, progress_callback=None):  # noqa C901
+    """
+    Creates the perseus zips for a list of (ccnode, exercise_data, assessment_items) tuples.
+
+    The zips are cached by a hash of their inputs, so a zip is only rendered and uploaded if
+    no exercise with the same content has been rendered before. The remaining zips are rendered
+    and written to storage in a pool of threads that share the images they fetch. The assessment
+    items should be passed in with their files prefetched, as the threads do not query the
+    database. Once the pool has finished, the File objects for all of the exercises are
+    replaced at once.
+    """
+    if not exercises_to_render:
+        return
+
+    cache_keys = [get_perseus_zip_cache_key(exercise_data, items) for _node, exercise_data, items in exercises_to_render]
+    zips = get_cached_perseus_zips(cache_keys)
+
+    # Only render each distinct zip once, even if several exercises in the channel share it
+    zips_to_render = collections.OrderedDict()
+    for cache_key, exercise in zip(cache_keys, exercises_to_render):
+        if cache_key not in zips:
+            zips_to_render.setdefault(cache_key, exercise)
+
+    image_cache = PerseusImageCache()
+
+    def render_exercise(args):
+        cache_key, (ccnode, exercise_data, assessment_items) = args
+        with tempfile.TemporaryFile() as tempf:
+            create_perseus_zip(ccnode, exercise_data, tempf, assessment_items=assessment_items, image_cache=image_cache)
+            file_size = tempf.tell()
+            tempf.seek(0)
+            checksum, _filename, _path = write_raw_content_to_storage(tempf.read(), ext=file_formats.PERSEUS)
+        return cache_key, {'checksum': checksum, 'file_size': file_size}
+
+    pool = Pool(PERSEUS_POOL_SIZE)
+    try:
+        rendered_zips = {}
+        for index, (cache_key, rendered_zip) in enumerate(pool.imap(render_exercise, zips_to_render.items())):
+            rendered_zips[cache_key] = rendered_zip
+            if progress_callback:
+                progress_callback(index, len(zips_to_render))
     finally:
-        temppath and os.unlink(temppath)
+        pool.close()
+        pool.join()
+        image_cache.close()
+    cache.set_many(rendered_zips, None)
+    record_bytes(sum(rendered_zip['file_size'] for rendered_zip in rendered_zips.values()))
+    zips.update(rendered_zips)
+    logging.debug("Rendered {} of {} exercise zips".format(len(rendered_zips), len(exercises_to_render)))
+
+    old_files = collections.defaultdict(list)
+    for file_id, contentnode_id, checksum in ccmodels.File.objects.filter(
+        contentnode_id__in=[ccnode.id for ccnode, _data, _items in exercises_to_render],
+        preset_id=format_presets.EXERCISE,
+    ).values_list('id', 'contentnode_id', 'checksum'):
+        old_files[contentnode_id].append((file_id, checksum))
+
+    exercise_files = []
+    old_file_ids = []
+    for cache_key, (ccnode, _data, _items) in zip(cache_keys, exercises_to_render):
+        exercise_zip = zips[cache_key]
+        # Leave the exercise alone if it already has exactly this zip
+        if [checksum for _id, checksum in old_files[ccnode.id]] == [exercise_zip['checksum']]:
+            continue
+        old_file_ids.extend(file_id for file_id, _checksum in old_files[ccnode.id])
+        filename = "{0}.{ext}".format(ccnode.title, ext=file_formats.PERSEUS)
+        exercise_file = ccmodels.File(
+            checksum=exercise_zip['checksum'],
+            contentnode=ccnode,
+            file_format_id=file_formats.PERSEUS,
+            preset_id=format_presets.EXERCISE,
+            original_filename=filename,
+            file_size=exercise_zip['file_size'],
+            uploaded_by_id=user_id,
+        )
+        exercise_file.file_on_disk.name = ccmodels.generate_object_storage_name(
+            exercise_zip['checksum'], "{}.{}".format(exercise_zip['checksum'], file_formats.PERSEUS))
+        exercise_files.append(exercise_file)
 
+    # Create the new files before deleting the old ones, so that the storage objects
+    # of zips that have not changed are still referenced when the old files are deleted.
+    ccmodels.File.objects.bulk_create(exercise_files)
+    ccmodels.File.objects.filter(id__in=old_file_ids).delete()
+    logging.debug("Created {} exercise files".format(len(exercise_files)))
 
-def process_assessment_metadata(ccnode, kolibrinode):
+
+def get_assessment_metadata(ccnode, kolibrinode, assessment_items):
+    """
+    Returns the exercise data for ccnode and an unsaved AssessmentMetaData for its Kolibri node,
+    so that callers can create the metadata for many exercises at once.
+    """
     # Get mastery model information, set to default if none provided
-    assessment_items = ccnode.assessment_items.all().order_by('order')
     exercise_data = ccnode.extra_fields if ccnode.extra_fields else {}
     if isinstance(exercise_data, basestring):
         exercise_data = json.loads(exercise_data)
@@ -366,10 +901,10 @@ def process_assessment_metadata(ccnode, kolibrinode):
 
     mastery_model = {'type': exercise_data.get('mastery_model') or exercises.M_OF_N}
     if mastery_model['type'] == exercises.M_OF_N:
-        mastery_model.update({'n': exercise_data.get('n') or min(5, assessment_items.count()) or 1})
-        mastery_model.update({'m': exercise_data.get('m') or min(5, assessment_items.count()) or 1})
+        mastery_model.update({'n': exercise_data.get('n') or min(5, len(assessment_items)) or 1})
+        mastery_model.update({'m': exercise_data.get('m') or min(5, len(assessment_items)) or 1})
     elif mastery_model['type'] == exercises.DO_ALL:
-        mastery_model.update({'n': assessment_items.count() or 1, 'm': assessment_items.count() or 1})
+        mastery_model.update({'n': len(assessment_items) or 1, 'm': len(assessment_items) or 1})
     elif mastery_model['type'] == exercises.NUM_CORRECT_IN_A_ROW_2:
         mastery_model.update({'n': 2, 'm': 2})
     elif mastery_model['type'] == exercises.NUM_CORRECT_IN_A_ROW_3:
@@ -389,20 +924,22 @@ def process_assessment_metadata(ccnode, kolibrinode):
         'assessment_mapping': {a.assessment_id: a.type if a.type != 'true_false' else exercises.SINGLE_SELECTION for a in assessment_items},
     })
 
-    kolibrimodels.AssessmentMetaData.objects.create(
+    assessment_metadata = kolibrimodels.AssessmentMetaData(
         id=uuid.uuid4(),
         contentnode=kolibrinode,
         assessment_item_ids=json.dumps(assessment_item_ids),
-        number_of_assessments=assessment_items.count(),
+        number_of_assessments=len(assessment_items),
         mastery_model=json.dumps(mastery_model),
         randomize=randomize,
         is_manipulable=ccnode.kind_id == content_kinds.EXERCISE,
     )
 
-    return exercise_data
+    return exercise_data, assessment_metadata
 
 
-def create_perseus_zip(ccnode, exercise_data, write_to_path):
+def create_perseus_zip(ccnode, exercise_data, write_to_path, assessment_items=None, image_cache=None):  # noqa C901
+    if assessment_items is None:
+        assessment_items = ccnode.get_content_owner().assessment_items.prefetch_related('files').all().order_by('order')
     with zipfile.ZipFile(write_to_path, "w") as zf:
         try:
             exercise_context = {
@@ -411,25 +948,32 @@ def create_perseus_zip(ccnode, exercise_data, write_to_path):
             exercise_result = render_to_string('perseus/exercise.json', exercise_context)
             write_to_zipfile("exercise.json", exercise_result, zf)
 
-            for question in ccnode.assessment_items.prefetch_related('files').all().order_by('order'):
+            for question in assessment_items:
                 try:
-                    for image in question.files.filter(preset_id=format_presets.EXERCISE_IMAGE).order_by('checksum'):
+                    # Filter the prefetched files in memory, so that no queries are made here
+                    question_files = sorted(question.files.all(), key=lambda f: f.checksum)
+                    for image in question_files:
+                        if image.preset_id != format_presets.EXERCISE_IMAGE:
+                            continue
                         image_name = "images/{}.{}".format(image.checksum, image.file_format_id)
                         if image_name not in zf.namelist():
-                            with storage.open(ccmodels.generate_object_storage_name(image.checksum, str(image)), 'rb') as content:
-                                write_to_zipfile(image_name, content.read(), zf)
+                            storage_name = ccmodels.generate_object_storage_name(image.checksum, image_name)
+                            write_to_zipfile(image_name, read_perseus_image(storage_name, image_cache), zf)
 
-                    for image in question.files.filter(preset_id=format_presets.EXERCISE_GRAPHIE).order_by('checksum'):
+                    for image in question_files:
+                        if image.preset_id != format_presets.EXERCISE_GRAPHIE:
+                            continue
                         svg_name = "images/{0}.svg".format(image.original_filename)
                         json_name = "images/{0}-data.json".format(image.original_filename)
                         if svg_name not in zf.namelist() or json_name not in zf.namelist():
-                            with storage.open(ccmodels.generate_object_storage_name(image.checksum, str(image)), 'rb') as content:
-                                content = content.read()
-                                # in Python 3, delimiter needs to be in bytes format
-                                content = content.split(exercises.GRAPHIE_DELIMITER.encode('ascii'))
-                                write_to_zipfile(svg_name, content[0], zf)
-                                write_to_zipfile(json_name, content[1], zf)
-                    write_assessment_item(question, zf)
+                            storage_name = ccmodels.generate_object_storage_name(
+                                image.checksum, "{}.{}".format(image.checksum, image.file_format_id))
+                            content = read_perseus_image(storage_name, image_cache)
+                            # in Python 3, delimiter needs to be in bytes format
+                            content = content.split(exercises.GRAPHIE_DELIMITER.encode('ascii'))
+                            write_to_zipfile(svg_name, content[0], zf)
+                            write_to_zipfile(json_name, content[1], zf)
+                    write_assessment_item(question, zf, image_cache=image_cache)
                 except Exception as e:
                     logging.error("Publishing error: {}".format(str(e)))
                     logging.error(traceback.format_exc())
@@ -451,7 +995,7 @@ def write_to_zipfile(filename, content, zf):
     zf.writestr(info, content)
 
 
-def write_assessment_item(assessment_item, zf):  # noqa C901
+def write_assessment_item(assessment_item, zf, image_cache=None):  # noqa C901
     if assessment_item.type == exercises.MULTIPLE_SELECTION:
         template = 'perseus/multiple_selection.json'
     elif assessment_item.type == exercises.SINGLE_SELECTION or assessment_item.type == 'true_false':
@@ -464,7 +1008,7 @@ def write_assessment_item(assessment_item, zf):  # noqa C901
         raise TypeError("Unrecognized question type on item {}".format(assessment_item.assessment_id))
 
     question = process_formulas(assessment_item.question)
-    question, question_images = process_image_strings(question, zf)
+    question, question_images = process_image_strings(question, zf, image_cache=image_cache)
 
     answer_data = json.loads(assessment_item.answers)
     for answer in answer_data:
@@ -474,14 +1018,14 @@ def write_assessment_item(assessment_item, zf):  # noqa C901
             answer['answer'] = answer['answer'].replace(exercises.CONTENT_STORAGE_PLACEHOLDER, PERSEUS_IMG_DIR)
             answer['answer'] = process_formulas(answer['answer'])
             # In case perseus doesn't support =wxh syntax, use below code
-            answer['answer'], answer_images = process_image_strings(answer['answer'], zf)
+            answer['answer'], answer_images = process_image_strings(answer['answer'], zf, image_cache=image_cache)
             answer.update({'images': answer_images})
 
     answer_data = list([a for a in answer_data if a['answer'] or a['answer'] == 0])  # Filter out empty answers, but not 0
     hint_data = json.loads(assessment_item.hints)
     for hint in hint_data:
         hint['hint'] = process_formulas(hint['hint'])
-        hint['hint'], hint_images = process_image_strings(hint['hint'], zf)
+        hint['hint'], hint_images = process_image_strings(hint['hint'], zf, image_cache=image_cache)
         hint.update({'images': hint_images})
 
     answers_sorted = answer_data
@@ -516,7 +1060,7 @@ def process_formulas(content):
     return content
 
 
-def process_image_strings(content, zf):
+def process_image_strings(content, zf, image_cache=None):
     image_list = []
     content = content.replace(exercises.CONTENT_STORAGE_PLACEHOLDER, PERSEUS_IMG_DIR)
     for match in re.finditer(r'!\[(?:[^\]]*)]\(([^\)]+)\)', content):
@@ -527,8 +1071,8 @@ def process_image_strings(content, zf):
             checksum, ext = os.path.splitext(filename)
             image_name = "images/{}.{}".format(checksum, ext[1:])
             if image_name not in zf.namelist():
-                with storage.open(ccmodels.generate_object_storage_name(checksum, filename), 'rb') as imgfile:
-                    write_to_zipfile(image_name, imgfile.read(), zf)
+                storage_name = ccmodels.generate_object_storage_name(checksum, filename)
+                write_to_zipfile(image_name, read_perseus_image(storage_name, image_cache), zf)
 
             # Add resizing data
             if img_match.group(2) and img_match.group(3):
@@ -542,14 +1086,93 @@ def process_image_strings(content, zf):
 
 
 def map_prerequisites(root_node):
+    """
+    Maps the prerequisites in the tree of root_node onto the exported nodes with a single bulk insert.
 
-    for n in ccmodels.PrerequisiteContentRelationship.objects.filter(prerequisite__tree_id=root_node.tree_id)\
-            .values('prerequisite__node_id', 'target_node__node_id'):
-        try:
-            target_node = kolibrimodels.ContentNode.objects.get(pk=n['target_node__node_id'])
-            target_node.has_prerequisite.add(n['prerequisite__node_id'])
-        except kolibrimodels.ContentNode.DoesNotExist as e:
-            logging.error('Unable to find prerequisite {}'.format(str(e)))
+    Prerequisites where either node was not exported are left out. The number of these orphaned prerequisites,
+    and of the cycles in the exported prerequisites, are recorded in the publish profile.
+    """
+    exported_node_ids = set(kolibrimodels.ContentNode.objects.values_list('id', flat=True))
+    prerequisites = set(
+        ccmodels.PrerequisiteContentRelationship.objects.filter(prerequisite__tree_id=root_node.tree_id)
+        .values_list('target_node__node_id', 'prerequisite__node_id')
+    )
+
+    relations = []
+    orphan_count = 0
+    for target_node_id, prerequisite_node_id in prerequisites:
+        if target_node_id not in exported_node_ids or prerequisite_node_id not in exported_node_ids:
+            orphan_count += 1
+            continue
+        relations.append(kolibrimodels.ContentNode.has_prerequisite.through(
+            from_contentnode_id=target_node_id,
+            to_contentnode_id=prerequisite_node_id,
+        ))
+    kolibrimodels.ContentNode.has_prerequisite.through.objects.bulk_create(relations)
+
+    cycle_count = count_prerequisite_cycles((r.from_contentnode_id, r.to_contentnode_id) for r in relations)
+    if orphan_count:
+        logging.warning("Left out {} prerequisites of nodes that were not published".format(orphan_count))
+    if cycle_count:
+        logging.warning("Found {} cycles in the prerequisites".format(cycle_count))
+    record_count('prerequisites', len(relations))
+    record_count('orphaned_prerequisites', orphan_count)
+    record_count('prerequisite_cycles', cycle_count)
+
+
+def count_prerequisite_cycles(edges):  # noqa C901
+    """
+    Returns the number of cycles in a graph of (target, prerequisite) edges, counting each group of nodes
+    that all depend on one another, or a node that is its own prerequisite, as one cycle.
+    """
+    graph = collections.defaultdict(list)
+    cycle_count = 0
+    for target, prerequisite in edges:
+        if target == prerequisite:
+            cycle_count += 1
+        else:
+            graph[target].append(prerequisite)
+
+    # Count the strongly connected components with more than one node, using an iterative version
+    # of Tarjan's algorithm so that long prerequisite chains don't hit the recursion limit.
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    for start in list(graph):
+        if start in index:
+            continue
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(graph[start]))]
+        while work:
+            node, neighbours = work[-1]
+            neighbour = next(neighbours, None)
+            if neighbour is not None:
+                if neighbour not in index:
+                    index[neighbour] = lowlink[neighbour] = len(index)
+                    stack.append(neighbour)
+                    on_stack.add(neighbour)
+                    work.append((neighbour, iter(graph[neighbour])))
+                elif neighbour in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbour])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component_size = 0
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component_size += 1
+                    if member == node:
+                        break
+                if component_size > 1:
+                    cycle_count += 1
+    return cycle_count
 
 
 def map_channel_to_kolibri_channel(channel):
@@ -594,31 +1217,44 @@ def convert_channel_thumbnail(channel):
     return get_thumbnail_encoding(channel.thumbnail)
 
 
-def map_tags_to_node(kolibrinode, ccnode):
-    """ map_tags_to_node: assigns tags to nodes (creates fk relationship)
-        Args:
-            kolibrinode (kolibri.models.ContentNode): node to map tag to
-            ccnode (contentcuration.models.ContentNode): node with tags to map
-        Returns: None
-    """
-    tags_to_add = []
+def prepare_export_database(tempdb):
+    call_command("flush", "--noinput", database=get_active_content_database())  # clears the db!
+    call_command("migrate",
+                 "content",
+                 run_syncdb=True,
+                 database=get_active_content_database(),
+                 noinput=True)
+    logging.info("Prepared the export database.")
 
-    for tag in ccnode.tags.all():
-        t, _new = kolibrimodels.ContentTag.objects.get_or_create(pk=tag.pk, tag_name=tag.tag_name)
-        tags_to_add.append(t)
 
-    kolibrinode.tags = tags_to_add
-    kolibrinode.save()
+def download_export_database(channel_id, tempdb):
+    """
+    Copies the previously published export database for the channel to tempdb.
+    Returns False if the channel has no published database to start from.
+    """
+    published_db_location = os.path.join(settings.DB_ROOT, "{id}.sqlite3".format(id=channel_id))
+    if not storage.exists(published_db_location):
+        return False
+
+    with storage.open(published_db_location, 'rb') as publishedf, open(tempdb, 'wb') as tempf:
+        # Database files are gzipped on upload to cloud storage, see GoogleCloudStorage.save
+        is_gzipped = publishedf.read(2) == b'\x1f\x8b'
+        publishedf.seek(0)
+        shutil.copyfileobj(GzipFile(fileobj=publishedf, mode='rb') if is_gzipped else publishedf, tempf)
+    logging.info("Copied the published export database from {}".format(published_db_location))
+    return True
 
 
-def prepare_export_database(tempdb):
-    call_command("flush", "--noinput", database=get_active_content_database())  # clears the db!
+def prepare_incremental_export_database(tempdb):
     call_command("migrate",
                  "content",
                  run_syncdb=True,
                  database=get_active_content_database(),
                  noinput=True)
-    logging.info("Prepared the export database.")
+    # The channel metadata and prerequisites are cheap to write, so they are always mapped from scratch
+    kolibrimodels.ChannelMetadata.objects.all().delete()
+    kolibrimodels.ContentNode.has_prerequisite.through.objects.all().delete()
+    logging.info("Prepared the export database for an incremental publish.")
 
 
 def raise_if_nodes_are_all_unchanged(channel):
@@ -638,17 +1274,39 @@ def mark_all_nodes_as_published(channel):
     logging.debug("Marking all nodes as published.")
 
     channel.main_tree.get_family().update(changed=False, published=True)
+    # No resources in the tree are changed anymore
+    ccmodels.ContentNodeTreeStats.objects.filter(node__tree_id=channel.main_tree.tree_id).update(updated_count=0, new_count=0)
 
     logging.info("Marked all nodes as published.")
 
 
-def save_export_database(channel_id):
+def save_export_database(channel_id, timings=None):
+    """
+    Uploads the active export database to storage, recording how long it took to compress and upload in timings.
+
+    Storage backends that store databases gzipped are given the database already compressed, so that it
+    is streamed through a temporary file a chunk at a time rather than compressed in memory.
+    """
     logging.debug("Saving export database")
+    timings = {} if timings is None else timings
     current_export_db_location = get_active_content_database()
     target_export_db_location = os.path.join(settings.DB_ROOT, "{id}.sqlite3".format(id=channel_id))
 
     with open(current_export_db_location, 'rb') as currentf:
-        storage.save(target_export_db_location, currentf)
+        start = time.time()
+        if getattr(storage, 'gzip_database_files', False):
+            with tempfile.TemporaryFile() as compressedf:
+                with GzipFile(fileobj=compressedf, mode='wb') as gzipf:
+                    shutil.copyfileobj(currentf, gzipf, EXPORT_DATABASE_CHUNK_SIZE)
+                timings['compress'] = time.time() - start
+                start = time.time()
+                record_bytes(compressedf.tell())
+                compressedf.seek(0)
+                storage.save(target_export_db_location, compressedf)
+        else:
+            record_bytes(os.path.getsize(current_export_db_location))
+            storage.save(target_export_db_location, currentf)
+        timings['upload'] = time.time() - start
     logging.info("Successfully copied to {}".format(target_export_db_location))
 
 
@@ -660,20 +1318,14 @@ def add_tokens_to_channel(channel):
 
 def fill_published_fields(channel, version_notes):
     channel.last_published = timezone.now()
-    published_nodes = channel.main_tree.get_descendants().filter(published=True).prefetch_related('files')
-    channel.total_resource_count = published_nodes.exclude(kind_id=content_kinds.TOPIC).count()
-    kind_counts = list(published_nodes.values('kind_id').annotate(count=Count('kind_id')).order_by('kind_id'))
+    statistics = ChannelStatistics(channel.main_tree, published_only=True)
+    channel.total_resource_count = statistics.resource_count
+    kind_counts = statistics.kind_counts
     channel.published_kind_count = json.dumps(kind_counts)
-    channel.published_size = published_nodes.values('files__checksum', 'files__file_size').distinct(
-    ).aggregate(resource_size=Sum('files__file_size'))['resource_size'] or 0
+    channel.published_size = statistics.size
 
-    node_languages = published_nodes.exclude(language=None).values_list('language', flat=True)
-    file_languages = published_nodes.values_list('files__language', flat=True)
-    language_list = list(set(chain(node_languages, file_languages)))
-
-    for lang in language_list:
-        if lang:
-            channel.included_languages.add(lang)
+    language_list = list(statistics.languages | statistics.file_languages)
+    channel.included_languages.add(*language_list)
 
     # TODO: Eventually, consolidate above operations to just use this field for storing historical data
     channel.published_data.update({
@@ -689,17 +1341,28 @@ def fill_published_fields(channel, version_notes):
     channel.save()
 
 
-def publish_channel(user_id, channel_id, version_notes='', force=False, force_exercises=False, send_email=False, task_object=None):
+def publish_channel(user_id, channel_id, version_notes='', force=False, force_exercises=False, send_email=False, task_object=None,
+                    incremental=False):
     channel = ccmodels.Channel.objects.get(pk=channel_id)
     kolibri_temp_db = None
+    timings = {}
 
     try:
-        set_channel_icon_encoding(channel)
-        kolibri_temp_db = create_content_database(channel, force, user_id, force_exercises, task_object)
-        increment_channel_version(channel)
-        mark_all_nodes_as_published(channel)
-        add_tokens_to_channel(channel)
-        fill_published_fields(channel, version_notes)
+        with profile() as profiler:
+            with profile_phase('icon_encoding'):
+                set_channel_icon_encoding(channel)
+                record_bytes(len(channel.icon_encoding or ''))
+            kolibri_temp_db = create_content_database(channel, force, user_id, force_exercises, task_object, incremental=incremental,
+                                                      timings=timings)
+            with profile_phase('published_fields'):
+                increment_channel_version(channel)
+                mark_all_nodes_as_published(channel)
+                add_tokens_to_channel(channel)
+                fill_published_fields(channel, version_notes)
+
+        # Keep the profile with the rest of the data about this version, to tell which channels are slow to publish and why
+        channel.published_data[channel.version]['profile'] = profiler.report()
+        ccmodels.Channel.objects.filter(pk=channel.pk).update(published_data=channel.published_data)
 
         # Attributes not getting set for some reason, so just save it here
         channel.main_tree.publishing = False
@@ -710,13 +1373,12 @@ def publish_channel(user_id, channel_id, version_notes='', force=False, force_ex
         if send_email:
             send_emails(channel, user_id, version_notes=version_notes)
 
-        # use SQLite backup API to put DB into archives folder.
-        # Then we can use the empty db name to have SQLite use a temporary DB (https://www.sqlite.org/inmemorydb.html)
-
         record_publish_stats(channel)
 
+        logging.info("Published channel {} in {}".format(channel_id, ", ".join(
+            "{} {:.2f}s".format(phase, seconds) for phase, seconds in sorted(timings.items()))))
         if task_object:
-            task_object.update_state(state='STARTED', meta={'progress': 100.0})
+            task_object.update_state(state='STARTED', meta={'progress': 100.0, 'timings': timings})
 
     # No matter what, make sure publishing is set to False once the run is done
     finally:
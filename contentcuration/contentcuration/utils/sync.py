@@ -10,6 +10,7 @@ from le_utils.constants import format_presets
 from past.utils import old_div
 
 from contentcuration.models import AssessmentItem
+from contentcuration.models import ContentNode
 from contentcuration.models import ContentTag
 from contentcuration.models import File
 
@@ -67,6 +68,10 @@ def sync_node(
             sync_node_data(node, original_node)
         if sync_tags:  # Sync node tags
             sync_node_tags(node, original_node)
+        if sync_files or sync_assessment_items:
+            # Files and assessment items are synced in place, so they must not be shared with other nodes
+            ContentNode.objects.prepare_content_edit([node.id])
+            node.content_source = None
         if sync_files:  # Sync node files
             sync_node_files(node, original_node)
         if (
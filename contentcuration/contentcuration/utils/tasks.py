@@ -1,15 +1,78 @@
+import time
+
 import celery
+from django.core.cache import cache
+
+# The progress of a task is written to the cache at most this often, in seconds,
+# rather than to the result backend every time it is incremented
+PROGRESS_REPORT_INTERVAL = 1.0
+# How often a running task reads whether it has been cancelled, in seconds
+CANCEL_CHECK_INTERVAL = 1.0
+# How long the progress and cancellation of a task are kept in the cache, in seconds
+TASK_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Tasks that stop themselves when they are cancelled, rolling back what they have done so far,
+# so they don't have to be terminated
+CANCELLABLE_TASK_TYPES = ("duplicate-nodes",)
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+def _progress_key(task_id):
+    return "task_progress_{}".format(task_id)
+
+
+def _cancelled_key(task_id):
+    return "task_cancelled_{}".format(task_id)
+
+
+def get_task_progress(task_id):
+    """
+    Returns the last progress reported by the task, or None if it has not reported any.
+    """
+    return cache.get(_progress_key(task_id))
+
+
+def _report_progress(task):
+    now = time.time()
+    if task.progress >= 100 or now - getattr(task, "progress_reported", 0) >= PROGRESS_REPORT_INTERVAL:
+        cache.set(_progress_key(task.request.id), task.progress, TASK_CACHE_TIMEOUT)
+        task.progress_reported = now
 
 
 def increment_progress(increment=1):
     if celery.current_task:
         total = celery.current_task.total
         current_progress = celery.current_task.progress
-        new_progress = min(current_progress + (100 * increment / total), 100)
-        celery.current_task.update_state(meta={"progress": new_progress})
-        celery.current_task.progress = new_progress
+        celery.current_task.progress = min(current_progress + (100 * increment / total), 100)
+        _report_progress(celery.current_task)
 
 
 def set_total(total):
     if celery.current_task:
         celery.current_task.total = total
+        celery.current_task.progress_reported = 0
+        celery.current_task.cancel_checked = 0
+
+
+def cancel_task(task_id):
+    """
+    Asks a running task to stop, which it does the next time it calls check_cancelled.
+    """
+    cache.set(_cancelled_key(task_id), True, TASK_CACHE_TIMEOUT)
+
+
+def check_cancelled():
+    """
+    Raises TaskCancelled if the current task has been cancelled. Only reads the cache once
+    per CANCEL_CHECK_INTERVAL, so it can be called for every item a task works through.
+    """
+    if celery.current_task:
+        now = time.time()
+        if now - getattr(celery.current_task, "cancel_checked", 0) < CANCEL_CHECK_INTERVAL:
+            return
+        celery.current_task.cancel_checked = now
+        if cache.get(_cancelled_key(celery.current_task.request.id)):
+            raise TaskCancelled("Task {} was cancelled".format(celery.current_task.request.id))
@@ -46,6 +46,7 @@ from contentcuration.serializers import SimplifiedChannelProbeCheckSerializer
 from contentcuration.tasks import generatechannelcsv_task
 from contentcuration.utils.messages import get_messages
 from contentcuration.viewsets.channelset import PublicChannelSetSerializer
+from contentcuration.viewsets.sync.utils import get_user_events
 
 PUBLIC_CHANNELS_CACHE_DURATION = 30  # seconds
 
@@ -70,9 +71,11 @@ user_fields = (
 def current_user_for_context(user):
     if not user or user.is_anonymous():
         return json_for_parse_from_data(None)
-    return json_for_parse_from_data(
-        {field: getattr(user, field) for field in user_fields}
-    )
+    data = {field: getattr(user, field) for field in user_fields}
+    # The sequence number of the last event added for the user, for the client to start syncing from,
+    # so that no event added between the page being rendered and its first sync is missed
+    _events, data["user_rev"] = get_user_events(user.id)
+    return json_for_parse_from_data(data)
 
 
 @browser_is_supported
@@ -1,12 +1,15 @@
 import json
 import logging
+import os
 from collections import namedtuple
 from distutils.version import LooseVersion
 
 from builtins import str
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import PermissionDenied
 from django.core.exceptions import SuspiciousOperation
+from django.core.exceptions import ValidationError
 from django.core.management import call_command
 from django.db import transaction
 from django.http import HttpResponseBadRequest
@@ -31,23 +34,26 @@ from contentcuration import ricecooker_versions as rc
 from contentcuration.api import activate_channel
 from contentcuration.api import get_staged_diff
 from contentcuration.api import write_file_to_storage
+from contentcuration.celery import app
 from contentcuration.models import AssessmentItem
 from contentcuration.models import Channel
 from contentcuration.models import ContentNode
 from contentcuration.models import ContentTag
+from contentcuration.models import File
+from contentcuration.models import FormatPreset
+from contentcuration.models import generate_object_storage_name
+from contentcuration.models import Language
 from contentcuration.models import License
 from contentcuration.models import SlideshowSlide
 from contentcuration.models import StagedFile
+from contentcuration.models import Task
 from contentcuration.serializers import GetTreeDataSerializer
+from contentcuration.tasks import create_async_task
 from contentcuration.utils.files import get_file_diff
+from contentcuration.utils.files import get_thumbnail_encoding
 from contentcuration.utils.garbage_collect import get_deleted_chefs_root
-from contentcuration.utils.nodes import map_files_to_assessment_item
-from contentcuration.utils.nodes import map_files_to_node
-from contentcuration.utils.nodes import map_files_to_slideshow_slide_item
+from contentcuration.utils.tasks import get_task_progress
 from contentcuration.utils.tracing import trace
-from contentcuration.viewsets.sync.constants import CHANNEL
-from contentcuration.viewsets.sync.utils import add_event_for_user
-from contentcuration.viewsets.sync.utils import generate_update_event
 
 
 VersionStatus = namedtuple('VersionStatus', ['version', 'status', 'message'])
@@ -185,6 +191,11 @@ def api_commit_channel(request):
     """
     Commit the channel chef_tree to staging tree to the main tree.
     This view backs the endpoint `/api/internal/finish_channel` called by ricecooker.
+
+    The commit runs as a commit-channel task. Ricecooker clients that send `async` get the task id back
+    straight away and poll `/api/internal/finish_channel_status` for it, otherwise the task is run
+    before responding. Posting the same chef_tree again returns its existing task instead of
+    committing it twice.
     """
     data = json.loads(request.body)
     try:
@@ -194,50 +205,27 @@ def api_commit_channel(request):
 
         obj = Channel.objects.get(pk=channel_id)
 
-        # Need to rebuild MPTT tree pointers since we used `disable_mptt_updates`
-        ContentNode.objects.partial_rebuild(obj.chef_tree.tree_id)
-        # set original_channel_id and source_channel_id to self since chef tree
-        obj.chef_tree.get_descendants(include_self=True).update(original_channel_id=channel_id,
-                                                                source_channel_id=channel_id)
-
-        # replace staging_tree with chef_tree
-        old_staging = obj.staging_tree
-        obj.staging_tree = obj.chef_tree
-        obj.chef_tree = None
-        obj.save()
-
-        # Prepare change event indicating a new staging_tree is available
-        event = generate_update_event(channel_id, CHANNEL, {
-            "root_id": obj.main_tree.id,
-            "staging_root_id": obj.staging_tree.id,
-        })
-
-        # Mark old staging tree for garbage collection
-        if old_staging and old_staging != obj.main_tree:
-            # IMPORTANT: Do not remove this block, MPTT updating the deleted chefs block could hang the server
-            with ContentNode.objects.disable_mptt_updates():
-                garbage_node = get_deleted_chefs_root()
-                old_staging.parent = garbage_node
-                old_staging.title = "Old staging tree for channel {}".format(obj.pk)
-                old_staging.save()
-
-        # If ricecooker --stage flag used, we're done (skip ACTIVATE step), else
-        # we ACTIVATE the channel, i.e., set the main tree from the staged tree
-        if not data.get('stage'):
-            try:
-                event = activate_channel(obj, request.user)
-            except PermissionDenied as e:
-                return Response(str(e), status=e.status_code)
-
-        # Send event (new staging tree or new main tree) to all channel editors
-        for editor in obj.editors.all():
-            add_event_for_user(editor.id, event)
+        task_info = get_commit_channel_task(obj)
+        if task_info is None:
+            if obj.chef_tree_id is None:
+                return HttpResponseBadRequest("No tree to commit for channel: {}".format(channel_id))
+            task, task_info = create_async_task(
+                "commit-channel",
+                request.user,
+                apply_async=bool(data.get('async')),
+                user_id=request.user.id,
+                channel_id=channel_id,
+                chef_tree_id=obj.chef_tree_id,
+                stage=bool(data.get('stage')),
+            )
+            task_info.refresh_from_db()
+            if task_info.status == "FAILURE" and isinstance(task.result, PermissionDenied):
+                return HttpResponseForbidden(str(task.result))
+            if task_info.status == "FAILURE":
+                return HttpResponseServerError(content=str(task.result), reason=str(task.result))
 
         # Send response back to the content integration script
-        return Response({
-            "success": True,
-            "new_channel": obj.pk,
-        })
+        return Response(get_commit_channel_status(task_info))
     except (Channel.DoesNotExist, PermissionDenied):
         return HttpResponseNotFound("No channel matching: {}".format(channel_id))
     except KeyError as e:
@@ -247,6 +235,55 @@ def api_commit_channel(request):
         return HttpResponseServerError(content=str(e), reason=str(e))
 
 
+@api_view(['GET'])
+@authentication_classes((TokenAuthentication, SessionAuthentication,))
+@permission_classes((IsAuthenticated,))
+def api_commit_channel_status(request):
+    """
+    Get the status and progress of the commit-channel task with the `task_id` query param.
+    This view backs the endpoint `/api/internal/finish_channel_status` polled by ricecooker.
+    """
+    task_id = request.query_params.get('task_id')
+    try:
+        task_info = Task.objects.get(task_id=task_id, task_type="commit-channel", user=request.user)
+        return Response(get_commit_channel_status(task_info))
+    except (Task.DoesNotExist, ValueError, ValidationError):
+        return HttpResponseNotFound("No commit matching: {}".format(task_id))
+    except Exception as e:
+        handle_server_error(request)
+        return HttpResponseServerError(content=str(e), reason=str(e))
+
+
+def get_commit_channel_task(channel):
+    """
+    Returns the commit-channel task of the current chef_tree of the channel, or of its last commit if the
+    chef_tree has already been committed, unless it failed and needs to be started again.
+    """
+    tasks = Task.objects.filter(task_type="commit-channel").exclude(status="FAILURE").order_by("-created")
+    if channel.chef_tree_id:
+        return tasks.filter(metadata__affects__chef_tree=channel.chef_tree_id).first()
+    return tasks.filter(metadata__affects__channel=channel.id).first()
+
+
+def get_commit_channel_status(task_info):
+    status = task_info.status
+    progress = task_info.metadata.get("progress")
+    if status not in ("SUCCESS", "FAILURE") and not settings.CELERY_TASK_ALWAYS_EAGER:
+        result = app.AsyncResult(str(task_info.task_id))
+        status = result.status
+        progress = get_task_progress(task_info.task_id)
+    commit_status = {
+        "success": status != "FAILURE",
+        "new_channel": task_info.metadata["affects"]["channel"],
+        "task_id": task_info.task_id,
+        "status": status,
+        "progress": progress,
+    }
+    if status == "FAILURE":
+        commit_status["error"] = task_info.metadata.get("error", {}).get("message")
+    return commit_status
+
+
 @api_view(['POST'])
 @authentication_classes((TokenAuthentication, SessionAuthentication,))
 @permission_classes((IsAuthenticated,))
@@ -524,63 +561,102 @@ def create_channel(channel_data, user):
 
 @trace
 def convert_data_to_nodes(user, content_data, parent_node):
-    """ Parse dict and create nodes accordingly """
+    """
+    Parse dict and create nodes accordingly, in bulk: the whole payload is validated and its
+    files checked before anything is created, and then the nodes, tags, assessment items,
+    slides and files are each created with a single insert.
+    """
     try:
-        root_mapping = {}
         parent_node = ContentNode.objects.get(pk=parent_node)
         sort_order = parent_node.children.count() + 1
-        existing_node_ids = ContentNode.objects.filter(parent_id=parent_node.pk).values_list('node_id', flat=True)
-        with transaction.atomic():
-            for node_data in content_data:
-                # Check if node id is already in the tree to avoid duplicates
-                if node_data['node_id'] not in existing_node_ids:
-                    # Create the node
-                    new_node = create_node(node_data, parent_node, sort_order)
-
-                    # Create files associated with node
-                    map_files_to_node(user, new_node, node_data['files'])
-
-                    # Create questions associated exercise nodes
-                    create_exercises(user, new_node, node_data['questions'])
-                    sort_order += 1
+        existing_node_ids = set(ContentNode.objects.filter(parent_id=parent_node.pk).values_list('node_id', flat=True))
+        # Skip nodes that are already in the tree to avoid duplicates
+        content_data = [node_data for node_data in content_data if node_data['node_id'] not in existing_node_ids]
 
-                    # Create Slideshow slides (if slideshow kind)
-                    if node_data['kind'] == 'slideshow':
-                        extra_fields_unicode = node_data['extra_fields']
+        lookups = get_ingest_lookups(content_data)
+        check_ingest_files_exist(content_data)
 
-                        # Extra Fields comes as type<unicode> - convert it to a dict and get slideshow_data
-                        extra_fields_json = extra_fields_unicode.encode("ascii", "ignore")
-                        extra_fields = json.loads(extra_fields_json)
+        nodes = []
+        for node_data in content_data:
+            nodes.append(build_node(node_data, parent_node, sort_order, lookups))
+            sort_order += 1
 
-                        slides = create_slides(user, new_node, extra_fields.get('slideshow_data'))
-                        map_files_to_slideshow_slide_item(user, new_node, slides, node_data["files"])
-
-                    # Track mapping between newly created node and node id
-                    root_mapping.update({node_data['node_id']: new_node.pk})
-            return root_mapping
+        with transaction.atomic():
+            ContentNode.objects.bulk_create(nodes)
+            create_node_tags(content_data, nodes, parent_node.get_channel())
+            files = []
+            assessment_items = create_exercises(content_data, nodes)
+            for node_data, node in zip(content_data, nodes):
+                files.extend(build_node_files(user, node, node_data['files'], lookups))
+            for question, assessment_item in assessment_items:
+                files.extend(build_assessment_item_files(user, assessment_item, question['files']))
+            for node_data, slides in create_slides(content_data, nodes):
+                files.extend(build_slide_files(user, slides, node_data['files']))
+            File.objects.bulk_create(files)
+
+        # Track mapping between newly created node and node id
+        return {node.node_id: node.pk for node in nodes}
 
     except KeyError as e:
         raise ObjectDoesNotExist("Error creating node: {0}".format(e))
 
 
-def create_node(node_data, parent_node, sort_order):
-    """ Generate node based on node dict """
-    # Make sure license is valid
-    license = None
-    license_name = node_data['license']
-    if license_name is not None:
-        try:
-            license = License.objects.get(license_name__iexact=license_name)
-        except ObjectDoesNotExist:
+def get_ingest_lookups(content_data):
+    """
+    Prefetch the licenses, languages and format presets that the nodes and their files can reference.
+    """
+    licenses = {license.license_name.lower(): license for license in License.objects.all()}
+    for node_data in content_data:
+        if node_data['license'] is not None and node_data['license'].lower() not in licenses:
             raise ObjectDoesNotExist("Invalid license found")
 
+    language_ids = set(
+        file_data['language'] for node_data in content_data for file_data in filter(None, node_data['files'])
+        if file_data.get('language')
+    )
+    presets = {preset.id: preset for preset in FormatPreset.objects.all()}
+    # The preset to guess from the extension of a file is the first displayed preset that allows it
+    guessed_presets = {}
+    for extension, preset_id in FormatPreset.objects.filter(display=True) \
+            .values_list('allowed_formats__extension', 'id').order_by('id'):
+        guessed_presets.setdefault(extension, presets[preset_id])
+
+    return {
+        'licenses': licenses,
+        'languages': set(Language.objects.filter(pk__in=language_ids).values_list('pk', flat=True)),
+        'presets': presets,
+        'guessed_presets': guessed_presets,
+    }
+
+
+def check_ingest_files_exist(content_data):
+    """
+    Check that all the files of the nodes, their questions and slides are in storage, in one batch.
+    """
+    filenames = set()
+    for node_data in content_data:
+        filenames.update(file_data['filename'] for file_data in filter(None, node_data['files']))
+        for question in node_data['questions']:
+            filenames.update(file_data['filename'] for file_data in filter(None, question['files']))
+    missing = get_file_diff(sorted(filenames))
+    if missing:
+        raise IOError('{} not found'.format(", ".join(missing)))
+
+
+def get_extra_fields(node_data):
     extra_fields = node_data['extra_fields'] or {}
     if isinstance(extra_fields, basestring):
         extra_fields = json.loads(extra_fields)
+    return extra_fields
+
 
-    node = ContentNode.objects.create(
+def build_node(node_data, parent_node, sort_order, lookups):
+    """ Generate node based on node dict, without saving it """
+    license_name = node_data['license']
+    license = lookups['licenses'][license_name.lower()] if license_name is not None else None
+
+    node = ContentNode(
         title=node_data['title'],
-        tree_id=parent_node.tree_id,
         kind_id=node_data['kind'],
         node_id=node_data['node_id'],
         content_id=node_data['content_id'],
@@ -592,36 +668,60 @@ def create_node(node_data, parent_node, sort_order):
         license_description=node_data.get('license_description'),
         copyright_holder=node_data.get('copyright_holder') or "",
         parent=parent_node,
-        extra_fields=extra_fields,
+        extra_fields=get_extra_fields(node_data),
         sort_order=sort_order,
         source_id=node_data.get('source_id'),
         source_domain=node_data.get('source_domain'),
         language_id=node_data.get('language'),
         freeze_authoring_data=True,
         role_visibility=node_data.get('role') or roles.LEARNER,
+        changed=True,
+        # MPTT updates are disabled while nodes are added to the chef tree, which is rebuilt
+        # when the channel is committed, so these are placeholders like MPTT itself sets
+        tree_id=parent_node.tree_id,
+        lft=parent_node.lft + 1,
+        rght=parent_node.lft + 2,
+        level=parent_node.level + 1,
     )
-    tags = []
-    channel = node.get_channel()
-    if 'tags' in node_data:
-        tag_data = node_data['tags']
-        if tag_data is not None:
-            for tag in tag_data:
-                tags.append(ContentTag.objects.get_or_create(tag_name=tag, channel=channel)[0])
-
-    if len(tags) > 0:
-        node.tags = tags
-        node.save()
 
+    # Set the thumbnail encoding before the node is created, rather than saving it again
+    for file_data in filter(None, node_data['files']):
+        preset = lookups['presets'].get(file_data['preset']) or \
+            lookups['guessed_presets'].get(os.path.splitext(file_data['filename'])[1].lstrip('.'))
+        if preset and preset.thumbnail:
+            node.thumbnail_encoding = json.dumps({
+                'base64': get_thumbnail_encoding(file_data['filename']),
+                'points': [],
+                'zoom': 0
+            })
     return node
 
 
-def create_exercises(user, node, data):
-    """ Generate exercise from data """
-    with transaction.atomic():
-        order = 0
-
-        for question in data:
-            question_obj = AssessmentItem(
+def create_node_tags(content_data, nodes, channel):
+    """ Create the tags of the nodes that the channel does not have yet, and tag the nodes """
+    tag_names = set(tag for node_data in content_data for tag in node_data.get('tags') or [])
+    if not tag_names:
+        return
+    tags = {tag.tag_name: tag for tag in ContentTag.objects.filter(channel=channel, tag_name__in=tag_names)}
+    new_tags = [ContentTag(tag_name=tag_name, channel=channel) for tag_name in tag_names if tag_name not in tags]
+    ContentTag.objects.bulk_create(new_tags)
+    tags.update((tag.tag_name, tag) for tag in new_tags)
+
+    ContentNode.tags.through.objects.bulk_create([
+        ContentNode.tags.through(contentnode_id=node.id, contenttag_id=tags[tag_name].id)
+        for node_data, node in zip(content_data, nodes)
+        for tag_name in set(node_data.get('tags') or [])
+    ])
+
+
+def create_exercises(content_data, nodes):
+    """ Generate the questions of the nodes, returning them with their question data """
+    questions = []
+    assessment_items = []
+    for node_data, node in zip(content_data, nodes):
+        for order, question in enumerate(node_data['questions']):
+            questions.append(question)
+            assessment_items.append(AssessmentItem(
                 type=question.get('type'),
                 question=question.get('question'),
                 hints=question.get('hints'),
@@ -632,21 +732,21 @@ def create_exercises(user, node, data):
                 raw_data=question.get('raw_data'),
                 source_url=question.get('source_url'),
                 randomize=question.get('randomize') or False,
-            )
-            order += 1
-            question_obj.save()
-            map_files_to_assessment_item(user, question_obj, question['files'])
-
-
-def create_slides(user, node, slideshow_data):
-    """ Generate SlideshowSlides from data """
-    """ Returns a collection of SlideshowSlide objects """
-
-    slides = []
-
-    with transaction.atomic():
-        for slide in slideshow_data:
-            slide_obj = SlideshowSlide(
+            ))
+    AssessmentItem.objects.bulk_create(assessment_items)
+    return list(zip(questions, assessment_items))
+
+
+def create_slides(content_data, nodes):
+    """ Generate the SlideshowSlides of the slideshow nodes, returning them by the node data """
+    slides_by_node = []
+    all_slides = []
+    for node_data, node in zip(content_data, nodes):
+        if node_data['kind'] != 'slideshow':
+            continue
+        slideshow_data = get_extra_fields(node_data).get('slideshow_data') or []
+        slides = [
+            SlideshowSlide(
                 contentnode=node,
                 sort_order=slide.get("sort_order"),
                 metadata={
@@ -656,7 +756,62 @@ def create_slides(user, node, slideshow_data):
                     "extension": slide.get('extension')
                 }
             )
-            slide_obj.save()
-            slides.append(slide_obj)
-
-    return slides
+            for slide in slideshow_data
+        ]
+        all_slides.extend(slides)
+        slides_by_node.append((node_data, slides))
+    SlideshowSlide.objects.bulk_create(all_slides)
+    return slides_by_node
+
+
+def build_file(user, file_data, checksum, ext, **kwargs):
+    file_obj = File(
+        checksum=checksum,
+        file_format_id=ext,
+        original_filename=file_data.get('original_filename') or 'file',
+        source_url=file_data.get('source_url'),
+        file_size=file_data['size'],
+        uploaded_by=user,
+        **kwargs
+    )
+    file_obj.file_on_disk.name = generate_object_storage_name(checksum, file_data['filename'])
+    return file_obj
+
+
+def build_node_files(user, node, data, lookups):
+    """ Generate files that reference the content node, without saving them """
+    files = []
+    for file_data in filter(None, data):
+        checksum, ext = os.path.splitext(file_data['filename'])
+        ext = ext.lstrip('.')
+        language_id = file_data.get('language')
+        if language_id and language_id not in lookups['languages']:
+            logging.warning("file_data with language {} does not exist.".format(language_id))
+            continue
+        # Determine a preset if none is given
+        preset = lookups['presets'].get(file_data['preset']) or lookups['guessed_presets'].get(ext)
+        files.append(build_file(user, file_data, checksum, ext, contentnode=node, preset=preset, language_id=language_id or None))
+    return files
+
+
+def build_assessment_item_files(user, assessment_item, data):
+    """ Generate files referenced in given assessment item, without saving them """
+    files = []
+    for file_data in filter(None, data):
+        checksum, ext = os.path.splitext(file_data['filename'])
+        # assessment_item-files always have a preset
+        files.append(build_file(user, file_data, checksum, ext.lstrip('.'), assessment_item=assessment_item, preset_id=file_data['preset']))
+    return files
+
+
+def build_slide_files(user, slides, data):
+    """ Generate files referenced in the slides of a slideshow node, without saving them """
+    slides_by_checksum = {slide.metadata["checksum"]: slide for slide in slides}
+    files = []
+    for file_data in data:
+        checksum, ext = os.path.splitext(file_data['filename'])
+        files.append(build_file(
+            user, file_data, checksum, ext.lstrip('.'),
+            slideshow_slide=slides_by_checksum.get(checksum), preset_id=file_data['preset'],
+        ))
+    return files
@@ -16,6 +16,7 @@ from contentcuration.viewsets.base import BulkModelSerializer
 from contentcuration.viewsets.base import BulkUpdateMixin
 from contentcuration.viewsets.base import RequiredFilterSet
 from contentcuration.viewsets.base import ValuesViewset
+from contentcuration.viewsets.common import SharedContentMixin
 from contentcuration.viewsets.common import UserFilteredPrimaryKeyRelatedField
 from contentcuration.viewsets.common import UUIDInFilter
 from contentcuration.viewsets.common import UUIDRegexField
@@ -193,7 +194,7 @@ class AssessmentItemSerializer(BulkModelSerializer):
 
 
 # Apply mixin first to override ValuesViewset
-class AssessmentItemViewSet(BulkCreateMixin, BulkUpdateMixin, ValuesViewset):
+class AssessmentItemViewSet(SharedContentMixin, BulkCreateMixin, BulkUpdateMixin, ValuesViewset):
     queryset = AssessmentItem.objects.all()
     serializer_class = AssessmentItemSerializer
     permission_classes = [IsAuthenticated]
@@ -216,3 +217,10 @@ class AssessmentItemViewSet(BulkCreateMixin, BulkUpdateMixin, ValuesViewset):
     field_map = {
         "contentnode": "contentnode_id",
     }
+
+    def prepare_changes(self, changes):
+        """
+        Materializes the shared items of the nodes of the changes before their permissions are checked.
+        Items are keyed by their node, so the copies made for the node have the same keys.
+        """
+        self.prepare_content_edit(change["key"][0] for change in changes)
@@ -1,12 +1,12 @@
 import traceback
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
 from django.http import Http404
 from django_bulk_update.helper import bulk_update
 from django_filters.constants import EMPTY_VALUES
 from django_filters.rest_framework import FilterSet
 from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.serializers import ListSerializer
 from rest_framework.serializers import ModelSerializer
@@ -20,7 +20,10 @@ from rest_framework.utils import html
 from rest_framework.utils import model_meta
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from contentcuration.permissions import get_edit_permissions
 from contentcuration.viewsets.common import MissingRequiredParamsException
+from contentcuration.viewsets.common import ValuesJSONRenderer
+from contentcuration.viewsets.sync.utils import get_key_lookup
 
 
 class SimpleReprMixin(object):
@@ -345,6 +348,30 @@ class BulkListSerializer(SimpleReprMixin, ListSerializer):
         return created_objects
 
 
+def compile_field_map(field_map):
+    """
+    Generates a function that applies field_map to a row from a values call,
+    with one statement for each entry of the field map, in order.
+
+    Source keys that are not in the row are set as constant values, which
+    item.pop(source_key, source_key) does without checking the row first.
+    """
+    lines = ["def map_fields(item):"]
+    namespace = {}
+    for i, (key, value) in enumerate(field_map.items()):
+        if callable(value):
+            namespace["value_{}".format(i)] = value
+            lines.append("    item[{!r}] = value_{}(item)".format(key, i))
+        elif isinstance(value, str):
+            lines.append("    item[{!r}] = item.pop({!r}, {!r})".format(key, value, value))
+        else:
+            namespace["value_{}".format(i)] = value
+            lines.append("    item[{!r}] = value_{}".format(key, i))
+    lines.append("    return item")
+    exec(compile("\n".join(lines), "<field_map>", "exec"), namespace)
+    return namespace["map_fields"]
+
+
 class ReadOnlyValuesViewset(SimpleReprMixin, ReadOnlyModelViewSet):
     """
     A viewset that uses a values call to get all model/queryset data in
@@ -352,6 +379,11 @@ class ReadOnlyValuesViewset(SimpleReprMixin, ReadOnlyModelViewSet):
     DRF ModelSerializer.
     """
 
+    renderer_classes = [ValuesJSONRenderer] + [
+        renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        if not issubclass(renderer, JSONRenderer)
+    ]
+
     # A tuple of values to get from the queryset
     values = None
     # A map of target_key, source_key where target_key is the final target_key that will be set
@@ -360,6 +392,10 @@ class ReadOnlyValuesViewset(SimpleReprMixin, ReadOnlyModelViewSet):
     # the value for the target_key. This callable can also pop unwanted values from the obj
     # to remove unneeded keys from the object as a side effect.
     field_map = {}
+    # A map of returned fields that are expensive to compute, to the values they are computed from.
+    # When the fields query parameter is passed, the values for the fields it does not include are
+    # not fetched, so that annotate_queryset can skip computing them, and the fields are not returned.
+    deferred_fields = {}
 
     def __init__(self, *args, **kwargs):
         viewset = super(ReadOnlyValuesViewset, self).__init__(*args, **kwargs)
@@ -368,7 +404,6 @@ class ReadOnlyValuesViewset(SimpleReprMixin, ReadOnlyModelViewSet):
         self._values = tuple(self.values)
         if not isinstance(self.field_map, dict):
             raise TypeError("field_map must be defined as a dict")
-        self._field_map = self.field_map.copy()
         return viewset
 
     @classmethod
@@ -446,10 +481,24 @@ class ReadOnlyValuesViewset(SimpleReprMixin, ReadOnlyModelViewSet):
         queryset = super(ReadOnlyValuesViewset, self).get_queryset()
         if self.request.user.is_admin:
             return queryset
+        permissions = get_edit_permissions(self.request)
+        if permissions.can_filter(queryset.model):
+            return permissions.filter_edit_queryset(queryset)
         if hasattr(queryset.model, "filter_edit_queryset"):
             return queryset.model.filter_edit_queryset(queryset, self.request.user)
         return self.get_queryset()
 
+    def get_edit_objects_from_keys(self, keys):
+        """
+        Returns the objects that the user can edit for keys, in a dict by the lookup
+        of their key, from a single query.
+        """
+        id_attr = self.id_attr()
+        queryset = self.filter_queryset_from_keys(self.get_edit_queryset(), keys).order_by()
+        if isinstance(id_attr, str):
+            return {get_key_lookup(getattr(obj, id_attr)): obj for obj in queryset}
+        return {get_key_lookup([getattr(obj, attr) for attr in id_attr]): obj for obj in queryset}
+
     def _get_lookup_filter(self):
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
 
@@ -492,25 +541,58 @@ class ReadOnlyValuesViewset(SimpleReprMixin, ReadOnlyModelViewSet):
     def prefetch_queryset(self, queryset):
         return queryset
 
+    def get_deferred_fields(self):
+        """
+        Returns the deferred fields that were not requested with the fields query parameter,
+        or none of them when it is not passed.
+        """
+        request = getattr(self, "request", None)
+        fields = request.query_params.get("fields") if request is not None else None
+        if fields is None:
+            return frozenset()
+        requested = set(fields.split(","))
+        return frozenset(field for field in self.deferred_fields if field not in requested)
+
+    def get_deferred_values(self):
+        """
+        Returns the values that only the deferred fields that were not requested are computed from.
+        """
+        deferred_fields = self.get_deferred_fields()
+        deferred = set()
+        needed = set()
+        for field, values in self.deferred_fields.items():
+            (deferred if field in deferred_fields else needed).update(values)
+        return deferred - needed
+
+    @classmethod
+    def _get_field_mapper(cls, deferred_fields=frozenset()):
+        """
+        Returns the field map of the class compiled into a function that maps a single row,
+        so that the field map does not have to be interpreted again for every row.
+        Compiled once per class and set of deferred fields, which are left out of the map.
+        """
+        if "_field_mappers" not in cls.__dict__:
+            cls._field_mappers = {}
+        if deferred_fields not in cls._field_mappers:
+            cls._field_mappers[deferred_fields] = compile_field_map(
+                {key: value for key, value in cls.field_map.items() if key not in deferred_fields}
+            )
+        return cls._field_mappers[deferred_fields]
+
     def _map_fields(self, item):
-        for key, value in self._field_map.items():
-            if callable(value):
-                item[key] = value(item)
-            elif value in item:
-                item[key] = item.pop(value)
-            else:
-                item[key] = value
-        return item
+        return self._get_field_mapper(self.get_deferred_fields())(item)
 
     def consolidate(self, items, queryset):
         return items
 
     def _cast_queryset_to_values(self, queryset):
         queryset = self.annotate_queryset(queryset)
-        return queryset.values(*self._values)
+        deferred_values = self.get_deferred_values()
+        return queryset.values(*[value for value in self._values if value not in deferred_values])
 
     def serialize(self, queryset):
-        return self.consolidate(list(map(self._map_fields, queryset or [])), queryset)
+        map_fields = self._get_field_mapper(self.get_deferred_fields())
+        return self.consolidate(list(map(map_fields, queryset or [])), queryset)
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.prefetch_queryset(self.get_queryset()))
@@ -592,16 +674,13 @@ class DestroyModelMixin(object):
     def delete_from_changes(self, changes):
         errors = []
         changes_to_return = []
-        queryset = self.get_edit_queryset().order_by()
+        instances = self.get_edit_objects_from_keys([change["key"] for change in changes])
         for change in changes:
-            try:
-                instance = queryset.get(**dict(self.values_from_key(change["key"])))
-
+            instance = instances.pop(get_key_lookup(change["key"]), None)
+            # If the object already doesn't exist, as far as the user is concerned
+            # job done!
+            if instance is not None:
                 self.perform_destroy(instance)
-            except ObjectDoesNotExist:
-                # If the object already doesn't exist, as far as the user is concerned
-                # job done!
-                pass
         return errors, changes_to_return
 
 
@@ -618,25 +697,25 @@ class UpdateModelMixin(object):
     def update_from_changes(self, changes):
         errors = []
         changes_to_return = []
-        queryset = self.get_edit_queryset().order_by()
+        instances = self.get_edit_objects_from_keys([change["key"] for change in changes])
         for change in changes:
-            try:
-                instance = queryset.get(**dict(self.values_from_key(change["key"])))
-                serializer = self.get_serializer(
-                    instance, data=self._map_update_change(change), partial=True
-                )
-                if serializer.is_valid():
-                    self.perform_update(serializer)
-                    if serializer.changes:
-                        changes_to_return.extend(serializer.changes)
-                else:
-                    change.update({"errors": serializer.errors})
-                    errors.append(change)
-            except ObjectDoesNotExist:
+            instance = instances.get(get_key_lookup(change["key"]))
+            if instance is None:
                 # Should we also check object permissions here and return a different
                 # error if the user can view the object but not edit it?
                 change.update({"errors": ValidationError("Not found").detail})
                 errors.append(change)
+                continue
+            serializer = self.get_serializer(
+                instance, data=self._map_update_change(change), partial=True
+            )
+            if serializer.is_valid():
+                self.perform_update(serializer)
+                if serializer.changes:
+                    changes_to_return.extend(serializer.changes)
+            else:
+                change.update({"errors": serializer.errors})
+                errors.append(change)
         return errors, changes_to_return
 
     def update(self, request, *args, **kwargs):
@@ -42,19 +42,22 @@ from contentcuration.viewsets.base import RequiredFilterSet
 from contentcuration.viewsets.base import ValuesViewset
 from contentcuration.viewsets.common import CatalogPaginator
 from contentcuration.viewsets.common import ContentDefaultsSerializer
+from contentcuration.viewsets.common import KeysetPaginationMixin
 from contentcuration.viewsets.common import SQCount
 from contentcuration.viewsets.common import UUIDInFilter
 from contentcuration.viewsets.sync.constants import CHANNEL
 from contentcuration.viewsets.sync.utils import generate_update_event
 
 
-class CatalogListPagination(PageNumberPagination):
+class CatalogListPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = None
     page_size_query_param = "page_size"
     max_page_size = 1000
     django_paginator_class = CatalogPaginator
 
     def get_paginated_response(self, data):
+        if self.keyset:
+            return super(CatalogListPagination, self).get_paginated_response(data)
         return Response(
             {
                 "next": self.get_next_link(),
@@ -1,11 +1,17 @@
+import base64
+import json
 import re
+from collections import OrderedDict
 
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.contrib.postgres.fields import ArrayField
 from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
 from django.db.models import CharField
 from django.db.models import IntegerField
 from django.db.models import Manager
+from django.db.models import Q
 from django.db.models import Subquery
 from django.db.models.query import QuerySet
 from django.forms.fields import UUIDField
@@ -15,16 +21,28 @@ from django_filters.rest_framework import BaseInFilter
 from django_filters.rest_framework import Filter
 from rest_framework import serializers
 from rest_framework.exceptions import APIException
+from rest_framework.exceptions import NotFound
 from rest_framework.fields import empty
 from rest_framework.relations import MANY_RELATION_KWARGS
 from rest_framework.relations import ManyRelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 from rest_framework.serializers import PrimaryKeyRelatedField
 from rest_framework.serializers import RegexField
 from rest_framework.serializers import ValidationError
 from rest_framework.utils import html
+from rest_framework.utils.urls import remove_query_param
+from rest_framework.utils.urls import replace_query_param
 
+from contentcuration.models import ContentNode
 from contentcuration.models import DEFAULT_CONTENT_DEFAULTS
 from contentcuration.models import License
+from contentcuration.permissions import get_edit_permissions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 class MissingRequiredParamsException(APIException):
@@ -177,6 +195,167 @@ class CatalogPaginator(Paginator):
         return self.object_list.order_by().values("id").count()
 
 
+# Below this many estimated rows, counting exactly is cheap enough to do instead
+ESTIMATED_COUNT_THRESHOLD = 1000
+
+
+def get_estimated_count(queryset):
+    """
+    Returns the number of rows the Postgres planner estimates the queryset will return,
+    read from the plan of the query rather than by running it, so it does not depend on
+    the number of rows. When the estimate is small, the exact count is returned instead.
+    """
+    queryset = queryset.order_by().values("id")
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < ESTIMATED_COUNT_THRESHOLD:
+        return queryset.count()
+    return estimate
+
+
+def get_ordering(queryset):
+    """
+    Returns the ordering of the queryset as (field name, descending) tuples, ending with
+    the pk so that every row has a unique position in it.
+    """
+    query = queryset.query
+    if query.order_by:
+        ordering = query.order_by
+    elif query.default_ordering:
+        ordering = query.get_meta().ordering
+    else:
+        ordering = []
+    fields = []
+    for field in ordering:
+        if not isinstance(field, str) or field == "?":
+            raise NotFound("Keyset pagination requires ordering by field names")
+        name = field.lstrip("-")
+        fields.append(("id" if name == "pk" else name, field.startswith("-")))
+    if "id" not in [name for name, descending in fields]:
+        fields.append(("id", fields[-1][1] if fields else False))
+    return fields
+
+
+def get_keyset_filter(ordering, position):
+    """
+    Returns a filter for the rows that come after the position, the values of the row
+    for the ordering, in that ordering. Nulls are placed like Postgres does: after all
+    other values when ascending, and before them when descending.
+    """
+    query = Q(pk__in=[])
+    equal = Q()
+    for (name, descending), value in zip(ordering, position):
+        if value is None:
+            after = Q(**{"{}__isnull".format(name): False}) if descending else None
+            same = Q(**{"{}__isnull".format(name): True})
+        elif descending:
+            after = Q(**{"{}__lt".format(name): value})
+            same = Q(**{name: value})
+        else:
+            after = Q(**{"{}__gt".format(name): value}) | Q(**{"{}__isnull".format(name): True})
+            same = Q(**{name: value})
+        if after is not None:
+            query |= equal & after
+        equal &= same
+    return query
+
+
+class KeysetPaginationMixin(object):
+    """
+    Mixin for the pagination classes of the values viewsets, that paginates with an opaque
+    cursor of the position of the last row in the ordering of the queryset, plus the pk,
+    when the cursor query parameter is passed, as an empty string for the first page.
+    Each page is then fetched by filtering on the position instead of with an offset,
+    so that deep pages cost the same as the first one. The count returned is estimated.
+    Without the cursor parameter, the page number pagination of the class is used.
+    """
+
+    cursor_query_param = "cursor"
+
+    def get_keyset_page_size(self, request):
+        return self.get_page_size(request) or self.max_page_size or self.page_size
+
+    def encode_cursor(self, position, reverse=False):
+        data = json.dumps([position, reverse], cls=DjangoJSONEncoder)
+        cursor = base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params[self.cursor_query_param]
+        if not cursor:
+            return None, False
+        try:
+            position, reverse = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+        return position, bool(reverse)
+
+    def get_count(self, queryset):
+        return get_estimated_count(queryset)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super(KeysetPaginationMixin, self).paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        page_size = self.get_keyset_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        ordering = get_ordering(queryset)
+        if position is not None and len(position) != len(ordering):
+            raise NotFound("Invalid cursor")
+        self.count = self.get_count(queryset)
+
+        names = [name for name, descending in ordering]
+        if reverse:
+            ordering = [(name, not descending) for name, descending in ordering]
+        if position is not None:
+            queryset = queryset.filter(get_keyset_filter(ordering, position))
+        queryset = queryset.order_by(*[("-" if descending else "") + name for name, descending in ordering])
+        # Fetch the ordering fields with the rows, to read the positions of the cursors from
+        fields = list(queryset._fields)
+        extra = [name for name in names if name not in fields]
+        rows = list(queryset.values(*(fields + extra))[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.set_links(rows, names, has_more, position is not None, reverse)
+        for row in rows:
+            for name in extra:
+                row.pop(name)
+        return rows
+
+    def set_links(self, rows, names, has_more, has_position, reverse):
+        self.next_link = self.previous_link = None
+        if rows:
+            if has_more or reverse:
+                self.next_link = self.encode_cursor([rows[-1][name] for name in names])
+            if (has_more and reverse) or (has_position and not reverse):
+                self.previous_link = self.encode_cursor([rows[0][name] for name in names], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super(KeysetPaginationMixin, self).get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.next_link),
+                    ("previous", self.previous_link),
+                    ("count", self.count),
+                    ("results", data),
+                ]
+            )
+        )
+
+
 uuidregex = re.compile("^[0-9a-f]{32}$")
 
 
@@ -246,3 +425,92 @@ class UserFilteredPrimaryKeyRelatedField(PrimaryKeyRelatedField):
                 "UserFilteredPrimaryKeyRelatedField used on queryset for model that does not have filter_edit_queryset method"
             )
         return queryset
+
+
+class SharedContentMixin(object):
+    """
+    For the viewsets of the files and assessment items of content nodes. Nodes imported from another channel
+    share the files and assessment items of the node they were imported from, through their content_source,
+    until they are first edited. Those are listed as belonging to the nodes that share them, and are
+    materialized for the nodes before the changes to them are made.
+    """
+
+    def _get_requested_node_ids(self):
+        node_ids = []
+        for param in ("contentnode", "contentnode__in"):
+            value = self.request.query_params.get(param)
+            if value:
+                node_ids.extend(value.split(","))
+        return node_ids
+
+    def filter_queryset(self, queryset):
+        filtered = super(SharedContentMixin, self).filter_queryset(queryset)
+        self._content_references = {}
+        node_ids = self._get_requested_node_ids()
+        if not node_ids:
+            return filtered
+        references = ContentNode.objects.filter(pk__in=node_ids, content_source__isnull=False)
+        if not self.request.user.is_admin:
+            references = ContentNode.filter_view_queryset(references, self.request.user)
+        for node_id, source_id in references.values_list("id", "content_source_id"):
+            self._content_references.setdefault(source_id, []).append(node_id)
+        if not self._content_references:
+            return filtered
+        return filtered | self.queryset.filter(contentnode_id__in=self._content_references)
+
+    def consolidate(self, items, queryset):
+        items = super(SharedContentMixin, self).consolidate(items, queryset)
+        references = getattr(self, "_content_references", None)
+        if not references:
+            return items
+        requested_node_ids = set(self._get_requested_node_ids())
+        consolidated = []
+        for item in items:
+            if item["contentnode"] in requested_node_ids:
+                consolidated.append(item)
+            for node_id in references.get(item["contentnode"], []):
+                consolidated.append(dict(item, contentnode=node_id))
+        return consolidated
+
+    def get_editable_node_ids(self, node_ids):
+        queryset = ContentNode.objects.filter(pk__in=node_ids)
+        if not self.request.user.is_admin:
+            queryset = get_edit_permissions(self.request).filter_edit_queryset(queryset)
+        return set(queryset.values_list("id", flat=True))
+
+    def prepare_content_edit(self, node_ids):
+        """
+        Materializes the shared content of the nodes the user can edit out of node_ids, and of the nodes that
+        share the content of those. Returns the ids of the copies made for the nodes out of node_ids, by the id
+        of the node and the id of the file or assessment item they were copied from.
+        """
+        node_ids = set(node_id for node_id in node_ids if node_id)
+        if not node_ids:
+            return {}
+        editable_node_ids = self.get_editable_node_ids(node_ids)
+        if not editable_node_ids:
+            return {}
+        copy_ids = ContentNode.objects.prepare_content_edit(editable_node_ids)
+        return {key: copy_id for key, copy_id in copy_ids.items() if key[0] in editable_node_ids}
+
+
+class ValuesJSONRenderer(JSONRenderer):
+    """
+    Renders the plain lists and dicts built by the values viewsets with orjson,
+    which encodes them several times faster than the json module.
+    Values orjson does not handle itself, like datetimes, are encoded the same way as by DRF.
+    If orjson can't be imported, and for indented responses, the DRF JSON renderer is used.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super(ValuesJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:
+            # orjson is stricter about some values, like integers over 64 bits
+            return super(ValuesJSONRenderer, self).render(data, accepted_media_type, renderer_context)
@@ -3,11 +3,16 @@ from functools import reduce
 
 from django.conf import settings
 from django.db import IntegrityError
+from django.db.models import BooleanField
+from django.db.models import Case
 from django.db.models import Exists
 from django.db.models import F
 from django.db.models import OuterRef
 from django.db.models import Q
 from django.db.models import Subquery
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Coalesce
 from django.http import Http404
 from django_filters.rest_framework import CharFilter
 from django_filters.rest_framework import DjangoFilterBackend
@@ -27,10 +32,12 @@ from rest_framework.viewsets import ViewSet
 from contentcuration.models import AssessmentItem
 from contentcuration.models import Channel
 from contentcuration.models import ContentNode
+from contentcuration.models import ContentNodeTreeStats
 from contentcuration.models import ContentTag
 from contentcuration.models import File
 from contentcuration.models import generate_storage_url
 from contentcuration.models import PrerequisiteContentRelationship
+from contentcuration.permissions import get_edit_permissions
 from contentcuration.tasks import create_async_task
 from contentcuration.viewsets.base import BulkListSerializer
 from contentcuration.viewsets.base import BulkModelSerializer
@@ -166,11 +173,19 @@ class ContentNodeListSerializer(BulkListSerializer):
 
     def update(self, queryset, all_validated_data):
         tags = self.gather_tags(all_validated_data)
+        # The nodes are not saved, so their tree stats have to be updated here
+        updated = set(key for obj in all_validated_data for key in obj)
+        stats_fields = [
+            field for field in ContentNodeTreeStats.node_fields if field.replace("_id", "") in updated
+        ]
+        old_values = ContentNodeTreeStats.get_old_values(queryset) if stats_fields else {}
         all_objects = super(ContentNodeListSerializer, self).update(
             queryset, all_validated_data
         )
         if tags:
             set_tags(tags)
+        if stats_fields:
+            ContentNodeTreeStats.nodes_updated(all_objects, old_values, stats_fields)
         return all_objects
 
 
@@ -276,6 +291,18 @@ def retrieve_thumbail_src(item):
     return None
 
 
+def tree_stats_flag(count_field, default):
+    """
+    Whether the count in the tree stats of the node is more than zero, or default for nodes without tree stats.
+    """
+    return Case(
+        When(**{"tree_stats__{}__gt".format(count_field): 0, "then": Value(True)}),
+        When(tree_stats__isnull=False, then=Value(False)),
+        default=default,
+        output_field=BooleanField(),
+    )
+
+
 def get_title(item):
     # If it's the root, use the channel name (should be original channel name)
     return item["title"] if item["parent_id"] else item["original_channel_name"]
@@ -306,9 +333,8 @@ class PrerequisitesUpdateHandler(ViewSet):
     def _check_permissions(self, changes):
         # Filter the passed in contentondes, on both side of the relationship
         allowed_contentnodes = set(
-            ContentNode.filter_edit_queryset(
-                ContentNode.objects.all(), self.request.user
-            )
+            get_edit_permissions(self.request)
+            .filter_edit_queryset(ContentNode.objects.all())
             .filter(
                 id__in=list(map(lambda x: x["key"][0], changes))
                 + list(map(lambda x: x["key"][1], changes))
@@ -495,6 +521,24 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
         "parent": "parent_id",
     }
 
+    deferred_fields = {
+        "resource_count": ("resource_count",),
+        "coach_count": ("coach_count",),
+        "assessment_item_count": ("assessment_item_count",),
+        "error_count": ("error_count",),
+        "has_updated_descendants": ("has_updated_descendants",),
+        "has_new_descendants": ("has_new_descendants",),
+        "has_children": ("has_children",),
+        "thumbnail_src": ("thumbnail_checksum", "thumbnail_extension"),
+        "original_channel_name": ("original_channel_name",),
+        # Root nodes are titled with the channel name
+        "title": ("original_channel_name",),
+        "original_parent_id": ("original_parent_id",),
+        "original_node_id": ("original_node_id",),
+        "root_id": ("root_id",),
+        "tags": ("content_tags",),
+    }
+
     def _annotate_channel_id(self, queryset):
         return queryset.annotate(
             channel_id=Subquery(channel_query.values_list("id", flat=True)[:1])
@@ -540,7 +584,11 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
         )
 
     def annotate_queryset(self, queryset):
-        queryset = queryset.annotate(total_count=(F("rght") - F("lft") - 1) / 2)
+        queryset = queryset.annotate(
+            total_count=(F("rght") - F("lft") - 1) / 2,
+            # Imported nodes may share the files and assessment items of their content_source
+            content_owner_id=Coalesce("content_source_id", "id"),
+        )
 
         descendant_resources = (
             ContentNode.objects.filter(
@@ -568,7 +616,7 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
         changed_descendants = descendant_resources.filter(changed=True)
 
         thumbnails = File.objects.filter(
-            contentnode=OuterRef("id"), preset__thumbnail=True
+            contentnode=OuterRef("content_owner_id"), preset__thumbnail=True
         )
         original_channel = Channel.objects.filter(
             Q(pk=OuterRef("original_channel_id"))
@@ -583,23 +631,37 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
         ).values_list("id", flat=True)[:1]
 
         assessment_items = (
-            AssessmentItem.objects.filter(contentnode_id=OuterRef("id"), deleted=False)
+            AssessmentItem.objects.filter(
+                contentnode_id=OuterRef("content_owner_id"), deleted=False
+            )
             .values_list("assessment_id", flat=True)
             .distinct()
         )
 
-        queryset = queryset.annotate(
-            resource_count=SQCount(descendant_resources, field="id"),
-            coach_count=SQCount(
-                descendant_resources.filter(role_visibility=roles.COACH), field="id",
+        # Read the descendant counts from the tree stats of the node, and only scan
+        # the descendants for nodes that do not have tree stats yet
+        annotations = dict(
+            resource_count=Coalesce(
+                F("tree_stats__resource_count"),
+                SQCount(descendant_resources, field="id"),
+            ),
+            coach_count=Coalesce(
+                F("tree_stats__coach_count"),
+                SQCount(
+                    descendant_resources.filter(role_visibility=roles.COACH), field="id",
+                ),
             ),
             assessment_item_count=SQCount(assessment_items, field="assessment_id"),
-            error_count=SQCount(descendant_errors, field="id"),
-            has_updated_descendants=Exists(
-                changed_descendants.filter(published=True).values("id")
+            error_count=Coalesce(
+                F("tree_stats__error_count"), SQCount(descendant_errors, field="id"),
             ),
-            has_new_descendants=Exists(
-                changed_descendants.filter(published=False).values("id")
+            has_updated_descendants=tree_stats_flag(
+                "updated_count",
+                Exists(changed_descendants.filter(published=True).values("id")),
+            ),
+            has_new_descendants=tree_stats_flag(
+                "new_count",
+                Exists(changed_descendants.filter(published=False).values("id")),
             ),
             thumbnail_checksum=Subquery(thumbnails.values("checksum")[:1]),
             thumbnail_extension=Subquery(
@@ -612,18 +674,27 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
                 ContentNode.objects.filter(parent=OuterRef("id")).values("pk")
             ),
             root_id=Subquery(root_id),
+            content_tags=NotNullMapArrayAgg("tags__tag_name"),
+        )
+        deferred_values = self.get_deferred_values()
+        return queryset.annotate(
+            **{
+                name: annotation
+                for name, annotation in annotations.items()
+                if name not in deferred_values
+            }
         )
-        queryset = queryset.annotate(content_tags=NotNullMapArrayAgg("tags__tag_name"))
-
-        return queryset
 
-    def validate_targeting_args(self, target, position):
+    def validate_targeting_args(self, target, position, targets=None):
+        """
+        Returns the target node and the position, looking the target up in `targets` if they have been fetched already.
+        """
         position = position or "last-child"
         if target is None:
             raise ValidationError("A target must be specified")
         try:
-            target = self.get_edit_queryset().get(pk=target)
-        except ContentNode.DoesNotExist:
+            target = self.get_edit_queryset().get(pk=target) if targets is None else targets[target]
+        except (ContentNode.DoesNotExist, KeyError):
             raise ValidationError("Target: {} does not exist".format(target))
         except ValueError:
             raise ValidationError("Invalid target specified: {}".format(target))
@@ -636,43 +707,41 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
         return target, position
 
     def move_from_changes(self, changes):
+        """
+        Makes all the moves together, so that the trees are locked and their lft and rght values
+        shifted once rather than for each move, and returns an update of the parent of each moved node.
+        """
         errors = []
         changes_to_return = []
+        keys = [move["key"] for move in changes] + [move["target"] for move in changes if move.get("target")]
+        nodes = self.get_edit_queryset().in_bulk(keys)
+        moves = []
+        valid_changes = []
         for move in changes:
             # Move change will have key, must also have target property
             # optionally can include the desired position.
-            move_error, move_change = self.move(
-                move["key"], target=move.get("target"), position=move.get("position")
-            )
+            try:
+                if move["key"] not in nodes:
+                    raise ValidationError("Specified node does not exist")
+                target, position = self.validate_targeting_args(move.get("target"), move.get("position"), targets=nodes)
+            except ValidationError as e:
+                move.update({"errors": [str(e)]})
+                errors.append(move)
+                continue
+            moves.append((nodes[move["key"]], target, position))
+            valid_changes.append(move)
+
+        for move, (node, target, position), move_error in zip(
+            valid_changes, moves, ContentNode.objects.move_nodes(moves)
+        ):
             if move_error:
                 move.update({"errors": [move_error]})
                 errors.append(move)
-            if move_change:
-                changes_to_return.append(move_change)
-        return errors, changes_to_return
-
-    def move(self, pk, target=None, position=None):
-        try:
-            contentnode = self.get_edit_queryset().get(pk=pk)
-        except ContentNode.DoesNotExist:
-            error = ValidationError("Specified node does not exist")
-            return str(error), None
-
-        try:
-            target, position = self.validate_targeting_args(target, position)
-            try:
-                contentnode.move_to(target, position)
-            except ValueError:
-                raise ValidationError(
-                    "Invalid position argument specified: {}".format(position)
+            else:
+                changes_to_return.append(
+                    generate_update_event(node.id, CONTENTNODE, {"parent": node.parent_id})
                 )
-
-            return (
-                None,
-                None,
-            )
-        except ValidationError as e:
-            return str(e), None
+        return errors, changes_to_return
 
     def copy_from_changes(self, changes):
         errors = []
@@ -696,6 +765,7 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
         position=None,
         mods=None,
         excluded_descendants=None,
+        lazy=False,
         **kwargs
     ):
         try:
@@ -725,6 +795,9 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
             "mods": mods,
             "excluded_descendants": excluded_descendants,
             "position": position,
+            # Lazy copies share the files and assessment items of the nodes they
+            # are copied from until they are edited, rather than copying them
+            "lazy": bool(lazy),
         }
 
         task, task_info = create_async_task(
@@ -9,6 +9,7 @@ from rest_framework.response import Response
 
 from contentcuration.models import AssessmentItem
 from contentcuration.models import ContentNode
+from contentcuration.models import ContentNodeTreeStats
 from contentcuration.models import File
 from contentcuration.models import generate_object_storage_name
 from contentcuration.models import generate_storage_url
@@ -19,8 +20,12 @@ from contentcuration.viewsets.base import BulkModelSerializer
 from contentcuration.viewsets.base import BulkUpdateMixin
 from contentcuration.viewsets.base import ReadOnlyValuesViewset
 from contentcuration.viewsets.base import RequiredFilterSet
+from contentcuration.viewsets.common import SharedContentMixin
 from contentcuration.viewsets.common import UserFilteredPrimaryKeyRelatedField
 from contentcuration.viewsets.common import UUIDInFilter
+from contentcuration.viewsets.sync.constants import FILE
+from contentcuration.viewsets.sync.utils import generate_create_event
+from contentcuration.viewsets.sync.utils import generate_delete_event
 
 
 class FileFilter(RequiredFilterSet):
@@ -40,6 +45,21 @@ class FileFilter(RequiredFilterSet):
         )
 
 
+class FileListSerializer(BulkListSerializer):
+    def update(self, queryset, all_validated_data):
+        # The files are not saved, so the sizes of files given to other nodes have to be moved here
+        moved = any("contentnode" in obj for obj in all_validated_data)
+        old_values = (
+            {row["id"]: row for row in queryset.order_by().values("id", "contentnode_id", "file_size")}
+            if moved
+            else {}
+        )
+        all_objects = super(FileListSerializer, self).update(queryset, all_validated_data)
+        if moved:
+            ContentNodeTreeStats.files_updated(all_objects, old_values)
+        return all_objects
+
+
 class FileSerializer(BulkModelSerializer):
     contentnode = UserFilteredPrimaryKeyRelatedField(
         queryset=ContentNode.objects.all(), required=False
@@ -57,7 +77,7 @@ class FileSerializer(BulkModelSerializer):
             "assessment_item",
             "preset",
         )
-        list_serializer_class = BulkListSerializer
+        list_serializer_class = FileListSerializer
 
 
 def retrieve_storage_url(item):
@@ -65,7 +85,7 @@ def retrieve_storage_url(item):
     return generate_storage_url("{}.{}".format(item["checksum"], item["file_format"]))
 
 
-class FileViewSet(BulkDeleteMixin, BulkUpdateMixin, ReadOnlyValuesViewset):
+class FileViewSet(SharedContentMixin, BulkDeleteMixin, BulkUpdateMixin, ReadOnlyValuesViewset):
     queryset = File.objects.all()
     serializer_class = FileSerializer
     permission_classes = [IsAuthenticated]
@@ -94,6 +114,47 @@ class FileViewSet(BulkDeleteMixin, BulkUpdateMixin, ReadOnlyValuesViewset):
         "assessment_item": "assessment_item_id",
     }
 
+    def prepare_changes(self, changes):
+        """
+        Materializes the shared files of the nodes the changes are made through, before their permissions are
+        checked. Shared files are listed under each node that shares them, so the client sends the node a file
+        is listed under along with the changes to it. Changes made through a node that shares the file are made
+        to the copy for that node instead. Changes made through the node the file belongs to are made once the
+        file has been copied for the nodes that share it.
+        """
+        file_nodes = {
+            file_id: node_id or item_node_id
+            for file_id, node_id, item_node_id in File.objects.filter(
+                id__in=[change["key"] for change in changes]
+            ).values_list("id", "contentnode_id", "assessment_item__contentnode_id")
+        }
+        through = {
+            change["key"]: change.get("contentnode") or file_nodes.get(change["key"])
+            for change in changes
+        }
+        node_ids = set(through.values())
+        node_ids.update(change.get("mods", {}).get("contentnode") for change in changes)
+        copies = self.prepare_content_edit(node_ids)
+        self.copied_files = {copy_id: file_id for (_node_id, file_id), copy_id in copies.items()}
+        for change in changes:
+            copy_id = copies.get((through[change["key"]], change["key"]))
+            if copy_id:
+                change["key"] = copy_id
+
+    def get_prepared_changes(self):
+        """
+        Swaps the shared files the client has for the copies made for the nodes they were listed under.
+        """
+        copied_files = getattr(self, "copied_files", None)
+        if not copied_files:
+            return []
+        changes = []
+        queryset = self._cast_queryset_to_values(self.get_queryset().filter(id__in=list(copied_files)))
+        for obj in self.serialize(queryset):
+            changes.append(generate_delete_event(copied_files[obj["id"]], FILE))
+            changes.append(generate_create_event(obj["id"], FILE, obj))
+        return changes
+
     @list_route(methods=["post"])
     def upload_url(self, request):
         try:
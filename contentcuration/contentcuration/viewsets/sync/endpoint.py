@@ -6,9 +6,11 @@ bulk creates, updates, and deletes.
 import logging
 import time
 from collections import OrderedDict
+from copy import deepcopy
 from itertools import groupby
 
 from django.conf import settings
+from django.db import transaction
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view
@@ -16,12 +18,16 @@ from rest_framework.decorators import authentication_classes
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.serializers import ValidationError
 from rest_framework.status import HTTP_207_MULTI_STATUS
 from rest_framework.status import HTTP_400_BAD_REQUEST
 from search.viewsets.savedsearch import SavedSearchViewSet
 
 from contentcuration.utils.sentry import report_exception
 from contentcuration.viewsets.assessmentitem import AssessmentItemViewSet
+from contentcuration.viewsets.base import DestroyModelMixin
+from contentcuration.viewsets.base import ReadOnlyValuesViewset
+from contentcuration.viewsets.base import UpdateModelMixin
 from contentcuration.viewsets.channel import ChannelViewSet
 from contentcuration.viewsets.channelset import ChannelSetViewSet
 from contentcuration.viewsets.clipboard import ClipboardViewSet
@@ -47,7 +53,8 @@ from contentcuration.viewsets.sync.constants import TASK
 from contentcuration.viewsets.sync.constants import UPDATED
 from contentcuration.viewsets.sync.constants import USER
 from contentcuration.viewsets.sync.constants import VIEWER_M2M
-from contentcuration.viewsets.sync.utils import get_and_clear_user_events
+from contentcuration.viewsets.sync.utils import get_key_lookup
+from contentcuration.viewsets.sync.utils import get_user_events
 from contentcuration.viewsets.task import TaskViewSet
 from contentcuration.viewsets.user import ChannelUserViewSet
 from contentcuration.viewsets.user import UserViewSet
@@ -162,17 +169,170 @@ event_handlers = {
 }
 
 
-def handle_changes(request, viewset_class, change_type, changes):
+def set_by_key_path(obj, key_path, value):
+    keys = key_path.split(".")
+    for key in keys[:-1]:
+        obj = obj.setdefault(key, {})
+    obj[keys[-1]] = value
+
+
+def merge_update_changes(changes):
+    """
+    Merges multiple updates to the same object into a single update, applying their modifications
+    in the order they were made, in the same way the frontend merges changes before syncing.
+    The merged update takes the rev of the last update.
+    """
+    merged = OrderedDict()
+    for change in changes:
+        key = get_key_lookup(change["key"])
+        if key not in merged:
+            merged[key] = change
+            continue
+        mods = deepcopy(merged[key]["mods"])
+        for key_path, value in change["mods"].items():
+            parent_paths = [path for path in mods if key_path.startswith(path + ".")]
+            for parent_path in parent_paths:
+                if not isinstance(mods[parent_path], dict):
+                    mods[parent_path] = {}
+                set_by_key_path(mods[parent_path], key_path[len(parent_path) + 1:], value)
+            if not parent_paths:
+                mods[key_path] = value
+            # Modifications to paths under this one are replaced by it
+            for sub_path in [path for path in mods if path.startswith(key_path + ".")]:
+                del mods[sub_path]
+        merged[key] = dict(change, mods=mods)
+    return list(merged.values())
+
+
+def plan_changes(data):
+    """
+    Plans the changes of a sync, returning a list of (table_name, change_type, changes)
+    groups in the order they should be applied.
+
+    Updates to the same object are merged, and updates to objects that are deleted
+    in the same sync are dropped, as deletes are applied after updates.
+    """
+    deleted_keys = set(
+        (get_table(change), get_key_lookup(change["key"]))
+        for change in data
+        if int(change["type"]) == DELETED
+    )
+    plan = []
+    data = sorted(
+        [change for change in data if get_table(change) in viewset_mapping],
+        key=get_table_sort_order,
+    )
+    for table_name, group in groupby(data, get_table):
+        group = sorted(group, key=get_change_order)
+        for change_type, changes in groupby(group, get_change_type):
+            changes = list(changes)
+            if int(change_type) == UPDATED:
+                changes = merge_update_changes(
+                    [
+                        change
+                        for change in changes
+                        if (table_name, get_key_lookup(change["key"])) not in deleted_keys
+                    ]
+                )
+            if changes:
+                plan.append((table_name, change_type, changes))
+    return plan
+
+
+def get_editable_keys(viewset, changes):
+    """
+    Returns the lookups of the keys of the changes that the user can edit, from a single query,
+    or None if the viewset does its own permission checks for the changes.
+    """
+    if not isinstance(viewset, ReadOnlyValuesViewset) or not changes:
+        return None
+    id_attr = viewset.id_attr()
+    if not id_attr:
+        return None
+    queryset = viewset.filter_queryset_from_keys(
+        viewset.get_edit_queryset(), [change["key"] for change in changes]
+    ).order_by()
+    if isinstance(id_attr, str):
+        return set(str(key) for key in queryset.values_list(id_attr, flat=True))
+    return set(get_key_lookup(key) for key in queryset.values_list(*id_attr))
+
+
+def prepare_table_changes(viewset, table_plan):
+    """
+    Lets the viewset prepare the changes for its table before their permissions are checked,
+    for viewsets that can rewrite the keys of the changes to the objects they are really made to.
+    """
+    prepare_changes = getattr(viewset, "prepare_changes", None)
+    if prepare_changes is not None:
+        prepare_changes([change for change_type, changes in table_plan for change in changes])
+
+
+def get_prepared_changes(viewset):
+    """
+    Returns the changes the client needs to be told about after the viewset prepared the changes for its table,
+    once they have all been applied.
+    """
+    get_changes = getattr(viewset, "get_prepared_changes", None)
+    return get_changes() if get_changes is not None else []
+
+
+def filter_editable_changes(viewset, table_plan):
+    """
+    Resolves the permissions of the updates and deletes for a table in one query,
+    and removes any for objects that the user cannot edit from the plan for the table.
+    Returns the updates that were removed, with errors, as deletes of objects
+    that do not exist are ignored.
+    """
+    changes_to_check = [
+        change
+        for change_type, changes in table_plan
+        if (int(change_type) == UPDATED and isinstance(viewset, UpdateModelMixin))
+        or (int(change_type) == DELETED and isinstance(viewset, DestroyModelMixin))
+        for change in changes
+    ]
+    editable_keys = get_editable_keys(viewset, changes_to_check)
+    if editable_keys is None:
+        return []
+    errors = []
+    not_editable = set()
+    for change in changes_to_check:
+        if get_key_lookup(change["key"]) not in editable_keys:
+            not_editable.add(id(change))
+            if int(change["type"]) == UPDATED:
+                change.update({"errors": ValidationError("Not found").detail})
+                errors.append(change)
+    for change_type, changes in table_plan:
+        changes[:] = [change for change in changes if id(change) not in not_editable]
+    return errors
+
+
+def report_changes_exception(e, changes):
+    # Capture exception and report, but allow sync
+    # to complete properly.
+    report_exception(e)
+
+    if getattr(settings, "DEBUG", False) or getattr(settings, "TEST_ENV", False):
+        raise
+    else:
+        # make sure we leave a record in the logs just in case.
+        logging.error(e)
+    for change in changes:
+        change["errors"] = [str(e)]
+    return changes, None
+
+
+def handle_changes(viewset, change_type, changes):
     try:
         change_type = int(change_type)
-        viewset = viewset_class(request=request)
-        viewset.initial(request)
         if change_type in event_handlers:
             start = time.time()
             event_handler = getattr(viewset, event_handlers[change_type], None)
             if event_handler is None:
-                raise ChangeNotAllowed(change_type, viewset_class)
-            result = event_handler(changes)
+                raise ChangeNotAllowed(change_type, viewset.__class__)
+            # Apply each group of changes in a savepoint, so that an error
+            # only rolls back the changes in its own group
+            with transaction.atomic():
+                result = event_handler(changes)
             elapsed = time.time() - start
 
             if elapsed > SLOW_UPDATE_THRESHOLD:
@@ -186,18 +346,46 @@ def handle_changes(request, viewset_class, change_type, changes):
                     report_exception(e)
             return result
     except Exception as e:
-        # Capture exception and report, but allow sync
-        # to complete properly.
-        report_exception(e)
+        return report_changes_exception(e, changes)
 
-        if getattr(settings, "DEBUG", False) or getattr(settings, "TEST_ENV", False):
-            raise
-        else:
-            # make sure we leave a record in the logs just in case.
-            logging.error(e)
-        for change in changes:
-            change["errors"] = [str(e)]
-        return changes, None
+
+def handle_table_changes(request, viewset_class, table_plan):
+    """
+    Applies the planned changes for a table, using a single viewset for all of them.
+    """
+    errors = []
+    changes_to_return = []
+    try:
+        viewset = viewset_class(request=request)
+        viewset.initial(request)
+        prepare_table_changes(viewset, table_plan)
+        errors.extend(filter_editable_changes(viewset, table_plan))
+    except Exception as e:
+        es, _cs = report_changes_exception(
+            e, [change for change_type, changes in table_plan for change in changes]
+        )
+        return errors + es, changes_to_return
+
+    for change_type, changes in table_plan:
+        if not changes:
+            continue
+        es, cs = handle_changes(viewset, change_type, changes)
+        if es:
+            errors.extend(es)
+        if cs:
+            changes_to_return.extend(cs)
+    changes_to_return.extend(get_prepared_changes(viewset))
+    return errors, changes_to_return
+
+
+def get_user_rev(request):
+    """
+    Returns the sequence number of the last user event the client has seen, if it sent one.
+    """
+    try:
+        return int(request.query_params["user_rev"])
+    except (KeyError, ValueError):
+        return None
 
 
 @authentication_classes((TokenAuthentication, SessionAuthentication))
@@ -211,35 +399,32 @@ def sync(request):
     # this allows internal validation to take place and fields to be added
     # if needed by the server.
     changes_to_return = []
-    data = sorted(request.data, key=get_table_sort_order)
-    for table_name, group in groupby(data, get_table):
-        if table_name in viewset_mapping:
-            viewset_class = viewset_mapping[table_name]
-            group = sorted(group, key=get_change_order)
-            for change_type, changes in groupby(group, get_change_type):
-                # Coerce changes iterator to list so it can be read multiple times
-                es, cs = handle_changes(
-                    request, viewset_class, change_type, list(changes)
-                )
-                if es:
-                    errors.extend(es)
-                if cs:
-                    changes_to_return.extend(cs)
-
-    # Add any changes that have been logged from elsewhere in our hacky redis
-    # cache mechanism
-    changes_to_return.extend(get_and_clear_user_events(request.user.id))
+    plan = plan_changes(request.data)
+    change_count = sum(len(changes) for _table, _type, changes in plan)
+    for table_name, table_plan in groupby(plan, lambda group: group[0]):
+        es, cs = handle_table_changes(
+            request,
+            viewset_mapping[table_name],
+            [(change_type, changes) for _table, change_type, changes in table_plan],
+        )
+        errors.extend(es)
+        changes_to_return.extend(cs)
+
+    # Add any changes that have been logged for the user from elsewhere since the
+    # last event the client has seen, and tell it the last event it has now seen
+    user_events, user_rev = get_user_events(request.user.id, since=get_user_rev(request))
+    changes_to_return.extend(user_events)
     if not errors:
         if changes_to_return:
-            return Response({"changes": changes_to_return})
+            return Response({"changes": changes_to_return, "user_rev": user_rev})
         else:
-            return Response({})
-    elif len(errors) < len(data) or len(changes_to_return):
+            return Response({"user_rev": user_rev})
+    elif len(errors) < change_count or len(changes_to_return):
         # If there are some errors, but not all, or all errors and some changes return a mixed response
         return Response(
-            {"changes": changes_to_return, "errors": errors},
+            {"changes": changes_to_return, "errors": errors, "user_rev": user_rev},
             status=HTTP_207_MULTI_STATUS,
         )
     else:
         # If the errors are total, and there are no changes reject the response outright!
-        return Response({"errors": errors}, status=HTTP_400_BAD_REQUEST)
+        return Response({"errors": errors, "user_rev": user_rev}, status=HTTP_400_BAD_REQUEST)
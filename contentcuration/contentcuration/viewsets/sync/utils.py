@@ -1,12 +1,18 @@
-from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
 
+from contentcuration.db.models.manager import MPTT_ADVISORY_LOCK_ID
+from contentcuration.models import UserChangeEvent
 from contentcuration.viewsets.sync.constants import ALL_TABLES
 from contentcuration.viewsets.sync.constants import COPIED
 from contentcuration.viewsets.sync.constants import CREATED
 from contentcuration.viewsets.sync.constants import DELETED
 from contentcuration.viewsets.sync.constants import MOVED
 from contentcuration.viewsets.sync.constants import UPDATED
-from contentcuration.viewsets.sync.constants import USER_CHANGES_PREFIX
+
+# The events of a user are added under a transaction level advisory lock keyed on this number
+# and the user id, which can't collide with the advisory locks taken on trees for MPTT updates
+USER_EVENT_ADVISORY_LOCK_ID = MPTT_ADVISORY_LOCK_ID + 1
 
 
 def validate_table(table):
@@ -14,6 +20,16 @@ def validate_table(table):
         raise ValueError("{} is not a valid table name".format(table))
 
 
+def get_key_lookup(key):
+    """
+    Returns a string to look up the object a change is for, from its key,
+    which is a list of values for tables with combined keys.
+    """
+    if isinstance(key, (list, tuple)):
+        return ",".join(str(value) for value in key)
+    return str(key)
+
+
 def generate_create_event(key, table, obj):
     validate_table(table)
     return {
@@ -55,7 +71,7 @@ def generate_move_event(key, table, target, position):
 
 
 def generate_copy_event(
-    key, table, from_key, target, position=None, mods=None, excluded_descendants=None
+    key, table, from_key, target, position=None, mods=None, excluded_descendants=None, lazy=False
 ):
     validate_table(table)
     return {
@@ -65,20 +81,33 @@ def generate_copy_event(
         "position": position,
         "mods": mods,
         "excluded_descendants": excluded_descendants,
+        "lazy": lazy,
         "table": table,
         "type": COPIED,
     }
 
 
 def add_event_for_user(user_id, event):
-    cache_key = USER_CHANGES_PREFIX.format(user_id=user_id)
-    user_events = cache.get(cache_key) or []
-    user_events.append(event)
-    cache.set(cache_key, user_events, None)
-
-
-def get_and_clear_user_events(user_id):
-    cache_key = USER_CHANGES_PREFIX.format(user_id=user_id)
-    user_events = cache.get(cache_key) or []
-    cache.delete(cache_key)
-    return user_events
+    with transaction.atomic():
+        # Lock the events of the user, so that they are committed in the order of their sequence numbers,
+        # and a client can never see an event before one with a lower sequence number is committed.
+        # This only blocks other events being added for the user, not other writes to the user.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [USER_EVENT_ADVISORY_LOCK_ID, user_id])
+        UserChangeEvent.objects.create(user_id=user_id, event=event)
+
+
+def get_user_events(user_id, since=None):
+    """
+    Returns the events added for the user after the sequence number `since`, along with the
+    sequence number of the last event, which the client should send back on its next sync.
+    Clients that have not seen any sequence number yet load everything fresh from the server,
+    so they are only given the sequence number to start from.
+    """
+    user_events = UserChangeEvent.objects.filter(user_id=user_id).order_by("id")
+    if since is None:
+        return [], user_events.values_list("id", flat=True).last() or 0
+    user_events = list(user_events.filter(id__gt=since).values_list("id", "event"))
+    if not user_events:
+        return [], since
+    return [event for _id, event in user_events], user_events[-1][0]
@@ -10,6 +10,9 @@ from contentcuration.celery import app
 from contentcuration.models import Channel
 from contentcuration.models import Task
 from contentcuration.models import User
+from contentcuration.utils.tasks import cancel_task
+from contentcuration.utils.tasks import CANCELLABLE_TASK_TYPES
+from contentcuration.utils.tasks import get_task_progress
 from contentcuration.viewsets.base import DestroyModelMixin
 from contentcuration.viewsets.base import ReadOnlyValuesViewset
 from contentcuration.viewsets.base import RequiredFilterSet
@@ -70,9 +73,15 @@ class TaskViewSet(ReadOnlyValuesViewset, DestroyModelMixin):
         return "task_id"
 
     def perform_destroy(self, instance):
-        # TODO: Add logic to delete the Celery task using app.control.revoke(). This will require some extensive
-        # testing to ensure terminating in-progress tasks will not put the db in an indeterminate state.
-        app.control.revoke(instance.task_id, terminate=True)
+        if instance.task_type in CANCELLABLE_TASK_TYPES:
+            # Let a running task stop itself between its steps and roll back, rather than
+            # terminating it while it holds locks, and keep it from starting if it has not yet
+            cancel_task(instance.task_id)
+            app.control.revoke(instance.task_id)
+        else:
+            # TODO: Terminating in-progress tasks may put the db in an indeterminate state,
+            # other tasks should be made cancellable too.
+            app.control.revoke(instance.task_id, terminate=True)
         instance.delete()
 
     def get_edit_queryset(self):
@@ -85,6 +94,8 @@ class TaskViewSet(ReadOnlyValuesViewset, DestroyModelMixin):
                 if result and result.status:
                     item["status"] = result.status
                 if "progress" not in item["metadata"]:
+                    item["metadata"]["progress"] = get_task_progress(item["task_id"])
+                if item["metadata"]["progress"] is None:
                     # Just flagging this, but this appears to be the correct way to get task metadata,
                     # even though the API is marked as private.
                     meta = result._get_task_meta()
@@ -35,6 +35,7 @@ from contentcuration.viewsets.base import BulkModelSerializer
 from contentcuration.viewsets.base import ReadOnlyValuesViewset
 from contentcuration.viewsets.base import RequiredFilterSet
 from contentcuration.viewsets.common import CatalogPaginator
+from contentcuration.viewsets.common import KeysetPaginationMixin
 from contentcuration.viewsets.common import NotNullArrayAgg
 from contentcuration.viewsets.common import SQCount
 from contentcuration.viewsets.common import UUIDFilter
@@ -44,13 +45,15 @@ from contentcuration.viewsets.sync.constants import EDITOR_M2M
 from contentcuration.viewsets.sync.constants import VIEWER_M2M
 
 
-class UserListPagination(PageNumberPagination):
+class UserListPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = None
     page_size_query_param = "page_size"
     max_page_size = 100
     django_paginator_class = CatalogPaginator
 
     def get_paginated_response(self, data):
+        if self.keyset:
+            return super(UserListPagination, self).get_paginated_response(data)
         return Response(
             {
                 "next": self.get_next_link(),
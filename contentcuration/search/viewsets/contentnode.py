@@ -21,11 +21,12 @@ from rest_framework.response import Response
 from contentcuration.models import Channel
 from contentcuration.models import ContentNode
 from contentcuration.viewsets.base import RequiredFilterSet
+from contentcuration.viewsets.common import KeysetPaginationMixin
 from contentcuration.viewsets.common import SQArrayAgg
 from contentcuration.viewsets.contentnode import ContentNodeViewSet
 
 
-class ListPagination(PageNumberPagination):
+class ListPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 25
     page_size_query_param = "page_size"
     max_page_size = 100
@@ -36,14 +37,21 @@ class ListPagination(PageNumberPagination):
         except (KeyError, ValueError):
             return 1
 
+    def get_count(self, queryset):
+        return self.initial_count
+
     def paginate_queryset(self, queryset, request, view=None):
         """
         Overrides paginate_queryset from PageNumberPagination
         to assign the records count to the paginator.
         This count has been previously obtained in a less complex query,
         thus it has a better performance.
-
+        Requests with a cursor are paginated by the keyset pagination of the mixin.
         """
+        self.keyset = self.cursor_query_param in request.query_params
+        if self.keyset:
+            return super(ListPagination, self).paginate_queryset(queryset, request, view=view)
+
         page_size = self.get_page_size(request)
         if not page_size:
             return None
@@ -68,6 +76,8 @@ class ListPagination(PageNumberPagination):
         return list(self.page)
 
     def get_paginated_response(self, data):
+        if self.keyset:
+            return super(ListPagination, self).get_paginated_response(data)
         return Response(
             {
                 "next": self.get_next_link(),